@@ -0,0 +1,228 @@
+"""
+Materialized Monthly Aggregates
+K&Co Cloud Cost Intelligence Platform
+
+Pre-aggregated tables behind the Part C report queries (the "Aggregates"
+layer of the Part D dbt project):
+
+- agg_monthly_billing: month x provider x team x environment x service x
+  account grain, with row/cost counts and sums split into credits and charges,
+  plus charge min/max
+- agg_daily_provider: date x provider totals (date range, distinct dates and
+  the daily trend)
+
+Every report column is derivable from these: sums and counts add up, AVG is
+SUM/COUNT, MIN/MAX compose, and the COUNT(DISTINCT ...) columns are over
+dimensions that are part of the monthly grain. Refreshes are incremental:
+only the months touched by a load are deleted and rebuilt, so report latency
+depends on the number of groups, not on the size of the fact data. A load
+records its months in agg_pending_months in the same transaction that
+changes the rows, and the next refresh drains them, so a crash between the
+load and the refresh cannot leave a month stale.
+
+Each refreshed month also gets HyperLogLog sketches of its distinct-count
+columns (distinct_sketches.py), so COUNT(DISTINCT) can be rolled up across
+months, teams or providers approximately without rescanning rows.
+"""
+
+from datetime import date
+
+from distinct_sketches import SKETCH_TABLE, init_sketches, refresh_month_sketches
+
+AGG_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS agg_monthly_billing (
+        month_key INTEGER NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        month_label TEXT NOT NULL,
+        cloud_provider TEXT NOT NULL,
+        team TEXT,
+        environment TEXT,
+        service TEXT,
+        cloud_account_id TEXT,
+        row_count INTEGER NOT NULL,
+        cost_count INTEGER NOT NULL,
+        cost_sum REAL,
+        credit_count INTEGER NOT NULL,
+        credit_sum REAL NOT NULL,
+        charge_count INTEGER NOT NULL,
+        charge_sum REAL NOT NULL,
+        charge_min REAL,
+        charge_max REAL
+    )
+    """,
+    # Covering indexes for the report access patterns (filter/group columns
+    # first, then everything the report reads)
+    """
+    CREATE INDEX IF NOT EXISTS idx_agg_month_provider ON agg_monthly_billing (
+        month_key, cloud_provider, year, month, month_label,
+        row_count, cost_count, cost_sum, credit_sum, charge_sum
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_agg_month_team_env ON agg_monthly_billing (
+        month_key, team, environment, year, month, month_label,
+        cloud_account_id, service, row_count, cost_count, cost_sum
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_agg_service_provider ON agg_monthly_billing (
+        service, cloud_provider, charge_count, charge_sum, cost_count, credit_count,
+        charge_min, charge_max, team, environment
+    )
+    """,
+    """
+    CREATE INDEX IF NOT EXISTS idx_agg_provider_account ON agg_monthly_billing (
+        cloud_provider, cloud_account_id, row_count, cost_sum
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS agg_daily_provider (
+        date TEXT NOT NULL,
+        month_key INTEGER NOT NULL,
+        cloud_provider TEXT NOT NULL,
+        row_count INTEGER NOT NULL,
+        cost_sum REAL,
+        PRIMARY KEY (date, cloud_provider)
+    )
+    """,
+    "CREATE INDEX IF NOT EXISTS idx_agg_daily_month ON agg_daily_provider (month_key)",
+    "CREATE INDEX IF NOT EXISTS idx_agg_daily_provider ON agg_daily_provider (cloud_provider, date)",
+]
+
+# Months a committed load changed whose aggregates have not been rebuilt yet
+PENDING_MONTHS_SQL = "CREATE TABLE IF NOT EXISTS agg_pending_months (month_key INTEGER PRIMARY KEY)"
+
+REFRESH_MONTHLY_SQL = """
+INSERT INTO agg_monthly_billing
+SELECT
+    month_key,
+    year,
+    month,
+    printf('%04d-%02d', year, month) AS month_label,
+    cloud_provider,
+    team,
+    environment,
+    service,
+    cloud_account_id,
+    COUNT(*) AS row_count,
+    COUNT(cost_usd) AS cost_count,
+    SUM(cost_usd) AS cost_sum,
+    SUM(is_credit) AS credit_count,
+    SUM(CASE WHEN is_credit THEN cost_usd ELSE 0 END) AS credit_sum,
+    SUM(CASE WHEN NOT is_credit THEN 1 ELSE 0 END) AS charge_count,
+    SUM(CASE WHEN NOT is_credit THEN cost_usd ELSE 0 END) AS charge_sum,
+    MIN(CASE WHEN NOT is_credit THEN cost_usd END) AS charge_min,
+    MAX(CASE WHEN NOT is_credit THEN cost_usd END) AS charge_max
+FROM unified_cloud_billing
+WHERE month_key = ?
+GROUP BY cloud_provider, team, environment, service, cloud_account_id
+"""
+
+REFRESH_DAILY_SQL = """
+INSERT INTO agg_daily_provider
+SELECT
+    date,
+    ? AS month_key,
+    cloud_provider,
+    COUNT(*) AS row_count,
+    SUM(cost_usd) AS cost_sum
+FROM unified_cloud_billing
+WHERE date >= ? AND date < ?
+GROUP BY date, cloud_provider
+"""
+
+
+def init_aggregates(conn):
+    for ddl in AGG_SCHEMA:
+        conn.execute(ddl)
+    conn.execute(PENDING_MONTHS_SQL)
+    init_sketches(conn)
+    conn.commit()
+
+
+def month_bounds(month_key):
+    """[first day, first day of next month) as ISO strings for a YYYYMM key."""
+    year, month = divmod(month_key, 100)
+    start = date(year, month, 1)
+    end = date(year + month // 12, month % 12 + 1, 1)
+    return start.isoformat(), end.isoformat()
+
+
+def months_between(first, last):
+    """YYYYMM keys covering two ISO dates (inclusive)."""
+    y, m = int(first[:4]), int(first[5:7])
+    end = (int(last[:4]), int(last[5:7]))
+    keys = []
+    while (y, m) <= end:
+        keys.append(y * 100 + m)
+        y, m = (y + 1, 1) if m == 12 else (y, m + 1)
+    return keys
+
+
+def all_loaded_months(conn):
+    row = conn.execute((
+        "SELECT (SELECT MIN(date) FROM unified_cloud_billing), (SELECT MAX(date) FROM unified_cloud_billing)"
+    )).fetchone()
+    if row[0] is None:
+        return []
+    return months_between(row[0], row[1])
+
+
+def touched_months(load_stats):
+    """Union of the months touched by a set of loads (None if any was a full load)."""
+    touched = set()
+    for stats in load_stats:
+        if stats['months_touched'] is None:
+            return None
+        touched.update(stats['months_touched'])
+    return touched
+
+
+def mark_months_pending(conn, month_keys):
+    """
+    Record months whose aggregates a load made stale, inside the load's own
+    transaction (no commit), so they are refreshed even if the process dies
+    before refresh_aggregates() runs.
+    """
+    conn.execute(PENDING_MONTHS_SQL)
+    conn.executemany("INSERT OR IGNORE INTO agg_pending_months (month_key) VALUES (?)",
+                     [(key,) for key in month_keys])
+
+
+def refresh_aggregates(conn, month_keys=None):
+    """
+    Rebuild the aggregate rows for the given months plus any months still
+    pending from earlier loads (all months if None, or if the aggregates have
+    never been built). Returns the months refreshed.
+    """
+    init_aggregates(conn)
+    empty = conn.execute("SELECT 1 FROM agg_monthly_billing LIMIT 1").fetchone() is None
+    empty = empty or conn.execute(f"SELECT 1 FROM {SKETCH_TABLE} LIMIT 1").fetchone() is None
+    
+    with conn:
+        if month_keys is None or empty:
+            conn.execute("DELETE FROM agg_monthly_billing")
+            conn.execute("DELETE FROM agg_daily_provider")
+            conn.execute(f"DELETE FROM {SKETCH_TABLE}")
+            month_keys = all_loaded_months(conn)
+        else:
+            pending = [row[0] for row in conn.execute("SELECT month_key FROM agg_pending_months")]
+            month_keys = set(month_keys) | set(pending)
+        
+        for key in sorted(set(month_keys)):
+            refresh_month(conn, key)
+        conn.execute("DELETE FROM agg_pending_months")
+    
+    return sorted(set(month_keys))
+
+
+def refresh_month(conn, month_key):
+    """Rebuild one month's aggregate rows inside the caller's transaction (no commit)."""
+    start, end = month_bounds(month_key)
+    conn.execute("DELETE FROM agg_monthly_billing WHERE month_key = ?", (month_key,))
+    conn.execute("DELETE FROM agg_daily_provider WHERE month_key = ?", (month_key,))
+    conn.execute(REFRESH_MONTHLY_SQL, (month_key,))
+    conn.execute(REFRESH_DAILY_SQL, (month_key, start, end))
+    refresh_month_sketches(conn, month_key)
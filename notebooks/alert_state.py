@@ -0,0 +1,490 @@
+"""
+Online Alert State
+K&Co Cloud Cost Intelligence Platform
+
+Per-series state for the daily cost alerts, updated by every warehouse load
+so that evaluating the alerts never scans the billing history. A series is a
+(provider, team, environment, service), and for each one the store keeps:
+
+- a ring buffer of the last RING_DAYS daily costs (day d lives in slot
+  d % RING_DAYS), which covers the 7-day rule plus the late-arrival window
+- Welford's running count / mean / M2 of its daily cost on the days it had
+  cost (the long-run baseline)
+- the level and trend of Holt's linear exponential smoothing of its daily
+  cost, $0 days included (the forecast)
+- its month-to-date cost
+
+The days inside the warehouse's late-arrival window can still be replaced,
+so they exist only in the ring buffer. Once a day is older than the window
+(settled) it is folded into the Welford, Holt and month-to-date terms, one
+vectorized step across all series. A load costs O(rows loaded + newly
+settled days x series): the replaced days are re-scattered into the ring and
+nothing older is read.
+
+Reading the state:
+- spikes(): Part D / Part E rule "daily cost > 120% of the 7-day average"
+  (with anomaly_engine.py's z-score and minimum active days) for the latest
+  day, or any day still in the ring, at the series grain or summed to a
+  coarser one such as team / environment
+- projection(): month-end spend = month-to-date actuals + the Holt forecast
+  of the remaining days. Holt forecasts are linear, so per-series
+  projections add up to any grouping
+- budget_alerts(): projection against monthly budgets (dim_team.budget_usd)
+
+The state lives next to the warehouse (data/alert_state.npz) and every
+warehouse.incremental_load updates it. A full load rebuilds a provider's
+series. A load re-seeds the provider from the warehouse when its late-arrival
+cutoff reaches back into settled days (after a backfill), or when the state's
+last loaded day is not the warehouse watermark (a load that bypassed it).
+"""
+
+import argparse
+import os
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from anomaly_engine import ALERT_RATIO, MIN_ACTIVE_DAYS, WINDOW_DAYS, Z_THRESHOLD
+from billing_frame import PROVIDER_LABELS, from_day_offset, to_day_offset
+from ingest_cache import SOURCES
+
+ALERT_STATE_PATH = 'data/alert_state.npz'
+
+SERIES_COLUMNS = ['cloud_provider', 'team', 'environment', 'service']
+
+# Ring buffer length: the 7-day window before the evaluated day, plus the
+# late-arrival days that are not settled yet, with room to spare
+RING_DAYS = 32
+# Days before the latest loaded day that can still be replaced (warehouse.LATE_ARRIVAL_DAYS)
+SETTLE_DAYS = 7
+
+# Holt's smoothing factors for the level and the trend of daily cost. Daily
+# series are sparse and spiky, so both are low: on the synthetic 12-month
+# set, projections made on the 10th are within ~2% of the team / environment
+# month totals (0.3 / 0.1 overshoots by ~6%)
+LEVEL_ALPHA = 0.1
+TREND_BETA = 0.01
+
+# Per-series arrays, in the order they are saved
+SERIES_ARRAYS = {
+    'count': 'int64',      # Welford: days with cost folded in
+    'mean': 'float64',     # Welford: mean daily cost over those days
+    'm2': 'float64',       # Welford: sum of squared deviations
+    'smoothed': 'int64',   # Holt: days folded in since the series' first day with cost
+    'level': 'float64',
+    'trend': 'float64',
+    'mtd': 'float64',      # cost of the settled days of the settled month
+}
+
+
+def alert_state_path_for(warehouse_path):
+    """State file that belongs to a warehouse file (data/warehouse.db -> data/alert_state.npz)."""
+    return os.path.join(os.path.dirname(warehouse_path), 'alert_state.npz')
+
+
+def series_keys(frame):
+    """64-bit key per row of a (cloud_provider, team, environment, service) frame."""
+    return pd.util.hash_pandas_object(frame[SERIES_COLUMNS].astype(str), index=False).to_numpy()
+
+
+def month_start(day):
+    """Day offset of the first day of the month containing `day`."""
+    return int(to_day_offset(np.datetime64(int(day), 'D').astype('datetime64[M]')))
+
+
+def month_end(day):
+    """Day offset of the last day of the month containing `day`."""
+    return int(to_day_offset(np.datetime64(int(day), 'D').astype('datetime64[M]') + 1)) - 1
+
+
+class AlertState:
+    """Ring buffers, Welford and Holt terms for every (provider, team, environment, service) series."""
+    
+    def __init__(self):
+        self.series = pd.DataFrame({col: pd.Series(dtype=str) for col in SERIES_COLUMNS})
+        self.keys = np.empty(0, dtype=np.uint64)
+        self.ring = np.zeros((0, RING_DAYS))
+        for name, dtype in SERIES_ARRAYS.items():
+            setattr(self, name, np.zeros(0, dtype=dtype))
+        # Provider label -> (last settled day, last loaded day)
+        self.days = {}
+    
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    
+    @classmethod
+    def load(cls, path=ALERT_STATE_PATH):
+        """Read the state from disk (an empty state if the file does not exist)."""
+        state = cls()
+        if not os.path.exists(path):
+            return state
+        with np.load(path) as data:
+            state.series = pd.DataFrame({col: data[col].astype(object) for col in SERIES_COLUMNS})
+            state.keys = data['keys']
+            state.ring = data['ring']
+            for name in SERIES_ARRAYS:
+                setattr(state, name, data[name])
+            state.days = {str(label): (int(settled), int(last)) for label, settled, last
+                          in zip(data['providers'], data['settled'], data['last'])}
+        return state
+    
+    def save(self, path=ALERT_STATE_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        labels = sorted(self.days)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, keys=self.keys, ring=self.ring,
+                     providers=np.array(labels, dtype=str),
+                     settled=np.array([self.days[label][0] for label in labels], dtype='int64'),
+                     last=np.array([self.days[label][1] for label in labels], dtype='int64'),
+                     **{name: getattr(self, name) for name in SERIES_ARRAYS},
+                     **{col: self.series[col].to_numpy(dtype=str) for col in SERIES_COLUMNS})
+        os.replace(tmp, path)
+    
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    
+    def series_rows(self, frame):
+        """Row of each frame row's series, appending series not seen before."""
+        keys = series_keys(frame)
+        uniques, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(self.keys, kind='stable')
+        sorted_keys = self.keys[order]
+        pos = np.searchsorted(sorted_keys, uniques)
+        found = pos < len(sorted_keys)
+        found[found] = sorted_keys[pos[found]] == uniques[found]
+        rows = np.full(len(uniques), -1, dtype='int64')
+        rows[found] = order[pos[found]]
+        
+        new = np.flatnonzero(~found)
+        if len(new):
+            rows[new] = len(self.keys) + np.arange(len(new))
+            added = frame.iloc[first[new]][SERIES_COLUMNS].astype(str).reset_index(drop=True)
+            self.series = pd.concat([self.series, added], ignore_index=True)
+            self.keys = np.concatenate([self.keys, uniques[new]])
+            self.ring = np.vstack([self.ring, np.zeros((len(new), RING_DAYS))])
+            for name, dtype in SERIES_ARRAYS.items():
+                setattr(self, name, np.concatenate([getattr(self, name), np.zeros(len(new), dtype=dtype)]))
+        return rows[inverse]
+    
+    def drop_provider(self, label):
+        """Forget every series of one provider (before a full reload)."""
+        keep = (self.series['cloud_provider'] != label).to_numpy()
+        self.series = self.series[keep].reset_index(drop=True)
+        self.keys = self.keys[keep]
+        self.ring = self.ring[keep]
+        for name in SERIES_ARRAYS:
+            setattr(self, name, getattr(self, name)[keep])
+        self.days.pop(label, None)
+    
+    def can_update(self, label, cutoff, watermark=None):
+        """
+        True if a load replacing the days after `cutoff` only touches unsettled
+        days and, given the warehouse watermark before the load, the state has
+        seen every load up to it (no load bypassed the state).
+        """
+        if label not in self.days:
+            return False
+        settled, last = self.days[label]
+        if watermark is not None and int(to_day_offset(np.datetime64(watermark))) != last:
+            return False
+        return int(to_day_offset(np.datetime64(cutoff))) >= settled
+    
+    def update(self, provider, rows, cutoff=None, settle_days=SETTLE_DAYS):
+        """
+        Apply one warehouse load: `rows` are the unified rows loaded for the
+        provider (date, SERIES_COLUMNS, cost_usd); cutoff None means a full
+        load, else the late-arrival cutoff (the rows replace every day after
+        it). Days more than `settle_days` before the latest loaded day are
+        folded into the running terms.
+        """
+        if settle_days + WINDOW_DAYS >= RING_DAYS:
+            raise ValueError(f"settle_days must be below {RING_DAYS - WINDOW_DAYS} (ring of {RING_DAYS} days)")
+        label = PROVIDER_LABELS[provider]
+        days = to_day_offset(pd.to_datetime(rows['date']).to_numpy()).astype('int64')
+        if cutoff is None:
+            self.drop_provider(label)
+            if not len(rows):
+                return
+            settled = last = int(days.min()) - 1
+        else:
+            if not self.can_update(label, cutoff):
+                raise ValueError(f"{label}: cutoff {cutoff} is before the settled days; re-seed the provider")
+            settled, last = self.days[label]
+            replace_after = int(to_day_offset(np.datetime64(cutoff)))
+            keep = days > replace_after
+            rows, days = rows[keep], days[keep]
+        
+        cost = np.nan_to_num(pd.to_numeric(rows['cost_usd']).to_numpy(dtype='float64'))
+        series = self.series_rows(rows) if len(rows) else np.empty(0, dtype='int64')
+        members = np.flatnonzero((self.series['cloud_provider'] == label).to_numpy())
+        column = np.zeros(len(self.keys), dtype='int64')
+        column[members] = np.arange(len(members))
+        
+        # Daily cost of every unsettled day: kept days come from the ring,
+        # replaced (and new) days from the rows
+        first = settled + 1
+        new_last = max(last, int(days.max())) if len(days) else last
+        timeline = np.zeros((new_last - first + 1, len(members)))
+        if cutoff is not None:
+            kept = np.arange(first, min(replace_after, last) + 1)
+            timeline[kept - first] = self.ring[np.ix_(members, kept % RING_DAYS)].T
+        cells = (days - first) * len(members) + column[series]
+        timeline += np.bincount(cells, weights=cost, minlength=timeline.size).reshape(timeline.shape)
+        
+        new_settled = max(settled, new_last - settle_days)
+        for day in range(first, new_settled + 1):
+            self.fold(members, timeline[day - first], day)
+        
+        window = np.arange(max(first, new_last - RING_DAYS + 1), new_last + 1)
+        self.ring[np.ix_(members, window % RING_DAYS)] = timeline[window - first].T
+        self.days[label] = (new_settled, new_last)
+    
+    def fold(self, members, values, day):
+        """Fold one settled day's costs (one per member series) into the running terms."""
+        if day == month_start(day):
+            self.mtd[members] = 0.0
+        self.mtd[members] += values
+        
+        # Welford over the days with cost
+        active = values != 0
+        rows, x = members[active], values[active]
+        self.count[rows] += 1
+        delta = x - self.mean[rows]
+        self.mean[rows] += delta / self.count[rows]
+        self.m2[rows] += delta * (x - self.mean[rows])
+        
+        # Holt, starting at each series' first day with cost
+        started = self.smoothed[members] > 0
+        level, trend = self.level[members], self.trend[members]
+        new_level = LEVEL_ALPHA * values + (1 - LEVEL_ALPHA) * (level + trend)
+        new_trend = TREND_BETA * (new_level - level) + (1 - TREND_BETA) * trend
+        self.level[members] = np.where(started, new_level, np.where(active, values, 0.0))
+        self.trend[members] = np.where(started, new_trend, 0.0)
+        self.smoothed[members] += started | active
+    
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    
+    def last_days(self, day=None):
+        """Per-series evaluation day: `day` (a date) or each provider's last loaded day."""
+        labels = self.series['cloud_provider'].to_numpy()
+        if day is not None:
+            return np.full(len(labels), int(to_day_offset(np.datetime64(day))), dtype='int64')
+        last = {label: days[1] for label, days in self.days.items()}
+        return np.array([last[label] for label in labels], dtype='int64')
+    
+    def ring_values(self, days):
+        """Ring cost of each series on days[i] (per series); 0 outside the ring's span."""
+        last = np.array([self.days[label][1] for label in self.series['cloud_provider']], dtype='int64')
+        inside = (days <= last) & (days > last - RING_DAYS)
+        values = self.ring[np.arange(len(days)), days % RING_DAYS]
+        return np.where(inside, values, 0.0)
+    
+    def spikes(self, day=None, by=SERIES_COLUMNS, window=WINDOW_DAYS, ratio=ALERT_RATIO, z_threshold=Z_THRESHOLD,
+               min_active=MIN_ACTIVE_DAYS, only_alerts=True):
+        """
+        The 7-day rule for one day (default: each provider's latest day).
+        
+        Series are summed to the `by` grain; mean and std are over the window
+        days with cost, as in anomaly_engine.trailing_stats. Returns one row
+        per flagged group (every group with only_alerts=False), by z-score;
+        at the series grain, the Welford long-run mean / std are added.
+        """
+        if not len(self.series):
+            return pd.DataFrame(columns=['date', *by, 'cost_usd', 'rolling_avg', 'rolling_std', 'z_score'])
+        days = self.last_days(day)
+        last = np.array([self.days[label][1] for label in self.series['cloud_provider']], dtype='int64')
+        if day is not None and ((days > last) | (days - window <= last - RING_DAYS)).all():
+            raise ValueError(f"{day} is outside the last {RING_DAYS - window} loaded days")
+        
+        frame = self.series[list(by)].copy()
+        frame.insert(0, 'date', from_day_offset(days).strftime('%Y-%m-%d'))
+        frame['cost_usd'] = self.ring_values(days)
+        for lag in range(1, window + 1):
+            frame[f'lag_{lag}'] = self.ring_values(days - lag)
+        grain = list(by) == SERIES_COLUMNS
+        if not grain:
+            frame = frame.groupby(['date', *by], sort=False, dropna=False).sum().reset_index()
+        
+        values = frame[[f'lag_{lag}' for lag in range(1, window + 1)]].to_numpy()
+        cost = frame['cost_usd'].to_numpy()
+        active = (values != 0).sum(axis=1)
+        total = values.sum(axis=1)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            mean = total / active
+            variance = ((values * values).sum(axis=1) - total * mean) / (active - 1)
+            std = np.sqrt(np.maximum(variance, 0))
+            z = (cost - mean) / std
+            flagged = (active >= min_active) & (cost > ratio * mean) & (z >= z_threshold)
+        
+        result = frame[['date', *by, 'cost_usd']].copy()
+        result['rolling_avg'] = mean
+        result['rolling_std'] = std
+        result['z_score'] = z
+        result['pct_of_rolling_avg'] = cost / mean * 100
+        if grain:
+            with np.errstate(divide='ignore', invalid='ignore'):
+                result['long_run_avg'] = np.where(self.count > 0, self.mean, np.nan)
+                result['long_run_std'] = np.sqrt(self.m2 / (self.count - 1))
+        result['alert'] = flagged
+        if only_alerts:
+            result = result[flagged]
+        return result.sort_values('z_score', ascending=False, kind='stable').reset_index(drop=True)
+    
+    def projection(self, by=SERIES_COLUMNS):
+        """
+        Month-end spend of the month of each provider's last loaded day:
+        month-to-date actuals plus the Holt forecast of the remaining days.
+        """
+        columns = ['month', *by, 'mtd_cost', 'forecast_remaining', 'projected_total']
+        if not len(self.series):
+            return pd.DataFrame(columns=columns)
+        labels = self.series['cloud_provider'].to_numpy()
+        mtd = np.zeros(len(labels))
+        remaining = np.zeros(len(labels))
+        month = np.empty(len(labels), dtype=object)
+        for label, (settled, last) in self.days.items():
+            rows = np.flatnonzero(labels == label)
+            start, end = month_start(last), month_end(last)
+            # Settled part of the month, then the unsettled days from the ring
+            actual = self.mtd[rows] if settled >= start else np.zeros(len(rows))
+            ring_days = np.arange(max(settled + 1, start), last + 1)
+            actual = actual + self.ring[np.ix_(rows, ring_days % RING_DAYS)].sum(axis=1)
+            # Holt's h-step forecast is level + h * trend, h counted from the last settled day
+            horizon = end - last
+            near, far = last + 1 - settled, end - settled
+            forecast = horizon * self.level[rows] + self.trend[rows] * (near + far) * horizon / 2
+            mtd[rows] = actual
+            remaining[rows] = np.where(self.smoothed[rows] > 0, forecast, 0.0)
+            month[rows] = str(np.datetime64(last, 'D').astype('datetime64[M]'))
+        
+        frame = self.series[list(by)].copy()
+        frame.insert(0, 'month', month)
+        frame['mtd_cost'] = mtd
+        frame['forecast_remaining'] = remaining
+        frame['projected_total'] = mtd + remaining
+        return (frame.groupby(['month', *by], sort=True, dropna=False)[columns[len(by) + 1:]].sum()
+                .reset_index())
+    
+    def budget_alerts(self, budgets, warn_pct=100.0):
+        """
+        Projection against monthly budgets: `budgets` has some of
+        SERIES_COLUMNS (e.g. team, or team + environment) and budget_usd.
+        Status is 'over budget' once month-to-date cost exceeds the budget,
+        'projected over' when the projection reaches warn_pct of it.
+        """
+        by = [col for col in SERIES_COLUMNS if col in budgets.columns]
+        if not by:
+            raise ValueError(f"budgets need at least one of {SERIES_COLUMNS} besides budget_usd")
+        result = self.projection(by).merge(budgets[[*by, 'budget_usd']], on=by)
+        result['pct_of_budget'] = result['projected_total'] / result['budget_usd'] * 100
+        result['status'] = np.select(
+            [result['mtd_cost'] > result['budget_usd'], result['pct_of_budget'] >= warn_pct],
+            ['over budget', 'projected over'], 'on track'
+        )
+        return result.sort_values('pct_of_budget', ascending=False, kind='stable').reset_index(drop=True)
+
+
+def seed_rows(conn, label):
+    """A provider's rows of the warehouse, in the columns the state needs."""
+    from warehouse import UNIFIED_TABLE
+    
+    return pd.read_sql_query(
+        f"SELECT date, {', '.join(SERIES_COLUMNS)}, cost_usd FROM {UNIFIED_TABLE} WHERE cloud_provider = ?",
+        conn, params=(label,)
+    )
+
+
+def rebuild(path=ALERT_STATE_PATH, warehouse_path=None, settle_days=SETTLE_DAYS):
+    """Build the state from scratch from the warehouse table."""
+    from warehouse import WAREHOUSE_PATH
+    
+    conn = sqlite3.connect(warehouse_path or WAREHOUSE_PATH)
+    try:
+        state = AlertState()
+        for provider in SOURCES:
+            state.update(provider, seed_rows(conn, PROVIDER_LABELS[provider]), settle_days=settle_days)
+    finally:
+        conn.close()
+    state.save(path)
+    return state
+
+
+def main(path=ALERT_STATE_PATH, warehouse_path=None, day=None, by=('team', 'environment'), budgets_path=None,
+         top=20, rebuild_state=False):
+    print("=" * 80)
+    print("ONLINE ALERT STATE")
+    print("=" * 80)
+    print()
+    
+    start = time.perf_counter()
+    state = (rebuild(path, warehouse_path) if rebuild_state or not os.path.exists(path)
+             else AlertState.load(path))
+    load_time = time.perf_counter() - start
+    if not state.days:
+        print("State is empty (run part_c_sql_execution.py or --rebuild)")
+        return None
+    size = state.ring.nbytes + sum(getattr(state, name).nbytes for name in SERIES_ARRAYS)
+    print(f"{len(state.series):,} series, {RING_DAYS}-day ring buffers ({size / 1024:.1f} KB), "
+          f"loaded in {load_time * 1000:.1f} ms")
+    for label, (settled, last) in sorted(state.days.items()):
+        print(f"  {label}: settled through {from_day_offset([settled])[0]:%Y-%m-%d}, "
+              f"loaded through {from_day_offset([last])[0]:%Y-%m-%d}")
+    print()
+    
+    results = {}
+    for grain in (SERIES_COLUMNS, list(by)):
+        start = time.perf_counter()
+        spikes = state.spikes(day, grain)
+        elapsed = time.perf_counter() - start
+        print(f"7-day rule by {', '.join(grain)}: {len(spikes):,} alerts ({elapsed * 1000:.1f} ms)")
+        if len(spikes):
+            print(spikes.head(top).round(2).to_string(index=False))
+        print()
+        results[f"spikes_by_{'_'.join(grain)}"] = spikes
+    
+    start = time.perf_counter()
+    projection = state.projection(list(by))
+    elapsed = time.perf_counter() - start
+    totals = projection[['mtd_cost', 'forecast_remaining', 'projected_total']].sum()
+    print(f"Month-end projection by {', '.join(by)} ({elapsed * 1000:.1f} ms): "
+          f"${totals['mtd_cost']:,.2f} to date + ${totals['forecast_remaining']:,.2f} forecast "
+          f"= ${totals['projected_total']:,.2f}")
+    print(projection.nlargest(top, 'projected_total').round(2).to_string(index=False))
+    print()
+    results['projection'] = projection
+    
+    if budgets_path:
+        budgets = pd.read_csv(budgets_path)
+        alerts = state.budget_alerts(budgets)
+        print(f"Budgets ({budgets_path}): {(alerts['status'] != 'on track').sum()} of {len(alerts)} "
+              f"over or projected over")
+        print(alerts.head(top).round(2).to_string(index=False))
+        print()
+        results['budgets'] = alerts
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Evaluate cost alerts and month-end projections from the "
+                                                 "online per-series state.")
+    parser.add_argument('--state', default=ALERT_STATE_PATH, help="alert state file")
+    parser.add_argument('--warehouse', default=None, help="warehouse to rebuild from (default: data/warehouse.db)")
+    parser.add_argument('--day', default=None, help="day to evaluate (default: the latest loaded day)")
+    parser.add_argument('--by', default='team,environment', help="coarser grain for alerts and projections")
+    parser.add_argument('--budgets', default=None,
+                        help="CSV of monthly budgets: team and/or environment (...) columns plus budget_usd")
+    parser.add_argument('--top', type=int, default=20, help="rows to print per table")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the state from the warehouse")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.state, args.warehouse, args.day, tuple(args.by.split(',')), args.budgets, args.top, args.rebuild)
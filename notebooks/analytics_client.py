@@ -0,0 +1,162 @@
+"""
+Analytics Daemon Client
+K&Co Cloud Cost Intelligence Platform
+
+Thin command-line client for analytics_daemon.py. It imports only the
+standard library (no pandas / numpy), so a query costs a bare interpreter
+start plus one socket round trip:
+
+    python notebooks/analytics_client.py status
+    python notebooks/analytics_client.py profile
+    python notebooks/analytics_client.py reports top_services monthly_by_provider
+    python notebooks/analytics_client.py sql "SELECT cloud_provider, SUM(cost_usd) FROM unified_cloud_billing GROUP BY 1"
+
+AnalyticsClient can also be used from other programs (dashboards); one
+client keeps its connection open across requests.
+"""
+
+import argparse
+import json
+import socket
+import sys
+import time
+
+# Same defaults as analytics_daemon.py, repeated so this module stays import-light
+DEFAULT_SOCKET = 'data/analytics.sock'
+DEFAULT_MAX_ROWS = 10_000
+
+
+class AnalyticsClient:
+    """Connection to a running daemon; request() sends one op and returns its response."""
+    
+    def __init__(self, socket_path=DEFAULT_SOCKET, port=None, timeout=120):
+        if port is None:
+            self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.sock.connect(socket_path)
+            self.sock.settimeout(timeout)
+        else:
+            self.sock = socket.create_connection(('127.0.0.1', port), timeout)
+        self.file = self.sock.makefile('rwb')
+    
+    def request(self, op, **fields):
+        """Send {'op': op, **fields}; returns the response dict, raising RuntimeError on a failed op."""
+        self.file.write(json.dumps({'op': op, **fields}).encode() + b'\n')
+        self.file.flush()
+        line = self.file.readline()
+        if not line:
+            raise ConnectionError("the daemon closed the connection")
+        response = json.loads(line)
+        if not response['ok']:
+            raise RuntimeError(response['error'])
+        return response
+    
+    def close(self):
+        self.file.close()
+        self.sock.close()
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, *exc):
+        self.close()
+
+
+def format_cell(value):
+    if value is None:
+        return ''
+    if isinstance(value, float):
+        return f"{value:,.2f}"
+    return str(value)
+
+
+def format_table(result):
+    """Plain-text rendering of a {'columns', 'rows'} table, numbers right-aligned."""
+    columns, rows = result['columns'], result['rows']
+    cells = [[format_cell(value) for value in row] for row in rows]
+    widths = [max([len(str(column))] + [len(row[i]) for row in cells]) for i, column in enumerate(columns)]
+    numeric = [all(isinstance(row[i], (int, float)) or row[i] is None for row in rows) for i in range(len(columns))]
+    
+    def line(values):
+        return '  '.join(v.rjust(w) if n else v.ljust(w) for v, w, n in zip(values, widths, numeric)).rstrip()
+    
+    lines = [line([str(c) for c in columns])] + [line(row) for row in cells]
+    if result.get('truncated'):
+        lines.append(f"... (first {len(rows):,} rows)")
+    return '\n'.join(lines)
+
+
+def print_result(command, result):
+    if command == 'profile':
+        print(format_table(result['summary']))
+        print()
+        for i, risk in enumerate(result['risks'], 1):
+            print(f"{i}. {risk['risk']}: {risk['description']}")
+    elif command == 'reports':
+        for name, report in result.items():
+            print(f"{name}:")
+            print(format_table(report))
+            print()
+    elif command == 'sql':
+        print(format_table(result))
+    elif isinstance(result, dict):
+        for key, value in result.items():
+            print(f"{key}: {value}")
+    else:
+        print(result)
+
+
+def main(command, names=(), query=None, params=(), max_rows=DEFAULT_MAX_ROWS, socket_path=DEFAULT_SOCKET,
+         port=None, raw=False):
+    fields = {}
+    if command == 'reports' and names:
+        fields['names'] = list(names)
+    if command == 'sql':
+        fields.update(query=query, params=list(params), max_rows=max_rows)
+    op = 'shutdown' if command == 'stop' else command
+    
+    start = time.perf_counter()
+    try:
+        with AnalyticsClient(socket_path, port) as client:
+            response = client.request(op, **fields)
+    except (ConnectionError, FileNotFoundError) as exc:
+        print(f"❌ No daemon at {socket_path if port is None else f'127.0.0.1:{port}'}: {exc}", file=sys.stderr)
+        return 2
+    except RuntimeError as exc:
+        print(f"❌ {exc}", file=sys.stderr)
+        return 1
+    round_trip = time.perf_counter() - start
+    
+    if raw:
+        print(json.dumps(response['result'], indent=1))
+    else:
+        print_result(command, response['result'])
+    print(f"(data version {response['version']}, served in {response['elapsed_ms']:.1f} ms, "
+          f"round trip {round_trip * 1000:.1f} ms)", file=sys.stderr)
+    return 0
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Query a running analytics_daemon.py.")
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="daemon's Unix socket path")
+    parser.add_argument('--port', type=int, default=None, help="daemon's localhost TCP port (instead of the socket)")
+    parser.add_argument('--json', action='store_true', help="print the raw JSON result")
+    commands = parser.add_subparsers(dest='command', required=True)
+    commands.add_parser('ping')
+    commands.add_parser('status')
+    commands.add_parser('profile', help="Part A summary table and data quality risks")
+    reports = commands.add_parser('reports', help="Part C reports (all, or the named ones)")
+    reports.add_argument('names', nargs='*')
+    sql = commands.add_parser('sql', help="ad-hoc read-only SQL against the warehouse")
+    sql.add_argument('query')
+    sql.add_argument('--param', action='append', default=[], help="positional ? parameter (repeatable)")
+    sql.add_argument('--max-rows', type=int, default=DEFAULT_MAX_ROWS)
+    commands.add_parser('refresh', help="check for new data now")
+    commands.add_parser('stop', help="shut the daemon down")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    sys.exit(main(args.command, getattr(args, 'names', ()), getattr(args, 'query', None),
+                  getattr(args, 'param', ()), getattr(args, 'max_rows', DEFAULT_MAX_ROWS),
+                  args.socket, args.port, args.json))
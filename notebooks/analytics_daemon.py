@@ -0,0 +1,361 @@
+"""
+Resident Analytics Daemon
+K&Co Cloud Cost Intelligence Platform
+
+Long-running local service that keeps the billing data hot, so interactive
+and dashboard queries skip the pandas import, Bronze read and warehouse load
+that every notebook run pays:
+
+- at start it brings the warehouse up to date (incremental_load plus an
+  aggregate refresh, as part_c_sql_execution.py does) and opens the
+  memory-mapped column store (column_store.py)
+- every few seconds it compares the source fingerprints and applies new data
+  incrementally; loads made by other processes (a changed load_state) are
+  picked up too
+- it answers any number of concurrent clients over a Unix socket (or
+  localhost TCP), one thread per connection
+
+Requests and responses are single lines of JSON:
+
+    {"op": "reports", "names": ["top_services"]}
+    {"ok": true, "result": {...}, "version": 3, "elapsed_ms": 0.4}
+
+ops: ping, status, profile (Part A summary table and risks), reports (Part C
+report queries), sql (ad-hoc read-only SQL: `query`, optional `params` and
+`max_rows`), refresh (check for new data now) and shutdown. Tables come back
+as {"columns": [...], "rows": [[...], ...]}.
+
+Profile and report results are computed once per data version and served
+from memory until the next load. Ad-hoc SQL runs on a read-only connection
+per client thread, so it cannot modify the warehouse. analytics_client.py
+is the matching client; it needs only the standard library.
+"""
+
+import argparse
+import json
+import os
+import signal
+import socket
+import socketserver
+import threading
+import time
+from collections import Counter
+from datetime import datetime, timezone
+
+from aggregates import refresh_aggregates, touched_months
+from alert_state import alert_state_path_for
+from column_store import ColumnStore, source_fingerprint
+from completeness_index import completeness_path_for
+from dedup_index import DEDUP_POLICIES
+from ingest_cache import SOURCES
+from parallel_runner import connect_read_only
+from part_a_profiling import build_risks, build_summary_stats, profile_frame
+from part_c_sql_execution import REPORT_QUERIES, run_reports
+from query_cache import load_versions
+from warehouse import LATE_ARRIVAL_DAYS, WAREHOUSE_PATH, connect, load_all
+
+DEFAULT_SOCKET = 'data/analytics.sock'
+POLL_SECONDS = 5.0
+DEFAULT_MAX_ROWS = 10_000
+
+
+def table(frame):
+    """DataFrame -> {'columns': [...], 'rows': [[...], ...]} with JSON-safe values."""
+    split = json.loads(frame.to_json(orient='split', index=False, date_format='iso'))
+    return {'columns': split['columns'], 'rows': split['data']}
+
+
+class AnalyticsState:
+    """The hot data behind the daemon: column store, memoized results and load bookkeeping."""
+    
+    def __init__(self, warehouse_path=WAREHOUSE_PATH, late_arrival_days=LATE_ARRIVAL_DAYS, dedup=None):
+        self.warehouse_path = warehouse_path
+        self.late_arrival_days = late_arrival_days
+        self.dedup = dedup
+        # Serializes loads and memo computations; reads of finished results don't take it
+        self.lock = threading.RLock()
+        self.local = threading.local()
+        self.store = None
+        self.memo = {}
+        self.version = 0
+        self.fingerprints = {}
+        self.load_versions = {}
+        self.last_load = None
+        self.started = time.time()
+        self.requests = Counter()
+    
+    def reader(self):
+        """This thread's read-only warehouse connection."""
+        conn = getattr(self.local, 'conn', None)
+        if conn is None:
+            conn = self.local.conn = connect_read_only(self.warehouse_path)
+        return conn
+    
+    def close_reader(self):
+        conn = getattr(self.local, 'conn', None)
+        if conn is not None:
+            conn.close()
+            self.local.conn = None
+    
+    def _new_version(self, versions):
+        self.store = ColumnStore.open()
+        self.memo = {}
+        self.load_versions = versions
+        self.version += 1
+    
+    def load(self):
+        """Apply whatever is new in the sources to the warehouse and column store; returns the load stats."""
+        with self.lock:
+            fingerprints = {provider: source_fingerprint(provider) for provider in SOURCES}
+            start = time.perf_counter()
+            conn = connect(self.warehouse_path)
+            try:
+                stats = load_all(conn, self.late_arrival_days, dedup=self.dedup,
+                                 completeness_path=completeness_path_for(self.warehouse_path),
+                                 alert_state_path=alert_state_path_for(self.warehouse_path))
+                refreshed = refresh_aggregates(conn, touched_months(stats))
+                versions = load_versions(conn)
+            finally:
+                conn.close()
+            self.fingerprints = fingerprints
+            self._new_version(versions)
+            self.last_load = {
+                'at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+                'seconds': round(time.perf_counter() - start, 3),
+                'rows_inserted': {s['provider']: s['rows_inserted'] for s in stats},
+                'months_refreshed': refreshed,
+            }
+            return stats
+    
+    def poll(self):
+        """
+        Load new source data, or pick up a load another process made.
+        Returns True if the data version moved.
+        """
+        with self.lock:
+            if {provider: source_fingerprint(provider) for provider in SOURCES} != self.fingerprints:
+                self.load()
+                return True
+            versions = load_versions(self.reader())
+            if versions != self.load_versions:
+                self._new_version(versions)
+                return True
+            return False
+    
+    def memoized(self, key, compute):
+        """compute() once per data version."""
+        result = self.memo.get(key)
+        if result is None:
+            with self.lock:
+                result = self.memo.get(key)
+                if result is None:
+                    result = self.memo[key] = compute()
+        return result
+    
+    def profile(self):
+        def compute():
+            profiles = {provider: profile_frame(self.store.provider_frame(provider), spec['id_col'])
+                        for provider, spec in SOURCES.items()}
+            risks = build_risks(profiles['aws'], profiles['gcp'])
+            return {
+                'summary': table(build_summary_stats(profiles['aws'], profiles['gcp'])),
+                'risks': [{'risk': r['risk'], 'description': r['description']} for r in risks],
+            }
+        return self.memoized('profile', compute)
+    
+    def reports(self, names=None):
+        unknown = sorted(set(names or ()) - set(REPORT_QUERIES))
+        if unknown:
+            raise ValueError(f"unknown report(s) {', '.join(unknown)}; choose from {', '.join(REPORT_QUERIES)}")
+        reports = self.memoized('reports', lambda: {
+            name: table(frame) for name, frame in run_reports(self.reader()).items()
+        })
+        return {name: reports[name] for name in names or REPORT_QUERIES}
+    
+    def sql(self, query, params=(), max_rows=DEFAULT_MAX_ROWS):
+        cursor = self.reader().execute(query, params)
+        rows = cursor.fetchmany(max_rows + 1)
+        return {
+            'columns': [d[0] for d in cursor.description or ()],
+            'rows': [list(row) for row in rows[:max_rows]],
+            'truncated': len(rows) > max_rows,
+        }
+    
+    def status(self):
+        return {
+            'version': self.version,
+            'uptime_seconds': round(time.time() - self.started, 1),
+            'warehouse': self.warehouse_path,
+            'load_versions': self.load_versions,
+            'last_load': self.last_load,
+            'store_rows': self.store.manifest['rows'] if self.store else None,
+            'memoized': sorted(self.memo),
+            'requests': dict(self.requests),
+        }
+    
+    def dispatch(self, request, server):
+        op = request.get('op')
+        self.requests[op] += 1
+        if op == 'ping':
+            return 'pong'
+        if op == 'status':
+            return self.status()
+        if op == 'profile':
+            return self.profile()
+        if op == 'reports':
+            return self.reports(request.get('names'))
+        if op == 'sql':
+            return self.sql(request['query'], request.get('params', ()), request.get('max_rows', DEFAULT_MAX_ROWS))
+        if op == 'refresh':
+            return {'changed': self.poll(), 'version': self.version}
+        if op == 'shutdown':
+            # The handler stops the server once this reply has been sent
+            return 'shutting down'
+        raise ValueError(f"unknown op {op!r}")
+
+
+class RequestHandler(socketserver.StreamRequestHandler):
+    """One client connection: a JSON request per line, a JSON response per line."""
+    
+    shutdown_requested = False
+    
+    def handle(self):
+        state = self.server.state
+        for line in self.rfile:
+            if not line.strip():
+                continue
+            start = time.perf_counter()
+            try:
+                request = json.loads(line)
+                response = {'ok': True, 'result': state.dispatch(request, self.server)}
+            except Exception as exc:
+                response = {'ok': False, 'error': f"{type(exc).__name__}: {exc}"}
+            response['version'] = state.version
+            response['elapsed_ms'] = round((time.perf_counter() - start) * 1000, 3)
+            self.wfile.write(json.dumps(response, default=str).encode() + b'\n')
+            self.wfile.flush()
+            if response['ok'] and request.get('op') == 'shutdown':
+                self.shutdown_requested = True
+                break
+    
+    def finish(self):
+        super().finish()
+        self.server.state.close_reader()
+        if self.shutdown_requested:
+            # The reply is flushed and the connection closed: stop serve_forever()
+            # (this runs on the handler thread, so it does not block the loop)
+            self.server.shutdown()
+
+
+class UnixServer(socketserver.ThreadingUnixStreamServer):
+    daemon_threads = True
+    request_queue_size = 128
+
+
+class TCPServer(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    request_queue_size = 128
+    allow_reuse_address = True
+
+
+def daemon_listening(socket_path):
+    """True if something accepts connections on the Unix socket."""
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as sock:
+        try:
+            sock.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def make_server(state, socket_path=DEFAULT_SOCKET, port=None):
+    """A threaded server on the Unix socket, or on localhost:port when a port is given."""
+    if port is not None:
+        server = TCPServer(('127.0.0.1', port), RequestHandler)
+    else:
+        if os.path.exists(socket_path):
+            if daemon_listening(socket_path):
+                raise RuntimeError(f"a daemon is already listening on {socket_path}")
+            os.remove(socket_path)
+        server = UnixServer(socket_path, RequestHandler)
+    server.state = state
+    return server
+
+
+def watch(state, poll_seconds, stop):
+    """Poll for new data until `stop` is set."""
+    while not stop.wait(poll_seconds):
+        try:
+            loaded = state.last_load
+            if state.poll():
+                if state.last_load is loaded:
+                    detail = "picked up a load made by another process"
+                else:
+                    detail = (f"loaded {sum(state.last_load['rows_inserted'].values()):,} records, refreshed months "
+                              f"{', '.join(str(m) for m in state.last_load['months_refreshed']) or 'none'}")
+                print(f"✓ Data version {state.version}: {detail}", flush=True)
+        except Exception as exc:
+            print(f"⚠️  Poll failed: {type(exc).__name__}: {exc}", flush=True)
+
+
+def main(warehouse_path=WAREHOUSE_PATH, socket_path=DEFAULT_SOCKET, port=None, poll_seconds=POLL_SECONDS,
+         late_arrival_days=LATE_ARRIVAL_DAYS, dedup=None):
+    print("=" * 80)
+    print("RESIDENT ANALYTICS DAEMON")
+    print("=" * 80)
+    print()
+    
+    state = AnalyticsState(warehouse_path, late_arrival_days, dedup)
+    stats = state.load()
+    for s in stats:
+        print(f"✓ {s['provider'].upper()}: {s['mode']} load, {s['rows_inserted']:,} records inserted, "
+              f"{s['rows_total']:,} in warehouse, watermark {s['watermark']}")
+    print(f"✓ Warehouse and column store ready in {state.last_load['seconds']:.2f}s "
+          f"({state.store.manifest['rows']:,} rows hot)")
+    
+    # Warm the memoized results so the first client doesn't pay for them
+    start = time.perf_counter()
+    state.profile()
+    state.reports()
+    state.close_reader()
+    print(f"✓ Profile and {len(REPORT_QUERIES)} reports precomputed in {(time.perf_counter() - start) * 1000:.0f} ms")
+    
+    server = make_server(state, socket_path, port)
+    address = f"127.0.0.1:{port}" if port is not None else socket_path
+    stop = threading.Event()
+    watcher = threading.Thread(target=watch, args=(state, poll_seconds, stop), daemon=True)
+    watcher.start()
+    
+    def terminate(signum, frame):
+        threading.Thread(target=server.shutdown, daemon=True).start()
+    signal.signal(signal.SIGTERM, terminate)
+    
+    print(f"✓ Listening on {address} (polling for new data every {poll_seconds:g}s; Ctrl-C to stop)")
+    print()
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        stop.set()
+        server.server_close()
+        if port is None and os.path.exists(socket_path):
+            os.remove(socket_path)
+    print(f"✓ Stopped after serving {sum(state.requests.values()):,} requests")
+    return state
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Keep billing data hot and serve queries over a local socket.")
+    parser.add_argument('--warehouse', default=WAREHOUSE_PATH)
+    parser.add_argument('--socket', default=DEFAULT_SOCKET, help="Unix socket path")
+    parser.add_argument('--port', type=int, default=None, help="listen on localhost TCP instead of the socket")
+    parser.add_argument('--poll-seconds', type=float, default=POLL_SECONDS, help="how often to check for new data")
+    parser.add_argument('--late-arrival-days', type=int, default=LATE_ARRIVAL_DAYS)
+    parser.add_argument('--dedup', choices=DEDUP_POLICIES, default=None)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.warehouse, args.socket, args.port, args.poll_seconds, args.late_arrival_days, args.dedup)
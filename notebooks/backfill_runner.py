@@ -0,0 +1,475 @@
+"""
+Partition Backfill Runner
+K&Co Cloud Cost Intelligence Platform
+
+Reprocesses a range of billing history ("backfill capability for historical
+corrections" and the weekend full refresh in Part D) as independent
+provider/month partitions:
+
+    load      one month of one provider from the Bronze cache
+    validate  the validation_engine rules, with the date window set to the month
+    dedup     within the month (drop / aggregate), like incremental_load --dedup
+    aggregate the month's rows replace the warehouse month, then its aggregates
+
+The first three steps run in a process pool. Each partition is staged
+atomically (written under a temporary name, then renamed):
+
+    data/backfill/staging/cloud=aws/month=2025-01/rows.parquet
+    data/backfill/staging/cloud=aws/month=2025-01/stats.json
+
+The parent process publishes staged partitions one at a time, each in a
+single SQLite transaction. The transaction deletes the provider's rows for
+the month, inserts the staged rows, checks the row count and cost total
+against the staging stats, updates load_state and rebuilds the month's
+aggregates. The load_state watermark only advances over months loaded
+without a gap from the provider's first month, so a partial backfill into a
+new warehouse leaves the other months to the next incremental load. A
+failure rolls the whole month back, so a month is either the old rows or
+the new ones, never both and never half. The derived
+completeness and alert state files are brought in line afterwards.
+
+data/backfill/state.json records every staged / published partition with a
+fingerprint of its inputs (the source hash, the dedup policy, the rule names),
+so the runner
+- resumes after a crash: published partitions are skipped (as long as the
+  warehouse month still has the recorded row count and cost), and staged
+  ones are published without being recomputed
+- is idempotent: re-running a finished range does nothing, and --force
+  rebuilds the months to the same contents
+
+A partition with critical validation failures (other than key_unique, which
+dedup handles) is not published unless --on-invalid quarantine sets the
+failing rows aside in quarantine.parquet. The other partitions carry on.
+"""
+
+import argparse
+import json
+import math
+import os
+import shutil
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from aggregates import month_bounds, refresh_aggregates, refresh_month
+from alert_state import AlertState, alert_state_path_for, seed_rows
+from billing_frame import PROVIDER_LABELS
+from column_store import source_fingerprint
+from completeness_index import CompletenessIndex, completeness_path_for
+from dedup_index import DEDUP_POLICIES, deduplicate_batch
+from ingest_cache import SOURCES, parquet_available, partition_files, read_source_chunks
+from parallel_runner import resolve_workers
+from validation_engine import RULES, CompiledRules, ValidationAccumulator
+from warehouse import (
+    LATE_ARRIVAL_DAYS, UNIFIED_COLUMNS, UNIFIED_TABLE, WAREHOUSE_PATH, connect, get_load_state, unified_rows
+)
+
+INVALID_POLICIES = ('fail', 'quarantine')
+
+# Violations of these rules don't block a partition (dedup resolves key repeats)
+NON_BLOCKING_RULES = {'key_unique'}
+
+
+class PartitionRejected(Exception):
+    """A partition failed validation and was not staged."""
+
+
+def backfill_dir_for(warehouse_path):
+    """Backfill state / staging directory that belongs to a warehouse (data/warehouse.db -> data/backfill)."""
+    return os.path.join(os.path.dirname(warehouse_path), 'backfill')
+
+
+def month_label(month_key):
+    return f"{month_key // 100}-{month_key % 100:02d}"
+
+
+def partition_id(provider, month_key):
+    return f"{provider}/{month_label(month_key)}"
+
+
+def available_months(provider):
+    """YYYYMM keys of the months a provider has data for."""
+    if parquet_available():
+        return sorted({int(path.split('year=')[1][:4]) * 100 + int(path.split('month=')[1][:2])
+                       for path in partition_files(provider)})
+    months = set()
+    for chunk in read_source_chunks(provider):
+        months.update((chunk['date'].dt.year * 100 + chunk['date'].dt.month).unique().tolist())
+    return sorted(months)
+
+
+def load_month(provider, month_key):
+    """One provider's Bronze rows for one month."""
+    start, end = (pd.Timestamp(bound) for bound in month_bounds(month_key))
+    if parquet_available():
+        frames = [pd.read_parquet(path) for path in partition_files(provider, since=start)
+                  if int(path.split('year=')[1][:4]) * 100 + int(path.split('month=')[1][:2]) == month_key]
+    else:
+        frames = list(read_source_chunks(provider))
+    frame = pd.concat(frames, ignore_index=True) if frames else pd.DataFrame(columns=['date'])
+    return frame[(frame['date'] >= start) & (frame['date'] < end)].reset_index(drop=True)
+
+
+def write_frame(frame, path_stem):
+    """Parquet when pyarrow is installed, else pickle; returns the file name."""
+    if parquet_available():
+        frame.to_parquet(path_stem + '.parquet', index=False)
+        return os.path.basename(path_stem) + '.parquet'
+    frame.to_pickle(path_stem + '.pkl')
+    return os.path.basename(path_stem) + '.pkl'
+
+
+def read_frame(path):
+    return pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+
+
+def stage_partition(provider, month_key, staging_dir, fingerprint, dedup=None, on_invalid='fail'):
+    """
+    Load, validate and dedup one partition into its staging directory
+    (atomically). Returns the partition's stats; raises PartitionRejected.
+    """
+    start = time.perf_counter()
+    batch = load_month(provider, month_key)
+    
+    first, end = month_bounds(month_key)
+    rules = CompiledRules(provider, window=(pd.Timestamp(first), pd.Timestamp(end) - pd.Timedelta(days=1)))
+    bits, hashes = rules.evaluate(batch)
+    validation = ValidationAccumulator(rules, sample_size=0).update(
+        batch, bits, hashes, partition_id(provider, month_key))
+    result = validation.result()['rules']
+    blocking = [i for i, (name, severity) in enumerate(zip(rules.names, rules.severities))
+                if severity == 'critical' and name not in NON_BLOCKING_RULES]
+    blocking_mask = sum(1 << i for i in blocking)
+    invalid = (bits & blocking_mask) != 0 if blocking_mask else np.zeros(len(batch), dtype=bool)
+    if invalid.any() and on_invalid == 'fail':
+        failing = result.iloc[blocking]
+        failing = failing[failing['violations'] > 0]
+        raise PartitionRejected(', '.join(f"{row.rule}={row.violations}" for row in failing.itertuples()))
+    
+    final_dir = os.path.join(staging_dir, f'cloud={provider}', f'month={month_label(month_key)}')
+    tmp_dir = f"{final_dir}.tmp-{os.getpid()}"
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    try:
+        files = {}
+        if invalid.any():
+            files['quarantine'] = write_frame(batch[invalid], os.path.join(tmp_dir, 'quarantine'))
+            batch = batch[~invalid].reset_index(drop=True)
+        dedup_stats = None
+        if dedup:
+            # A month holds every row of its keys, so dedup within it is exact
+            batch, dedup_stats = deduplicate_batch(batch, SOURCES[provider]['id_col'], dedup)
+        files['rows'] = write_frame(batch, os.path.join(tmp_dir, 'rows'))
+        stats = {
+            'provider': provider,
+            'month_key': month_key,
+            'fingerprint': fingerprint,
+            'rows_in': int(len(invalid)),
+            'rows_quarantined': int(invalid.sum()),
+            'rows_out': int(len(batch)),
+            'cost': float(np.nansum(batch['cost_usd'].to_numpy(dtype='float64'))) if len(batch) else 0.0,
+            'violations': dict(zip(result['rule'], result['violations'].astype(int).tolist())),
+            'dedup': dedup_stats,
+            'files': files,
+            'seconds': round(time.perf_counter() - start, 3),
+        }
+        with open(os.path.join(tmp_dir, 'stats.json'), 'w') as f:
+            json.dump(stats, f, indent=1, default=int)
+        shutil.rmtree(final_dir, ignore_errors=True)
+        os.replace(tmp_dir, final_dir)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+    return stats
+
+
+def staged_stats(staging_dir, provider, month_key):
+    """Stats of a completely staged partition, or None."""
+    try:
+        with open(os.path.join(staging_dir, f'cloud={provider}', f'month={month_label(month_key)}',
+                               'stats.json')) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def month_totals(conn, provider, month_key):
+    """(row count, cost) of a provider's month in the warehouse."""
+    first, end = month_bounds(month_key)
+    return conn.execute(
+        f"SELECT COUNT(*), COALESCE(SUM(cost_usd), 0) FROM {UNIFIED_TABLE} "
+        f"WHERE date >= ? AND date < ? AND cloud_provider = ?", (first, end, PROVIDER_LABELS[provider])
+    ).fetchone()
+
+
+def contiguous_watermark(conn, provider, available):
+    """
+    Latest date the warehouse holds every row up to: the last date of the
+    loaded months that run unbroken from the provider's first available
+    month, or the day before that month when it is not loaded.
+    """
+    label = PROVIDER_LABELS[provider]
+    loaded = {key for (key,) in conn.execute(
+        f"SELECT DISTINCT month_key FROM {UNIFIED_TABLE} WHERE cloud_provider = ?", (label,))}
+    prefix = None
+    for key in available:
+        if key not in loaded:
+            break
+        prefix = key
+    if prefix is None:
+        return (pd.Timestamp(month_bounds(available[0])[0]) - pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    return conn.execute(
+        f"SELECT MAX(date) FROM {UNIFIED_TABLE} WHERE cloud_provider = ? AND month_key <= ?", (label, prefix)
+    ).fetchone()[0]
+
+
+def publish_partition(conn, stats, staging_dir, warehouse_path, available):
+    """
+    Replace the warehouse month with the staged rows in one transaction, then
+    sync the indexes. `available` lists the provider's months (YYYYMM keys).
+    """
+    provider, month_key = stats['provider'], stats['month_key']
+    label = PROVIDER_LABELS[provider]
+    part_dir = os.path.join(staging_dir, f'cloud={provider}', f'month={month_label(month_key)}')
+    batch = read_frame(os.path.join(part_dir, stats['files']['rows']))
+    rows = unified_rows(batch, provider) if len(batch) else pd.DataFrame(columns=UNIFIED_COLUMNS)
+    first, end = month_bounds(month_key)
+    
+    with conn:
+        deleted = conn.execute(
+            f"DELETE FROM {UNIFIED_TABLE} WHERE date >= ? AND date < ? AND cloud_provider = ?", (first, end, label)
+        ).rowcount
+        conn.executemany(
+            f"INSERT INTO {UNIFIED_TABLE} ({', '.join(UNIFIED_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(UNIFIED_COLUMNS))})",
+            rows[UNIFIED_COLUMNS].itertuples(index=False, name=None)
+        )
+        count, cost = month_totals(conn, provider, month_key)
+        if count != stats['rows_out'] or not math.isclose(cost, stats['cost'], abs_tol=0.005):
+            raise RuntimeError(f"{partition_id(provider, month_key)}: warehouse has {count} rows / ${cost:,.2f}, "
+                               f"staged {stats['rows_out']} rows / ${stats['cost']:,.2f}")
+        # The watermark promises every row up to it is loaded: it never moves
+        # back, and moves forward only over months loaded without a gap, so the
+        # next incremental load still fetches the months this run didn't cover
+        state = get_load_state(conn, provider)
+        watermark = contiguous_watermark(conn, provider, available)
+        if state is not None:
+            watermark = max(watermark, state['watermark'])
+        total = conn.execute(f"SELECT COUNT(*) FROM {UNIFIED_TABLE} WHERE cloud_provider = ?", (label,)).fetchone()[0]
+        # load_count moves, so cached query results and the analytics daemon see the change
+        conn.execute("""
+        INSERT INTO load_state (provider, watermark, rows_loaded, loaded_at, load_count)
+        VALUES (?, ?, ?, ?, 1)
+        ON CONFLICT (provider) DO UPDATE SET
+            watermark = excluded.watermark,
+            rows_loaded = excluded.rows_loaded,
+            loaded_at = excluded.loaded_at,
+            load_count = load_state.load_count + 1
+        """, (provider, watermark, total, datetime.now(timezone.utc).isoformat(timespec='seconds')))
+        refresh_month(conn, month_key)
+    
+    # Derived indexes (rebuildable; a crash before this point re-publishes the month)
+    completeness_path = completeness_path_for(warehouse_path)
+    if os.path.exists(completeness_path):
+        completeness = CompletenessIndex.load(completeness_path)
+        first_day = int((np.datetime64(first) - np.datetime64('1970-01-01')).astype(int))
+        last_day = int((np.datetime64(end) - np.datetime64('1970-01-01')).astype(int)) - 1
+        completeness.clear_days(label, first_day, last_day)
+        completeness.add(rows)
+        completeness.save(completeness_path)
+    return deleted
+
+
+class BackfillState:
+    """Per-partition status (staged / published / failed), rewritten atomically after every change."""
+    
+    def __init__(self, path):
+        self.path = path
+        try:
+            with open(path) as f:
+                self.partitions = json.load(f)
+        except (OSError, ValueError):
+            self.partitions = {}
+    
+    def get(self, pid):
+        return self.partitions.get(pid)
+    
+    def set(self, pid, status, fingerprint, **fields):
+        self.partitions[pid] = {'status': status, 'fingerprint': fingerprint,
+                                'at': datetime.now(timezone.utc).isoformat(timespec='seconds'), **fields}
+        os.makedirs(os.path.dirname(self.path) or '.', exist_ok=True)
+        tmp = self.path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.partitions, f, indent=1, default=int)
+        os.replace(tmp, self.path)
+
+
+def still_published(conn, provider, month_key, entry):
+    """True if the warehouse month still holds the rows / cost recorded when it was published."""
+    count, cost = month_totals(conn, provider, month_key)
+    return count == entry.get('rows') and math.isclose(cost, entry.get('cost', math.nan), abs_tol=0.01)
+
+
+def run_fingerprints(providers, dedup):
+    """
+    Input fingerprint per provider: a partition is redone when its fingerprint
+    changes. Failed partitions are always retried, so --on-invalid is not part of it.
+    """
+    return {provider: f"{source_fingerprint(provider)}|dedup={dedup}|rules={','.join(RULES)}"
+            for provider in providers}
+
+
+def backfill(providers=tuple(SOURCES), months=None, warehouse_path=WAREHOUSE_PATH, workers=None, dedup=None,
+             on_invalid='fail', force=False):
+    """
+    Stage and publish every (provider, month) partition of the range.
+    `months` is (first YYYYMM, last YYYYMM) or None for all available months.
+    Returns {'published', 'skipped', 'failed'} lists of partition stats / errors
+    and the resulting load_state 'watermarks'.
+    """
+    backfill_dir = backfill_dir_for(warehouse_path)
+    staging_dir = os.path.join(backfill_dir, 'staging')
+    state = BackfillState(os.path.join(backfill_dir, 'state.json'))
+    fingerprints = run_fingerprints(providers, dedup)
+    
+    available = {provider: available_months(provider) for provider in providers}
+    partitions = [(provider, key) for provider in providers for key in available[provider]
+                  if months is None or months[0] <= key <= months[1]]
+    conn = connect(warehouse_path)
+    # Builds the aggregate tables (all months) if they don't exist yet
+    refresh_aggregates(conn, [])
+    
+    outcome = {'published': [], 'skipped': [], 'failed': []}
+    to_publish, to_stage = [], []
+    for provider, key in partitions:
+        pid, fingerprint = partition_id(provider, key), fingerprints[provider]
+        entry = state.get(pid)
+        if (not force and entry and entry['fingerprint'] == fingerprint and entry['status'] == 'published'
+                and still_published(conn, provider, key, entry)):
+            outcome['skipped'].append(pid)
+            continue
+        staged = None if force else staged_stats(staging_dir, provider, key)
+        if staged is not None and staged['fingerprint'] == fingerprint:
+            to_publish.append(staged)
+        else:
+            to_stage.append((provider, key))
+    
+    def publish(stats):
+        pid = partition_id(stats['provider'], stats['month_key'])
+        try:
+            stats['rows_replaced'] = publish_partition(conn, stats, staging_dir, warehouse_path,
+                                                       available[stats['provider']])
+        except Exception as exc:
+            state.set(pid, 'failed', stats['fingerprint'], error=str(exc))
+            outcome['failed'].append({'partition': pid, 'error': str(exc)})
+            return
+        state.set(pid, 'published', stats['fingerprint'], rows=stats['rows_out'], cost=round(stats['cost'], 2))
+        outcome['published'].append(stats)
+    
+    try:
+        for stats in to_publish:
+            publish(stats)
+        if to_stage:
+            with ProcessPoolExecutor(min(resolve_workers(workers), len(to_stage))) as pool:
+                futures = {
+                    pool.submit(stage_partition, provider, key, staging_dir, fingerprints[provider], dedup,
+                                on_invalid): (provider, key)
+                    for provider, key in to_stage
+                }
+                # Publish in completion order: partitions are independent months
+                for future in as_completed(futures):
+                    provider, key = futures[future]
+                    try:
+                        stats = future.result()
+                    except Exception as exc:
+                        error = str(exc) if isinstance(exc, PartitionRejected) else f"{type(exc).__name__}: {exc}"
+                        state.set(partition_id(provider, key), 'failed', fingerprints[provider], error=error)
+                        outcome['failed'].append({'partition': partition_id(provider, key), 'error': error})
+                        continue
+                    state.set(partition_id(provider, key), 'staged', stats['fingerprint'])
+                    publish(stats)
+        
+        # Rewritten months may be long settled in the alert state: re-seed those providers
+        alert_state_path = alert_state_path_for(warehouse_path)
+        if outcome['published'] and os.path.exists(alert_state_path):
+            alerts = AlertState.load(alert_state_path)
+            for provider in sorted({stats['provider'] for stats in outcome['published']}):
+                alerts.update(provider, seed_rows(conn, PROVIDER_LABELS[provider]), settle_days=LATE_ARRIVAL_DAYS)
+            alerts.save(alert_state_path)
+        outcome['watermarks'] = {provider: (get_load_state(conn, provider) or {}).get('watermark')
+                                 for provider in providers}
+    finally:
+        conn.close()
+    return outcome
+
+
+def parse_month(text):
+    """'2025-03' -> 202503."""
+    year, month = text.split('-')
+    return int(year) * 100 + int(month)
+
+
+def main(start=None, end=None, providers=tuple(SOURCES), warehouse_path=WAREHOUSE_PATH, workers=None, dedup=None,
+         on_invalid='fail', force=False):
+    print("=" * 80)
+    print("PARTITION BACKFILL")
+    print("=" * 80)
+    print()
+    
+    months = None
+    if start or end:
+        months = (parse_month(start) if start else 0, parse_month(end) if end else 999999)
+    span = f"{start or 'first'} .. {end or 'last'}"
+    print(f"Range {span}, providers {', '.join(providers)}, dedup {dedup or 'off'}, "
+          f"{resolve_workers(workers)} worker(s){' (forced)' if force else ''}")
+    print()
+    
+    begin = time.perf_counter()
+    outcome = backfill(providers, months, warehouse_path, workers, dedup, on_invalid, force)
+    elapsed = time.perf_counter() - begin
+    
+    published = sorted(outcome['published'], key=lambda s: (s['provider'], s['month_key']))
+    if published:
+        table = pd.DataFrame([{
+            'partition': partition_id(s['provider'], s['month_key']),
+            'rows_in': s['rows_in'],
+            'quarantined': s['rows_quarantined'],
+            'rows_out': s['rows_out'],
+            'replaced': s['rows_replaced'],
+            'cost_usd': round(s['cost'], 2),
+            'stage_s': s['seconds'],
+        } for s in published])
+        print(table.to_string(index=False))
+        print()
+    for failure in outcome['failed']:
+        print(f"❌ {failure['partition']}: {failure['error']}")
+    print(f"✓ {len(published)} partition(s) published, {len(outcome['skipped'])} already done, "
+          f"{len(outcome['failed'])} failed in {elapsed:.2f}s")
+    for provider, watermark in outcome['watermarks'].items():
+        print(f"  {provider} watermark: {watermark or 'none'} (the next incremental load fetches what follows)")
+    return outcome
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Backfill provider/month partitions through load, validate, "
+                                                 "dedup and aggregate.")
+    parser.add_argument('--start', default=None, help="first month (YYYY-MM; default: first available)")
+    parser.add_argument('--end', default=None, help="last month (YYYY-MM; default: last available)")
+    parser.add_argument('--providers', default=','.join(SOURCES), help="comma-separated providers")
+    parser.add_argument('--warehouse', default=WAREHOUSE_PATH)
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument('--dedup', choices=DEDUP_POLICIES, default=None)
+    parser.add_argument('--on-invalid', choices=INVALID_POLICIES, default='fail',
+                        help="reject a partition with critical violations, or quarantine the failing rows")
+    parser.add_argument('--force', action='store_true', help="redo partitions that are already published")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    outcome = main(args.start, args.end, tuple(args.providers.split(',')), args.warehouse, args.workers, args.dedup,
+                   args.on_invalid, args.force)
+    raise SystemExit(1 if outcome['failed'] else 0)
@@ -0,0 +1,260 @@
+"""
+Scale Benchmark Suite
+K&Co Cloud Cost Intelligence Platform
+
+Times and memory-profiles every Part A profiling section and every Part C
+query on synthetic datasets (synthetic_data.py) at several scales.
+
+Each scale gets its own project-shaped directory under data/benchmark/
+(data/*.csv, data/bronze/, data/warehouse.db), and the steps run with that
+directory as the working directory, so the pipeline code runs unmodified
+against it. Every step is idempotent and is run twice: once for wall time
+and once under tracemalloc for the peak of Python/NumPy allocations (SQLite's
+own page cache is not traced; the process high-water RSS is recorded per
+scale as well).
+
+Results are written as JSON. Given a saved baseline, any step that got slower
+or bigger than the tolerances allow is reported as a regression and the run
+exits non-zero.
+"""
+
+import argparse
+import json
+import os
+import platform
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+from ingest_cache import SOURCES, ingest, iter_billing_chunks
+from billing_frame import load_compact_providers
+from part_a_profiling import PROFILE_SECTIONS
+from streaming_profiler import DEFAULT_CHUNKSIZE, profile_chunks
+from warehouse import connect, load_all
+from aggregates import refresh_aggregates
+from part_c_sql_execution import REPORT_QUERIES
+from synthetic_data import write_dataset
+from instrumentation import max_rss_mb
+
+import pandas as pd
+
+BENCH_DIR = 'data/benchmark'
+RESULTS_PATH = os.path.join(BENCH_DIR, 'results.json')
+BASELINE_PATH = os.path.join(BENCH_DIR, 'baseline.json')
+
+SCALES = [10_000, 100_000, 1_000_000]
+
+# A step regresses when it is this much slower/bigger than the baseline...
+TIME_TOLERANCE = 0.25
+MEMORY_TOLERANCE = 0.25
+# ...and the absolute change is above the noise floor
+MIN_SECONDS = 0.1
+MIN_MB = 1.0
+
+
+@contextmanager
+def working_directory(path):
+    previous = os.getcwd()
+    os.chdir(path)
+    try:
+        yield
+    finally:
+        os.chdir(previous)
+
+
+def measure(fn, memory=True):
+    """Run fn for wall time, then again under tracemalloc for peak memory."""
+    start = time.perf_counter()
+    fn()
+    stats = {'seconds': time.perf_counter() - start}
+    if memory:
+        tracemalloc.start()
+        try:
+            fn()
+            stats['peak_mb'] = tracemalloc.get_traced_memory()[1] / 1024 ** 2
+        finally:
+            tracemalloc.stop()
+    return stats
+
+
+def benchmark_steps():
+    """
+    (name, fn) pairs for one scale, in run order. Later steps read what the
+    earlier ones build (Bronze cache, compact frames, warehouse).
+    """
+    frames = {}
+    
+    def load():
+        frames.update(load_compact_providers())
+    
+    def section(name):
+        def run():
+            for provider, spec in SOURCES.items():
+                PROFILE_SECTIONS[name](frames[provider], spec['id_col'])
+        return run
+    
+    def streaming():
+        for provider, spec in SOURCES.items():
+            profile_chunks(iter_billing_chunks(provider, DEFAULT_CHUNKSIZE), spec['id_col']).result()
+    
+    def warehouse_load():
+        conn = connect()
+        try:
+            load_all(conn, full_refresh=True)
+        finally:
+            conn.close()
+    
+    def warehouse_refresh():
+        conn = connect()
+        try:
+            refresh_aggregates(conn)
+        finally:
+            conn.close()
+    
+    def query(sql):
+        def run():
+            conn = connect()
+            try:
+                pd.read_sql_query(sql, conn)
+            finally:
+                conn.close()
+        return run
+    
+    steps = [('part_a.ingest', lambda: [ingest(provider) for provider in SOURCES]),
+             ('part_a.load', load)]
+    steps += [(f'part_a.section.{name}', section(name)) for name in PROFILE_SECTIONS]
+    steps += [('part_a.streaming_profile', streaming),
+              ('part_c.load', warehouse_load),
+              ('part_c.refresh_aggregates', warehouse_refresh)]
+    steps += [(f'part_c.query.{name}', query(sql)) for name, sql in REPORT_QUERIES.items()]
+    return steps
+
+
+def run_scale(rows, seed=0, bench_dir=BENCH_DIR, memory=True, verbose=True):
+    """Generate (or reuse) the dataset for one scale and measure every step."""
+    scale_dir = os.path.join(bench_dir, str(rows))
+    marker = os.path.join(scale_dir, 'dataset.json')
+    spec = {'rows_per_provider': rows, 'seed': seed}
+    
+    generate_seconds = None
+    existing = None
+    if os.path.exists(marker):
+        with open(marker) as f:
+            existing = json.load(f)
+    if existing != spec:
+        start = time.perf_counter()
+        write_dataset(scale_dir, rows, seed)
+        generate_seconds = time.perf_counter() - start
+        with open(marker, 'w') as f:
+            json.dump(spec, f)
+    
+    result = {'rows_per_provider': rows, 'generate_seconds': generate_seconds, 'steps': {}}
+    with working_directory(scale_dir):
+        for name, fn in benchmark_steps():
+            result['steps'][name] = measure(fn, memory)
+            if verbose:
+                stats = result['steps'][name]
+                peak = f" {stats['peak_mb']:9.1f} MB" if 'peak_mb' in stats else ''
+                print(f"  {name:<40} {stats['seconds']:9.3f} s{peak}")
+    result['max_rss_mb'] = max_rss_mb()
+    return result
+
+
+def run_benchmarks(scales=SCALES, seed=0, bench_dir=BENCH_DIR, memory=True, verbose=True):
+    results = {
+        'created_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+        'python': platform.python_version(),
+        'platform': platform.platform(),
+        'cpu_count': os.cpu_count(),
+        'seed': seed,
+        'scales': {},
+    }
+    for rows in scales:
+        if verbose:
+            print(f"Scale: {rows:,} rows per provider")
+        results['scales'][str(rows)] = run_scale(rows, seed, bench_dir, memory, verbose)
+        if verbose:
+            print()
+    return results
+
+
+def compare(results, baseline, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    """Steps slower or bigger than the baseline beyond tolerance (and noise floor)."""
+    checks = [('seconds', time_tolerance, MIN_SECONDS), ('peak_mb', memory_tolerance, MIN_MB)]
+    regressions = []
+    for scale, current in results['scales'].items():
+        previous = baseline.get('scales', {}).get(scale)
+        if previous is None:
+            continue
+        for step, stats in current['steps'].items():
+            before = previous['steps'].get(step, {})
+            for metric, tolerance, floor in checks:
+                if metric not in stats or metric not in before:
+                    continue
+                old, new = before[metric], stats[metric]
+                if new > old * (1 + tolerance) and new - old > floor:
+                    regressions.append({
+                        'scale': scale,
+                        'step': step,
+                        'metric': metric,
+                        'baseline': round(old, 4),
+                        'current': round(new, 4),
+                        'change_pct': round((new / old - 1) * 100, 1) if old else None,
+                    })
+    return regressions
+
+
+def main(scales=SCALES, seed=0, output=RESULTS_PATH, baseline_path=BASELINE_PATH,
+         save_baseline=False, memory=True, time_tolerance=TIME_TOLERANCE, memory_tolerance=MEMORY_TOLERANCE):
+    print("=" * 80)
+    print("SCALE BENCHMARK")
+    print("=" * 80)
+    print()
+    
+    results = run_benchmarks(scales, seed, memory=memory)
+    
+    os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+    with open(output, 'w') as f:
+        json.dump(results, f, indent=2)
+    print(f"✓ Results written to {output}")
+    
+    regressions = []
+    if save_baseline:
+        with open(baseline_path, 'w') as f:
+            json.dump(results, f, indent=2)
+        print(f"✓ Baseline saved to {baseline_path}")
+    elif os.path.exists(baseline_path):
+        with open(baseline_path) as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, time_tolerance, memory_tolerance)
+        if regressions:
+            print(f"✗ {len(regressions)} regression(s) against {baseline_path}:")
+            print(pd.DataFrame(regressions).to_string(index=False))
+        else:
+            print(f"✓ No regressions against {baseline_path}")
+    else:
+        print(f"No baseline at {baseline_path} (use --save-baseline to create one)")
+    
+    return results, regressions
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Benchmark Part A and Part C on synthetic data.")
+    parser.add_argument('--scales', default=','.join(str(s) for s in SCALES),
+                        help="comma-separated rows per provider (e.g. 10000,1000000,100000000)")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--output', default=RESULTS_PATH, help="results JSON path")
+    parser.add_argument('--baseline', default=BASELINE_PATH, help="baseline JSON to compare against")
+    parser.add_argument('--save-baseline', action='store_true', help="store this run as the baseline")
+    parser.add_argument('--no-memory', action='store_true', help="skip the tracemalloc pass")
+    parser.add_argument('--time-tolerance', type=float, default=TIME_TOLERANCE)
+    parser.add_argument('--memory-tolerance', type=float, default=MEMORY_TOLERANCE)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    _, found = main([int(s) for s in args.scales.split(',')], args.seed, args.output, args.baseline,
+                    args.save_baseline, not args.no_memory, args.time_tolerance, args.memory_tolerance)
+    raise SystemExit(1 if found else 0)
@@ -0,0 +1,324 @@
+"""
+Billing API Stand-ins
+K&Co Cloud Cost Intelligence Platform
+
+Local HTTP servers that imitate the two Part D billing sources, so the
+extractors in extractors.py can be run and tested offline:
+
+- CostExplorerStandIn: AWS Cost Explorer GetCostAndUsage
+      POST /   (X-Amz-Target: AWSInsightsIndexService.GetCostAndUsage)
+      {"TimePeriod": {"Start": ..., "End": ...}, "NextPageToken": ...}
+  answered with ResultsByTime / Groups / Metrics.UnblendedCost pages, one
+  group per line item so an extract reproduces the source file exactly.
+- GCSStandIn: the Cloud Storage JSON API over the billing export bucket
+      GET /storage/v1/b/<bucket>/o?prefix=YYYY/MM/DD/&pageToken=...
+      GET /storage/v1/b/<bucket>/o/<object>?alt=media
+  with each day's rows split into several CSV export objects.
+
+Both serve a provider's source CSV (SOURCES in ingest_cache.py by default,
+or any file synthetic_data.py wrote) and enforce a server-side token bucket:
+requests over the rate get 429 with a Retry-After header, like a throttled
+API. `latency` adds a fixed service time per request and `fail_rate` turns a
+random share of requests into 503s, to exercise the client's retries.
+
+The HTTP handling is a minimal HTTP/1.1 implementation on asyncio streams
+(Content-Length bodies, keep-alive), enough for the extractors and curl.
+"""
+
+import argparse
+import asyncio
+import json
+import random
+import time
+from urllib.parse import parse_qs, quote, unquote, urlsplit
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import read_source_chunks
+
+AWS_RATE_LIMIT = 5
+GCS_RATE_LIMIT = 50
+CE_TARGET = 'AWSInsightsIndexService.GetCostAndUsage'
+EXPORT_BUCKET = 'billing-export-bucket'
+
+STATUS_TEXT = {200: 'OK', 400: 'Bad Request', 404: 'Not Found', 429: 'Too Many Requests',
+               500: 'Internal Server Error', 503: 'Service Unavailable'}
+
+
+class TokenBucket:
+    """
+    Token bucket holding up to `capacity` tokens, refilled at `rate` per second.
+    
+    acquire() waits for a token (waiters are served in arrival order);
+    try_acquire() takes one only if it is available now.
+    """
+    
+    def __init__(self, rate, capacity=1):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = capacity
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def try_acquire(self):
+        self._refill()
+        if self.tokens >= 1:
+            self.tokens -= 1
+            return True
+        return False
+    
+    async def acquire(self):
+        async with self._lock:
+            self._refill()
+            if self.tokens < 1:
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+                self._refill()
+            self.tokens -= 1
+
+
+def load_source(provider, source_path=None):
+    """A provider's source CSV, sorted by date (the order the APIs page in)."""
+    frame = pd.concat(read_source_chunks(provider, source_path=source_path), ignore_index=True)
+    return frame.sort_values('date', kind='stable').reset_index(drop=True)
+
+
+def day_slices(frame):
+    """{'YYYY-MM-DD': (first row, end row)} of a date-sorted frame."""
+    days = frame['date'].dt.strftime('%Y-%m-%d').to_numpy()
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else np.array([], dtype=int)
+    ends = np.r_[starts[1:], len(days)]
+    return {days[s]: (int(s), int(e)) for s, e in zip(starts, ends)}
+
+
+class StandInServer:
+    """Base class: request parsing, throttling, latency and failure injection."""
+    
+    def __init__(self, rate, latency=0.0, fail_rate=0.0, seed=0):
+        self.bucket = TokenBucket(rate, capacity=rate)
+        self.latency = latency
+        self.fail_rate = fail_rate
+        self.random = random.Random(seed)
+        self.stats = {'requests': 0, 'served': 0, 'throttled': 0, 'failed': 0}
+        self.server = None
+        self.url = None
+        self._writers = set()
+        self._handlers = set()
+    
+    async def start(self, host='127.0.0.1', port=0):
+        self.server = await asyncio.start_server(self._handle, host, port)
+        port = self.server.sockets[0].getsockname()[1]
+        self.url = f'http://{host}:{port}'
+        return self.url
+    
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            # Close open keep-alive connections so their handlers see EOF and return
+            for writer in list(self._writers):
+                writer.close()
+            await asyncio.gather(*self._handlers, return_exceptions=True)
+            await self.server.wait_closed()
+    
+    def route(self, method, path, query, headers, body):
+        """(status, content type, body bytes) for one request."""
+        raise NotImplementedError
+    
+    async def respond(self, method, target, headers, body):
+        self.stats['requests'] += 1
+        if not self.bucket.try_acquire():
+            self.stats['throttled'] += 1
+            error = {'error': 'Rate exceeded', 'code': 'ThrottlingException'}
+            retry_after = {'Retry-After': f'{1 / self.bucket.rate:.3f}'}
+            return 429, 'application/json', json.dumps(error).encode(), retry_after
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        if self.fail_rate and self.random.random() < self.fail_rate:
+            self.stats['failed'] += 1
+            return 503, 'application/json', b'{"error": "Service unavailable"}', {}
+        url = urlsplit(target)
+        query = {key: values[-1] for key, values in parse_qs(url.query).items()}
+        try:
+            status, content_type, payload = self.route(method, unquote(url.path), query, headers, body)
+        except (KeyError, ValueError, json.JSONDecodeError) as exc:
+            status, content_type, payload = 400, 'application/json', json.dumps({'error': str(exc)}).encode()
+        if status == 200:
+            self.stats['served'] += 1
+        return status, content_type, payload, {}
+    
+    async def _handle(self, reader, writer):
+        self._writers.add(writer)
+        self._handlers.add(asyncio.current_task())
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                method, target, _ = request_line.decode('latin-1').split(' ', 2)
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if line in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = line.decode('latin-1').partition(':')
+                    headers[name.strip().lower()] = value.strip()
+                length = int(headers.get('content-length', 0))
+                body = await reader.readexactly(length) if length else b''
+                
+                status, content_type, payload, extra = await self.respond(method, target, headers, body)
+                keep_alive = headers.get('connection', '').lower() != 'close'
+                head = [f'HTTP/1.1 {status} {STATUS_TEXT.get(status, "")}',
+                        f'Content-Type: {content_type}',
+                        f'Content-Length: {len(payload)}',
+                        f'Connection: {"keep-alive" if keep_alive else "close"}']
+                head += [f'{name}: {value}' for name, value in extra.items()]
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + payload)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError, ValueError):
+            pass
+        finally:
+            self._writers.discard(writer)
+            self._handlers.discard(asyncio.current_task())
+            writer.close()
+
+
+class CostExplorerStandIn(StandInServer):
+    """AWS Cost Explorer GetCostAndUsage over an AWS-shaped billing CSV."""
+    
+    def __init__(self, source_path=None, page_size=1000, rate=AWS_RATE_LIMIT, latency=0.0, fail_rate=0.0,
+                 seed=0):
+        super().__init__(rate, latency, fail_rate, seed)
+        self.frame = load_source('aws', source_path)
+        self.page_size = page_size
+        self.dates = self.frame['date'].to_numpy()
+    
+    def route(self, method, path, query, headers, body):
+        if method != 'POST' or headers.get('x-amz-target') != CE_TARGET:
+            return 404, 'application/json', b'{"error": "Unknown operation"}'
+        request = json.loads(body)
+        start = np.datetime64(request['TimePeriod']['Start'])
+        end = np.datetime64(request['TimePeriod']['End'])
+        first, last = np.searchsorted(self.dates, [start, end])
+        offset = first + int(request.get('NextPageToken') or 0)
+        page = self.frame.iloc[offset:min(offset + self.page_size, last)]
+        
+        results = []
+        for day, rows in page.groupby(page['date'].dt.strftime('%Y-%m-%d'), sort=True):
+            next_day = (pd.Timestamp(day) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            results.append({
+                'TimePeriod': {'Start': day, 'End': next_day},
+                'Groups': [
+                    {'Keys': [account, service, team, env],
+                     'Metrics': {'UnblendedCost': {'Amount': '' if pd.isna(cost) else repr(float(cost)),
+                                                   'Unit': 'USD'}}}
+                    for account, service, team, env, cost in rows[
+                        ['account_id', 'service', 'team', 'env', 'cost_usd']].itertuples(index=False, name=None)
+                ],
+                'Estimated': False,
+            })
+        response = {'GroupDefinitions': [{'Type': 'DIMENSION', 'Key': 'LINKED_ACCOUNT'},
+                                         {'Type': 'DIMENSION', 'Key': 'SERVICE'},
+                                         {'Type': 'TAG', 'Key': 'team'},
+                                         {'Type': 'TAG', 'Key': 'env'}],
+                    'ResultsByTime': results}
+        if offset + len(page) < last:
+            response['NextPageToken'] = str(offset + len(page) - first)
+        return 200, 'application/json', json.dumps(response).encode()
+
+
+class GCSStandIn(StandInServer):
+    """Cloud Storage JSON API over a bucket of daily GCP billing export CSVs."""
+    
+    def __init__(self, source_path=None, rows_per_object=500, list_page_size=100, rate=GCS_RATE_LIMIT,
+                 latency=0.0, fail_rate=0.0, seed=0, bucket=EXPORT_BUCKET):
+        super().__init__(rate, latency, fail_rate, seed)
+        self.bucket_name = bucket
+        self.list_page_size = list_page_size
+        frame = load_source('gcp', source_path)
+        
+        # gs://<bucket>/YYYY/MM/DD/billing-export-NNNNNN.csv
+        self.objects = {}
+        for day, (first, end) in day_slices(frame).items():
+            for shard, start in enumerate(range(first, end, rows_per_object)):
+                name = f"{day.replace('-', '/')}/billing-export-{shard:06d}.csv"
+                rows = frame.iloc[start:min(start + rows_per_object, end)]
+                self.objects[name] = rows.to_csv(index=False, date_format='%Y-%m-%d').encode()
+        self.names = sorted(self.objects)
+    
+    def route(self, method, path, query, headers, body):
+        prefix = f'/storage/v1/b/{self.bucket_name}/o'
+        if method != 'GET' or not path.startswith(prefix):
+            return 404, 'application/json', b'{"error": "Not found"}'
+        
+        name = path[len(prefix) + 1:]
+        if name:
+            if query.get('alt') != 'media' or name not in self.objects:
+                return 404, 'application/json', b'{"error": "No such object"}'
+            return 200, 'text/csv', self.objects[name]
+        
+        matching = [n for n in self.names if n.startswith(query.get('prefix', ''))]
+        offset = int(query.get('pageToken') or 0)
+        page_size = int(query.get('maxResults') or self.list_page_size)
+        page = matching[offset:offset + page_size]
+        listing = {
+            'kind': 'storage#objects',
+            'items': [{'kind': 'storage#object', 'name': n, 'bucket': self.bucket_name,
+                       'size': str(len(self.objects[n])), 'contentType': 'text/csv'} for n in page],
+        }
+        if offset + page_size < len(matching):
+            listing['nextPageToken'] = str(offset + page_size)
+        return 200, 'application/json', json.dumps(listing).encode()
+
+
+def object_url(bucket, name):
+    """Path of an object's media download."""
+    return f'/storage/v1/b/{bucket}/o/{quote(name, safe="")}?alt=media'
+
+
+async def serve(aws_port, gcs_port, aws_source=None, gcp_source=None, latency=0.0, fail_rate=0.0):
+    aws = CostExplorerStandIn(aws_source, latency=latency, fail_rate=fail_rate)
+    gcs = GCSStandIn(gcp_source, latency=latency, fail_rate=fail_rate)
+    print(f"✓ Cost Explorer stand-in at {await aws.start(port=aws_port)} ({len(aws.frame):,} line items, "
+          f"{AWS_RATE_LIMIT} req/s)")
+    print(f"✓ GCS stand-in at {await gcs.start(port=gcs_port)}/storage/v1/b/{EXPORT_BUCKET} "
+          f"({len(gcs.objects):,} export objects, {GCS_RATE_LIMIT} req/s)")
+    print("Serving until interrupted...")
+    try:
+        await asyncio.Event().wait()
+    finally:
+        await aws.stop()
+        await gcs.stop()
+
+
+def main(aws_port=8701, gcs_port=8702, aws_source=None, gcp_source=None, latency=0.0, fail_rate=0.0):
+    print("=" * 80)
+    print("BILLING API STAND-INS")
+    print("=" * 80)
+    print()
+    try:
+        asyncio.run(serve(aws_port, gcs_port, aws_source, gcp_source, latency, fail_rate))
+    except KeyboardInterrupt:
+        pass
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Serve local stand-ins for Cost Explorer and the GCS export bucket.")
+    parser.add_argument('--aws-port', type=int, default=8701)
+    parser.add_argument('--gcs-port', type=int, default=8702)
+    parser.add_argument('--aws-source', default=None, help="AWS billing CSV to serve (default: data/ source)")
+    parser.add_argument('--gcp-source', default=None, help="GCP billing CSV to serve (default: data/ source)")
+    parser.add_argument('--latency', type=float, default=0.0, help="seconds of service time per request")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="share of requests answered with 503")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.aws_port, args.gcs_port, args.aws_source, args.gcp_source, args.latency, args.fail_rate)
@@ -0,0 +1,241 @@
+"""
+Memory-Mapped Column Store
+K&Co Cloud Cost Intelligence Platform
+
+On-disk copy of the unified compact billing frame (billing_frame.py), one
+fixed-width .npy file per column, opened with np.load(mmap_mode='r'):
+
+    data/columns/manifest.json              row counts, dtypes, source fingerprints
+    data/columns/date.npy                   int32 day offsets
+    data/columns/cloud_provider.npy         int8 codes
+    data/columns/cloud_account_id.npy       int8/int16/int32 codes (-1 = missing)
+    data/columns/service.npy ... environment.npy
+    data/columns/cost_usd.npy               float64
+    data/columns/is_credit.npy              bool
+    data/columns/dict_<column>.json         categories of each coded column
+
+Rows are stored AWS first, then GCP; the manifest records each provider's
+row range, so a provider frame is a slice of the same memmaps.
+
+Opening the store reads the manifest and the small dictionary files only.
+DataFrames built from it wrap the memmaps without copying. Coded columns
+become categoricals over the code memmaps: the codes are stored at the width
+pandas itself picks for the dictionary size (code_dtype), so from_codes keeps
+the array instead of recasting it. Only what a step derives is materialized
+(e.g. key_codes() widens codes to int64), so a step that touches date and
+cost_usd pages in just those two files, and resident memory grows with the
+pages actually read rather than with the length of the history. The frames
+are read-only views; modify a .copy().
+
+The store is rebuilt from the Bronze cache whenever a provider's source
+fingerprint (the Bronze manifest's SHA-256) no longer matches.
+"""
+
+import argparse
+import json
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from billing_frame import DIMENSIONS, UNIFIED_COLUMNS, build_compact_providers, unify
+from ingest_cache import SOURCES, ensure_ingested, parquet_available
+from instrumentation import max_rss_mb
+
+COLUMN_STORE_DIR = 'data/columns'
+STORE_VERSION = 1
+
+CODED_COLUMNS = ['cloud_provider', 'cloud_account_id', 'service', 'team', 'environment']
+COLUMNS = ['date', *CODED_COLUMNS, 'cost_usd', 'is_credit']
+
+
+def source_fingerprint(provider):
+    """Identity of a provider's source data (Bronze SHA-256, or size/mtime without pyarrow)."""
+    if parquet_available():
+        return ensure_ingested(provider)['source_sha256']
+    stat = os.stat(SOURCES[provider]['path'])
+    return f'{stat.st_size}:{stat.st_mtime_ns}'
+
+
+def code_dtype(categories):
+    """
+    Smallest signed integer type holding every code plus -1, using pandas'
+    own cutoffs so Categorical.from_codes() keeps the stored array as is.
+    """
+    for dtype in ('int8', 'int16', 'int32'):
+        if len(categories) < np.iinfo(dtype).max:
+            return np.dtype(dtype)
+    return np.dtype('int64')
+
+
+def write_json(path, value):
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(value, f, indent=1)
+    os.replace(tmp, path)
+
+
+def build_store(store_dir=COLUMN_STORE_DIR):
+    """Write the unified compact frame as a column store; returns the manifest."""
+    compact = build_compact_providers()
+    frame = unify(compact)
+    tmp_dir = store_dir.rstrip('/') + '.building'
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    os.makedirs(tmp_dir)
+    
+    columns = {}
+    for column in COLUMNS:
+        series = frame[column]
+        if column in CODED_COLUMNS:
+            categories = [str(c) for c in series.cat.categories]
+            values = series.cat.codes.to_numpy().astype(code_dtype(categories))
+            write_json(os.path.join(tmp_dir, f'dict_{column}.json'), categories)
+        else:
+            values = series.to_numpy()
+        np.save(os.path.join(tmp_dir, f'{column}.npy'), values)
+        columns[column] = {'dtype': values.dtype.str, 'coded': column in CODED_COLUMNS}
+    
+    ranges, start = {}, 0
+    for provider, df in compact.items():
+        ranges[provider] = [start, start + len(df)]
+        start += len(df)
+    manifest = {
+        'version': STORE_VERSION,
+        'rows': len(frame),
+        'providers': ranges,
+        'provider_columns': {provider: list(df.columns) for provider, df in compact.items()},
+        'sources': {provider: source_fingerprint(provider) for provider in compact},
+        'columns': columns,
+        'built_at': pd.Timestamp.now(tz='UTC').isoformat(timespec='seconds'),
+    }
+    write_json(os.path.join(tmp_dir, 'manifest.json'), manifest)
+    
+    # Swap the finished store in (open memmaps keep the old files alive on POSIX)
+    shutil.rmtree(store_dir, ignore_errors=True)
+    os.replace(tmp_dir, store_dir)
+    return manifest
+
+
+class ColumnStore:
+    """Read-only view of a column store; columns are memory-mapped on first use."""
+    
+    def __init__(self, store_dir=COLUMN_STORE_DIR, manifest=None):
+        self.store_dir = store_dir
+        if manifest is None:
+            with open(os.path.join(store_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+        self.manifest = manifest
+        self._arrays = {}
+        self._categories = {}
+    
+    @classmethod
+    def open(cls, store_dir=COLUMN_STORE_DIR, rebuild=False):
+        """Open the store, rebuilding it first if it is missing or stale."""
+        manifest = None
+        try:
+            with open(os.path.join(store_dir, 'manifest.json')) as f:
+                manifest = json.load(f)
+        except (OSError, ValueError):
+            pass
+        stale = (manifest is None or manifest.get('version') != STORE_VERSION
+                 or manifest['sources'] != {p: source_fingerprint(p) for p in SOURCES})
+        if rebuild or stale:
+            manifest = build_store(store_dir)
+        return cls(store_dir, manifest)
+    
+    def array(self, column):
+        """The memory-mapped values (or codes) of one column."""
+        if column not in self._arrays:
+            self._arrays[column] = np.load(os.path.join(self.store_dir, f'{column}.npy'), mmap_mode='r')
+        return self._arrays[column]
+    
+    def categories(self, column):
+        if column not in self._categories:
+            with open(os.path.join(self.store_dir, f'dict_{column}.json')) as f:
+                self._categories[column] = json.load(f)
+        return self._categories[column]
+    
+    def series_values(self, column, rows=slice(None)):
+        """Values for a row range without copying: ndarray view, or Categorical over the code view."""
+        values = self.array(column)[rows]
+        if self.manifest['columns'][column]['coded']:
+            return pd.Categorical.from_codes(values, categories=self.categories(column), validate=False)
+        return values
+    
+    def frame(self, columns=None, provider=None):
+        """
+        DataFrame of the given columns (all by default), for one provider or
+        both, backed by the memmaps.
+        """
+        rows = slice(*self.manifest['providers'][provider]) if provider else slice(None)
+        columns = columns or COLUMNS
+        return pd.DataFrame({column: self.series_values(column, rows) for column in columns}, copy=False)
+    
+    def provider_frame(self, provider, columns=None):
+        """One provider's rows under its own column names, like load_compact_providers()."""
+        rows = slice(*self.manifest['providers'][provider])
+        unified = {DIMENSIONS[dim][provider]: UNIFIED_COLUMNS[dim] for dim in DIMENSIONS}
+        columns = columns or self.manifest['provider_columns'][provider]
+        return pd.DataFrame({column: self.series_values(unified.get(column, column), rows) for column in columns},
+                            copy=False)
+    
+    def size_bytes(self):
+        return sum(os.path.getsize(os.path.join(self.store_dir, f'{column}.npy')) for column in COLUMNS)
+
+
+def load_unified(columns=None, store_dir=COLUMN_STORE_DIR):
+    """Unified compact billing frame (or some of its columns) from the column store."""
+    return ColumnStore.open(store_dir).frame(columns)
+
+
+def main(store_dir=COLUMN_STORE_DIR, rebuild=False, columns=('date', 'cost_usd')):
+    print("=" * 80)
+    print("COLUMN STORE")
+    print("=" * 80)
+    print()
+    
+    start = time.perf_counter()
+    store = ColumnStore.open(store_dir, rebuild)
+    open_time = time.perf_counter() - start
+    manifest = store.manifest
+    print(f"✓ {store_dir}: {manifest['rows']:,} rows, {len(COLUMNS)} columns, "
+          f"{store.size_bytes() / 1024 ** 2:.1f} MB on disk (built {manifest['built_at']})")
+    print(f"  opened in {open_time * 1000:.1f} ms")
+    for column, meta in manifest['columns'].items():
+        size = os.path.getsize(os.path.join(store_dir, f'{column}.npy'))
+        extra = f", {len(store.categories(column))} categories" if meta['coded'] else ''
+        print(f"  {column:<18} {np.dtype(meta['dtype']).name:<8} {size / 1024:>10,.1f} KB{extra}")
+    print()
+    
+    # Touch only the requested columns, the way a profiling / aggregation step would
+    rss_before = max_rss_mb()
+    start = time.perf_counter()
+    frame = store.frame(list(columns))
+    build_time = time.perf_counter() - start
+    start = time.perf_counter()
+    total = float(np.nansum(frame['cost_usd'].to_numpy())) if 'cost_usd' in frame else None
+    days = int(frame['date'].nunique()) if 'date' in frame else None
+    scan_time = time.perf_counter() - start
+    print(f"Frame of {', '.join(columns)}: built in {build_time * 1000:.2f} ms (zero-copy), "
+          f"scanned in {scan_time * 1000:.1f} ms")
+    if total is not None:
+        print(f"  total cost ${total:,.2f}" + (f" over {days} days" if days is not None else ''))
+    if rss_before is not None:
+        print(f"  high-water RSS {max_rss_mb():.1f} MB (was {rss_before:.1f} MB before the scan)")
+    print()
+    return {'open_seconds': open_time, 'build_seconds': build_time, 'scan_seconds': scan_time}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build / open the memory-mapped billing column store.")
+    parser.add_argument('--store-dir', default=COLUMN_STORE_DIR)
+    parser.add_argument('--rebuild', action='store_true', help="rebuild even if the store is current")
+    parser.add_argument('--columns', default='date,cost_usd', help="columns to scan after opening")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.store_dir, args.rebuild, tuple(args.columns.split(',')))
@@ -0,0 +1,329 @@
+"""
+Date Completeness Index
+K&Co Cloud Cost Intelligence Platform
+
+One day-bitmap per (provider, account/project, service) series: bit d of a
+series is set when it has at least one billing row on day d. Bitmaps are
+rows of a uint64 matrix (64 days per word, aligned to 64-day blocks since
+1970-01-01), so for a date range:
+- missing days per series  = popcount(~bits & range_mask)
+- has a gap                = any(~bits & range_mask)
+- first missing day        = lowest set bit of the first non-zero word
+- last reporting day       = highest set bit of (bits & range_mask)
+are a few whole-matrix bitwise operations, whatever the number of series.
+This is the check behind Part D's `assert_date_continuity` at the series
+level: it also catches a single account or service that stopped reporting,
+which the dataset-wide missing-date count in Part A cannot.
+
+The index lives next to the warehouse (data/completeness.npz) and is updated
+by every warehouse load (warehouse.incremental_load): a full load replaces a
+provider's series, an incremental load clears the bits after the
+late-arrival cutoff and sets the bits of the reloaded rows. If a provider's
+last indexed day is not the warehouse watermark, some load bypassed the
+index and the provider is re-seeded from the warehouse instead.
+"""
+
+import argparse
+import os
+import sys
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import SOURCES, load_billing
+from billing_frame import PROVIDER_LABELS, from_day_offset, to_day_offset
+
+COMPLETENESS_PATH = 'data/completeness.npz'
+
+SERIES_COLUMNS = ['cloud_provider', 'cloud_account_id', 'service']
+
+WORD_BITS = 64
+ALL_BITS = np.uint64(0xFFFFFFFFFFFFFFFF)
+
+# Bits set in each byte value, for NumPy builds without np.bitwise_count
+_BYTE_POPCOUNT = np.array([bin(i).count('1') for i in range(256)], dtype=np.uint8)
+
+
+def completeness_path_for(warehouse_path):
+    """Index file that belongs to a warehouse file (data/warehouse.db -> data/completeness.npz)."""
+    return os.path.join(os.path.dirname(warehouse_path), 'completeness.npz')
+
+
+def popcount(words):
+    """Number of set bits in each uint64 word."""
+    if hasattr(np, 'bitwise_count'):
+        return np.bitwise_count(words).astype('int64')
+    counts = _BYTE_POPCOUNT[words[..., np.newaxis].view(np.uint8)]
+    return counts.sum(axis=-1, dtype='int64')
+
+
+def lowest_bit(words):
+    """Index of the lowest set bit of each non-zero word."""
+    return popcount((words & (~words + np.uint64(1))) - np.uint64(1))
+
+
+def highest_bit(words):
+    """Index of the highest set bit of each non-zero word."""
+    smeared = words.copy()
+    for shift in (1, 2, 4, 8, 16, 32):
+        smeared |= smeared >> np.uint64(shift)
+    return popcount(smeared) - 1
+
+
+def series_keys(frame):
+    """64-bit key per row of a (cloud_provider, cloud_account_id, service) frame."""
+    return pd.util.hash_pandas_object(frame[SERIES_COLUMNS].astype(str), index=False).to_numpy()
+
+
+class CompletenessIndex:
+    """Day bitmaps for every (provider, account/project, service) series."""
+    
+    def __init__(self):
+        self.origin_word = 0
+        self.words = np.zeros((0, 0), dtype=np.uint64)
+        self.series = pd.DataFrame({col: pd.Series(dtype=str) for col in SERIES_COLUMNS})
+        self.keys = np.empty(0, dtype=np.uint64)
+    
+    # ------------------------------------------------------------------
+    # Persistence
+    # ------------------------------------------------------------------
+    
+    @classmethod
+    def load(cls, path=COMPLETENESS_PATH):
+        """Read an index from disk (an empty index if the file does not exist)."""
+        index = cls()
+        if not os.path.exists(path):
+            return index
+        with np.load(path) as data:
+            index.origin_word = int(data['origin_word'])
+            index.words = data['words']
+            index.series = pd.DataFrame({col: data[col].astype(object) for col in SERIES_COLUMNS})
+            index.keys = data['keys']
+        return index
+    
+    def save(self, path=COMPLETENESS_PATH):
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.savez(f, origin_word=self.origin_word, words=self.words, keys=self.keys,
+                     **{col: self.series[col].to_numpy(dtype=str) for col in SERIES_COLUMNS})
+        os.replace(tmp, path)
+    
+    # ------------------------------------------------------------------
+    # Updates
+    # ------------------------------------------------------------------
+    
+    def reserve(self, first_day, last_day):
+        """Grow the word columns so days first_day..last_day have bits."""
+        first_word, last_word = first_day // WORD_BITS, last_day // WORD_BITS
+        if self.words.shape[1] == 0:
+            self.origin_word = first_word
+        before = max(0, self.origin_word - first_word)
+        after = max(0, last_word - (self.origin_word + self.words.shape[1] - 1))
+        if before or after:
+            self.words = np.pad(self.words, ((0, 0), (before, after)))
+            self.origin_word -= before
+    
+    def series_rows(self, frame):
+        """Row of each frame row's series, appending series not seen before."""
+        keys = series_keys(frame)
+        uniques, first, inverse = np.unique(keys, return_index=True, return_inverse=True)
+        order = np.argsort(self.keys, kind='stable')
+        sorted_keys = self.keys[order]
+        pos = np.searchsorted(sorted_keys, uniques)
+        found = pos < len(sorted_keys)
+        found[found] = sorted_keys[pos[found]] == uniques[found]
+        rows = np.full(len(uniques), -1, dtype='int64')
+        rows[found] = order[pos[found]]
+        
+        new = np.flatnonzero(~found)
+        if len(new):
+            rows[new] = len(self.keys) + np.arange(len(new))
+            added = frame.iloc[first[new]][SERIES_COLUMNS].astype(str).reset_index(drop=True)
+            self.series = pd.concat([self.series, added], ignore_index=True)
+            self.keys = np.concatenate([self.keys, uniques[new]])
+            self.words = np.vstack([self.words, np.zeros((len(new), self.words.shape[1]), dtype=np.uint64)])
+        return rows[inverse]
+    
+    def add(self, frame):
+        """Set the bits for a unified-shaped frame (date + SERIES_COLUMNS)."""
+        if not len(frame):
+            return
+        days = to_day_offset(pd.to_datetime(frame['date']).to_numpy()).astype('int64')
+        self.reserve(int(days.min()), int(days.max()))
+        rows = self.series_rows(frame)
+        word = days // WORD_BITS - self.origin_word
+        bit = np.left_shift(np.uint64(1), (days % WORD_BITS).astype(np.uint64))
+        np.bitwise_or.at(self.words, (rows, word), bit)
+    
+    def has_provider(self, label):
+        return bool((self.series['cloud_provider'] == label).any())
+    
+    def drop_provider(self, label):
+        """Forget every series of one provider (before a full reload)."""
+        keep = (self.series['cloud_provider'] != label).to_numpy()
+        self.series = self.series[keep].reset_index(drop=True)
+        self.keys = self.keys[keep]
+        self.words = self.words[keep]
+    
+    def clear_after(self, label, cutoff):
+        """Clear a provider's bits for the days after `cutoff` (late-arrival window)."""
+        if self.words.shape[1] == 0:
+            return
+        start = int(to_day_offset([np.datetime64(cutoff)])[0]) + 1
+        end = (self.origin_word + self.words.shape[1]) * WORD_BITS - 1
+        self.clear_days(label, start, end)
+    
+    def clear_days(self, label, start, end):
+        """Clear a provider's bits for day offsets start..end inclusive (e.g. a backfilled month)."""
+        if self.words.shape[1] == 0 or start > end:
+            return
+        rows = np.flatnonzero((self.series['cloud_provider'] == label).to_numpy())
+        cols, mask = self.window(start, end)
+        self.words[rows, cols] &= ~mask
+    
+    def update(self, provider, rows, cutoff=None):
+        """
+        Apply one warehouse load: `rows` are the unified rows loaded for the
+        provider; cutoff None means a full load, else the late-arrival cutoff.
+        """
+        label = PROVIDER_LABELS[provider]
+        if cutoff is None:
+            self.drop_provider(label)
+        else:
+            self.clear_after(label, cutoff)
+        self.add(rows)
+    
+    # ------------------------------------------------------------------
+    # Queries
+    # ------------------------------------------------------------------
+    
+    def date_range(self, label=None):
+        """(first, last) day offsets with any bit set (for one provider label), or None for an empty index."""
+        words = self.words if label is None else self.words[(self.series['cloud_provider'] == label).to_numpy()]
+        if not words.size:
+            return None
+        column = np.bitwise_or.reduce(words, axis=0)
+        used = np.flatnonzero(column)
+        if not len(used):
+            return None
+        first, last = used[0], used[-1]
+        return ((self.origin_word + first) * WORD_BITS + int(lowest_bit(column[first])),
+                (self.origin_word + last) * WORD_BITS + int(highest_bit(column[last])))
+    
+    def window(self, start, end):
+        """(column slice, per-word mask) covering day offsets start..end inclusive."""
+        self.reserve(start, end)
+        first = start // WORD_BITS - self.origin_word
+        last = end // WORD_BITS - self.origin_word
+        mask = np.full(last - first + 1, ALL_BITS, dtype=np.uint64)
+        mask[0] &= ALL_BITS << np.uint64(start % WORD_BITS)
+        mask[-1] &= ALL_BITS >> np.uint64(WORD_BITS - 1 - end % WORD_BITS)
+        return slice(first, last + 1), mask
+    
+    def gaps(self, start, end, only_gaps=True):
+        """
+        Completeness of every series between two dates (inclusive).
+        
+        Returns one row per series (only those with a missing day by default)
+        with the days present and missing in the range, the first missing day
+        and the last day the series reported, ordered by missing days.
+        """
+        start, end = (int(d) for d in to_day_offset(pd.to_datetime([start, end]).to_numpy()))
+        cols, mask = self.window(start, end)
+        bits = self.words[:, cols] & mask
+        missing = ~self.words[:, cols] & mask
+        
+        missing_days = popcount(missing).sum(axis=1)
+        rows = np.flatnonzero(missing_days > 0) if only_gaps else np.arange(len(self.series))
+        missing, bits = missing[rows], bits[rows]
+        base = (self.origin_word + cols.start) * WORD_BITS
+        
+        # First missing day: lowest bit of the first non-zero missing word
+        word = np.argmax(missing != 0, axis=1)
+        first_missing = base + word * WORD_BITS + lowest_bit(missing[np.arange(len(rows)), word])
+        # Last reporting day: highest bit of the last non-zero present word
+        reported = bits != 0
+        word = bits.shape[1] - 1 - np.argmax(reported[:, ::-1], axis=1)
+        last_seen = base + word * WORD_BITS + highest_bit(bits[np.arange(len(rows)), word])
+        has_bits = reported.any(axis=1)
+        
+        result = self.series.iloc[rows].reset_index(drop=True)
+        result['days_present'] = popcount(bits).sum(axis=1)
+        result['days_missing'] = missing_days[rows]
+        result['first_missing'] = pd.Series(from_day_offset(first_missing)).where(missing_days[rows] > 0)
+        result['last_reported'] = pd.Series(from_day_offset(last_seen)).where(has_bits)
+        return result.sort_values(['days_missing'] + SERIES_COLUMNS, ascending=[False, True, True, True],
+                                  kind='stable').reset_index(drop=True)
+    
+    def series_with_gaps(self, start, end):
+        """Boolean mask over self.series: has at least one missing day in the range."""
+        start, end = (int(d) for d in to_day_offset(pd.to_datetime([start, end]).to_numpy()))
+        cols, mask = self.window(start, end)
+        return ((~self.words[:, cols] & mask) != 0).any(axis=1)
+
+
+def rebuild(path=COMPLETENESS_PATH):
+    """Build the index from scratch from the Bronze cache."""
+    from warehouse import unified_rows
+    
+    index = CompletenessIndex()
+    for provider in SOURCES:
+        index.update(provider, unified_rows(load_billing(provider), provider))
+    index.save(path)
+    return index
+
+
+def main(path=COMPLETENESS_PATH, start=None, end=None, top=20, rebuild_index=False, check=False):
+    print("=" * 80)
+    print("DATE COMPLETENESS BY SERIES")
+    print("=" * 80)
+    print()
+    
+    index = rebuild(path) if rebuild_index or not os.path.exists(path) else CompletenessIndex.load(path)
+    span = index.date_range()
+    if span is None:
+        print("Index is empty (run part_c_sql_execution.py or --rebuild)")
+        return None
+    first, last = from_day_offset(span)
+    start = pd.Timestamp(start) if start else first
+    end = pd.Timestamp(end) if end else last
+    print(f"{len(index.series):,} series, {index.words.shape[1] * WORD_BITS} day bits each "
+          f"({index.words.nbytes / 1024:.1f} KB)")
+    print(f"Range: {start:%Y-%m-%d} to {end:%Y-%m-%d}")
+    print()
+    
+    gaps = index.gaps(start, end)
+    print(f"Series with missing days: {len(gaps):,} of {len(index.series):,}")
+    stopped = gaps[gaps['last_reported'].isna() | (gaps['last_reported'] < end)]
+    print(f"Series that stopped reporting before {end:%Y-%m-%d}: {len(stopped):,}")
+    print()
+    if len(gaps):
+        shown = gaps.head(top).copy()
+        for col in ('first_missing', 'last_reported'):
+            shown[col] = shown[col].dt.strftime('%Y-%m-%d')
+        print(f"Top {min(top, len(gaps))} series by missing days:")
+        print(shown.to_string(index=False))
+        print()
+    
+    if check:
+        print("✗ Date continuity check failed" if len(gaps) else "✓ Every series reported on every day")
+    return gaps
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Find (provider, account, service) series with missing days.")
+    parser.add_argument('--index', default=COMPLETENESS_PATH, help="completeness index file")
+    parser.add_argument('--start', default=None, help="first day of the range (default: first indexed day)")
+    parser.add_argument('--end', default=None, help="last day of the range (default: last indexed day)")
+    parser.add_argument('--top', type=int, default=20, help="series to print")
+    parser.add_argument('--rebuild', action='store_true', help="rebuild the index from the Bronze cache")
+    parser.add_argument('--check', action='store_true',
+                        help="exit 1 if any series has a missing day (assert_date_continuity)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = main(args.index, args.start, args.end, args.top, args.rebuild, args.check)
+    sys.exit(1 if args.check and (result is None or len(result)) else 0)
@@ -0,0 +1,320 @@
+"""
+Single-Pass Cube Engine
+K&Co Cloud Cost Intelligence Platform
+
+Computes every Part C report from one grouped scan of the compact billing
+frame (billing_frame.py).
+
+build_cube() sorts the rows once by the finest report grain
+(month, provider, account, service, team, env, is_credit) and reduces every
+measure over the resulting runs with NumPy ufunc.reduceat:
+row/cost counts, cost sum/min/max, first/last date and a 31-bit
+day-of-month mask (so distinct dates survive the roll-up exactly).
+
+Each report is then a roll-up of that small cube instead of another scan of
+the fact rows. Run this module directly to time the cube path against the
+SQLite report queries and check that both return the same numbers. The
+warehouse is opened read-only and compared as loaded; load it first with
+part_c_sql_execution.py.
+"""
+
+import argparse
+import os
+import time
+
+import numpy as np
+import pandas as pd
+
+from billing_frame import EPOCH, key_codes, decode_key, load_unified_billing
+
+CUBE_DIMENSIONS = ['month_index', 'cloud_provider', 'cloud_account_id', 'service', 'team', 'environment', 'is_credit']
+# Unified frame columns build_cube() reads
+CUBE_COLUMNS = ['date', *CUBE_DIMENSIONS[1:], 'cost_usd']
+
+
+def month_index(days):
+    """int32 day offsets -> months since 1970-01 (int32)."""
+    return (EPOCH + days.astype('timedelta64[D]')).astype('datetime64[M]').astype('int32')
+
+
+def build_cube(frame):
+    """Aggregate a unified compact frame to the finest report grain in one pass."""
+    days = frame['date'].to_numpy()
+    months = month_index(days)
+    month_start = (months.astype('datetime64[M]').astype('datetime64[D]') - EPOCH).astype('int32')
+    day_bits = np.left_shift(np.uint32(1), (days - month_start).astype('uint32'))
+    
+    keyed = frame[['cloud_provider', 'cloud_account_id', 'service', 'team', 'environment', 'is_credit']].copy()
+    keyed.insert(0, 'month_index', months)
+    key, cardinalities = key_codes(keyed, CUBE_DIMENSIONS)
+    
+    order = np.argsort(key, kind='stable')
+    sorted_key = key[order]
+    starts = np.flatnonzero(np.r_[True, sorted_key[1:] != sorted_key[:-1]]) if len(key) else np.array([], dtype='int64')
+    
+    cost = frame['cost_usd'].to_numpy(dtype='float64')[order]
+    has_cost = ~np.isnan(cost)
+    sorted_days = days[order]
+    
+    cube = decode_key(keyed, CUBE_DIMENSIONS, sorted_key[starts], cardinalities)
+    if len(starts) == 0:
+        for col in ['row_count', 'cost_count', 'cost_sum', 'cost_min', 'cost_max', 'date_min', 'date_max', 'day_mask']:
+            cube[col] = []
+        return cube
+    cube['row_count'] = np.diff(np.r_[starts, len(key)])
+    cube['cost_count'] = np.add.reduceat(has_cost.astype('int64'), starts)
+    cube['cost_sum'] = np.add.reduceat(np.where(has_cost, cost, 0.0), starts)
+    cube['cost_min'] = np.fmin.reduceat(cost, starts)
+    cube['cost_max'] = np.fmax.reduceat(cost, starts)
+    cube['date_min'] = np.minimum.reduceat(sorted_days, starts)
+    cube['date_max'] = np.maximum.reduceat(sorted_days, starts)
+    cube['day_mask'] = np.bitwise_or.reduceat(day_bits[order], starts)
+    return cube
+
+
+def popcount32(values):
+    values = np.ascontiguousarray(values, dtype='uint32')
+    return np.unpackbits(values.view('uint8').reshape(-1, 4), axis=1).sum(axis=1)
+
+
+def iso_dates(days):
+    return pd.Series(EPOCH + np.asarray(days, dtype='int64').astype('timedelta64[D]')).dt.strftime('%Y-%m-%d').to_numpy()
+
+
+def with_calendar(df):
+    """Add year / month / month_label columns from month_index."""
+    df = df.copy()
+    df['year'] = (df['month_index'] // 12 + 1970).astype('int64')
+    df['month'] = (df['month_index'] % 12 + 1).astype('int64')
+    df['month_label'] = df['year'].astype(str) + '-' + df['month'].map('{:02d}'.format)
+    return df
+
+
+def rollup(cube, by, mask=None):
+    """SUM the additive measures of the cube over `by` (observed groups only)."""
+    cells = cube if mask is None else cube[mask]
+    cells = cells.assign(
+        credit_sum=np.where(cells['is_credit'], cells['cost_sum'], 0.0),
+        charge_sum=np.where(cells['is_credit'], 0.0, cells['cost_sum']),
+    )
+    grouped = cells.groupby(by, observed=True, sort=False)
+    out = grouped[['row_count', 'cost_count', 'cost_sum', 'credit_sum', 'charge_sum']].sum()
+    out['cost_min'] = grouped['cost_min'].min()
+    out['cost_max'] = grouped['cost_max'].max()
+    out['date_min'] = grouped['date_min'].min()
+    out['date_max'] = grouped['date_max'].max()
+    return out, grouped
+
+
+def cube_reports(cube):
+    """Derive every Part C report from the cube, matching the SQL column layout."""
+    reports = {}
+    
+    # Unified table summary
+    out, grouped = rollup(cube, ['cloud_provider'])
+    out['unique_accounts'] = grouped['cloud_account_id'].nunique()
+    out = out.reset_index()
+    reports['unified_summary'] = pd.DataFrame({
+        'cloud_provider': out['cloud_provider'].astype(str),
+        'record_count': out['row_count'],
+        'unique_accounts': out['unique_accounts'],
+        'total_cost_usd': out['cost_sum'].round(2),
+        'min_date': iso_dates(out['date_min']),
+        'max_date': iso_dates(out['date_max']),
+    }).sort_values('cloud_provider', ignore_index=True)
+    
+    # Query 2: monthly by provider
+    out, _ = rollup(cube, ['cloud_provider', 'month_index'])
+    out = with_calendar(out.reset_index()).sort_values(['year', 'month', 'cloud_provider'], ignore_index=True)
+    reports['monthly_by_provider'] = pd.DataFrame({
+        'cloud_provider': out['cloud_provider'].astype(str),
+        'year': out['year'],
+        'month': out['month'],
+        'month_label': out['month_label'],
+        'transaction_count': out['row_count'],
+        'total_cost_usd': out['cost_sum'].round(2),
+        'avg_cost_per_transaction': (out['cost_sum'] / out['cost_count']).round(2),
+        'total_credits': out['credit_sum'].round(2),
+        'total_charges': out['charge_sum'].round(2),
+    })
+    
+    # Query 3: monthly by team & environment
+    out, grouped = rollup(cube, ['team', 'environment', 'month_index'])
+    out['accounts_used'] = grouped['cloud_account_id'].nunique()
+    out['services_used'] = grouped['service'].nunique()
+    out = with_calendar(out.reset_index())
+    out['total_cost_usd'] = out['cost_sum'].round(2)
+    out = out.sort_values(['year', 'month', 'total_cost_usd'], ascending=[True, True, False], ignore_index=True)
+    reports['monthly_by_team_env'] = pd.DataFrame({
+        'team': out['team'].astype(str),
+        'environment': out['environment'].astype(str),
+        'year': out['year'],
+        'month': out['month'],
+        'month_label': out['month_label'],
+        'transaction_count': out['row_count'],
+        'total_cost_usd': out['total_cost_usd'],
+        'avg_cost': (out['cost_sum'] / out['cost_count']).round(2),
+        'accounts_used': out['accounts_used'],
+        'services_used': out['services_used'],
+    }).head(20)
+    
+    # Query 3 pivot: team x month with environments as columns
+    env_cost = cube.groupby(['team', 'month_index', 'environment'], observed=True)['cost_sum'].sum().unstack('environment')
+    out, _ = rollup(cube, ['team', 'month_index'])
+    for env in ['prod', 'staging', 'dev']:
+        out[f'{env}_cost'] = env_cost[env] if env in env_cost else 0.0
+    out = with_calendar(out.fillna({'prod_cost': 0.0, 'staging_cost': 0.0, 'dev_cost': 0.0}).reset_index())
+    out['total_cost'] = out['cost_sum'].round(2)
+    out = out.sort_values(['year', 'month', 'total_cost'], ascending=[True, True, False], ignore_index=True)
+    reports['monthly_by_team_pivot'] = pd.DataFrame({
+        'team': out['team'].astype(str),
+        'year': out['year'],
+        'month': out['month'],
+        'prod_cost': out['prod_cost'].round(2),
+        'staging_cost': out['staging_cost'].round(2),
+        'dev_cost': out['dev_cost'].round(2),
+        'total_cost': out['total_cost'],
+        'prod_pct': (out['prod_cost'] * 100.0 / out['cost_sum'].replace(0, np.nan)).round(2),
+    }).head(15)
+    
+    # Query 4: top services by provider (charges only)
+    charges = ~cube['is_credit'].to_numpy()
+    out, grouped = rollup(cube, ['service', 'cloud_provider'], charges)
+    out['teams_using'] = grouped['team'].nunique()
+    out['environments_using'] = grouped['environment'].nunique()
+    out = out.reset_index()
+    out['total_cost_usd'] = out['cost_sum'].round(2)
+    out = out.sort_values('total_cost_usd', ascending=False, ignore_index=True)
+    reports['top_services'] = pd.DataFrame({
+        'service': out['service'].astype(str),
+        'cloud_provider': out['cloud_provider'].astype(str),
+        'transaction_count': out['row_count'],
+        'total_cost_usd': out['total_cost_usd'],
+        'avg_cost_per_transaction': (out['cost_sum'] / out['cost_count']).round(2),
+        'min_cost': out['cost_min'].round(2),
+        'max_cost': out['cost_max'].round(2),
+        'teams_using': out['teams_using'],
+        'environments_using': out['environments_using'],
+    }).head(5)
+    
+    # Query 4 combined: top services across clouds
+    provider_cost = cube[charges].groupby(['service', 'cloud_provider'], observed=True)['cost_sum'].sum().unstack('cloud_provider')
+    out, _ = rollup(cube, ['service'], charges)
+    for provider in ['AWS', 'GCP']:
+        out[f'{provider.lower()}_cost'] = provider_cost[provider] if provider in provider_cost else 0.0
+    out = out.fillna({'aws_cost': 0.0, 'gcp_cost': 0.0}).reset_index()
+    out['total_cost_usd'] = out['cost_sum'].round(2)
+    out = out.sort_values('total_cost_usd', ascending=False, ignore_index=True)
+    reports['top_services_combined'] = pd.DataFrame({
+        'service': out['service'].astype(str),
+        'transaction_count': out['row_count'],
+        'total_cost_usd': out['total_cost_usd'],
+        'avg_cost_per_transaction': (out['cost_sum'] / out['cost_count']).round(2),
+        'aws_cost': out['aws_cost'].round(2),
+        'gcp_cost': out['gcp_cost'].round(2),
+        'pct_of_total_spend': (out['cost_sum'] * 100.0 / out['cost_sum'].sum()).round(2),
+    }).head(5)
+    
+    # Overall totals; distinct dates come from OR-ing the day masks per month
+    month_masks = cube.groupby('month_index')['day_mask'].agg(np.bitwise_or.reduce)
+    credit_sum = cube.loc[cube['is_credit'], 'cost_sum'].sum()
+    reports['total_summary'] = pd.DataFrame({
+        'total_spend': [round(cube['cost_sum'].sum(), 2)],
+        'total_credits': [round(abs(credit_sum), 2)],
+        'total_charges': [round(cube.loc[~cube['is_credit'], 'cost_sum'].sum(), 2)],
+        'total_records': [int(cube['row_count'].sum())],
+        'unique_dates': [int(popcount32(month_masks.to_numpy()).sum())],
+    })
+    
+    return reports
+
+
+def compare_reports(expected, actual, atol=0.011):
+    """
+    Compare two report dicts column by column. Numeric columns may differ by
+    `atol` (independent rounding of float sums); row order is compared as-is.
+    Returns a list of human-readable mismatches.
+    """
+    problems = []
+    for name, exp in expected.items():
+        act = actual.get(name)
+        if act is None:
+            problems.append(f"{name}: missing")
+            continue
+        if list(exp.columns) != list(act.columns):
+            problems.append(f"{name}: columns {list(act.columns)} != {list(exp.columns)}")
+            continue
+        if len(exp) != len(act):
+            problems.append(f"{name}: {len(act)} rows != {len(exp)}")
+            continue
+        for col in exp.columns:
+            e = exp[col].reset_index(drop=True)
+            a = act[col].reset_index(drop=True)
+            if pd.api.types.is_numeric_dtype(e) and pd.api.types.is_numeric_dtype(a):
+                same = np.isclose(e.to_numpy(dtype='float64'), a.to_numpy(dtype='float64'), atol=atol, equal_nan=True)
+            else:
+                same = (e.astype(str) == a.astype(str)).to_numpy()
+            if not same.all():
+                problems.append(f"{name}.{col}: {int((~same).sum())} row(s) differ")
+    return problems
+
+
+def main(warehouse_path=None):
+    from part_c_sql_execution import run_reports
+    from parallel_runner import connect_read_only
+    from warehouse import WAREHOUSE_PATH
+    
+    warehouse_path = warehouse_path or WAREHOUSE_PATH
+    if not os.path.exists(warehouse_path):
+        raise SystemExit(f"No warehouse at {warehouse_path}: load it with part_c_sql_execution.py first")
+    
+    print("=" * 80)
+    print("CUBE ENGINE vs SQLITE")
+    print("=" * 80)
+    print()
+    
+    start = time.perf_counter()
+    frame = load_unified_billing(columns=CUBE_COLUMNS)
+    load_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    cube = build_cube(frame)
+    cube_seconds = time.perf_counter() - start
+    
+    start = time.perf_counter()
+    reports = cube_reports(cube)
+    rollup_seconds = time.perf_counter() - start
+    
+    print(f"Rows: {len(frame):,}  ->  cube cells: {len(cube):,}")
+    print(f"Load (compact frame): {load_seconds * 1000:8.1f} ms")
+    print(f"Cube build (1 scan):  {cube_seconds * 1000:8.1f} ms")
+    print(f"All 7 reports:        {rollup_seconds * 1000:8.1f} ms")
+    print()
+    
+    # Compared as loaded: a comparison must not move load_state (and with it the
+    # query cache) or bypass the completeness / alert-state files
+    conn = connect_read_only(warehouse_path)
+    start = time.perf_counter()
+    sql_reports = run_reports(conn)
+    sql_seconds = time.perf_counter() - start
+    conn.close()
+    print(f"SQLite report suite:  {sql_seconds * 1000:8.1f} ms")
+    print()
+    
+    problems = compare_reports(sql_reports, reports)
+    if problems:
+        print("✗ Cube and SQLite results differ:")
+        for problem in problems:
+            print(f"  - {problem}")
+        print("  (the cube reads the current sources; reload a stale warehouse with part_c_sql_execution.py)")
+    else:
+        print(f"✓ All {len(reports)} reports match the SQLite results")
+    
+    return {'cube': cube, 'reports': reports, 'sql_reports': sql_reports, 'problems': problems}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Compute the Part C reports with the NumPy cube engine.")
+    parser.add_argument('--warehouse', default=None, help="SQLite warehouse to compare against")
+    args = parser.parse_args()
+    results = main(args.warehouse)
@@ -0,0 +1,271 @@
+"""
+Deduplication Index
+K&Co Cloud Cost Intelligence Platform
+
+Persistent index of the composite billing keys (date, account/project,
+service, team, env) of the Bronze cache, rebuilt by running this module, so a
+re-delivered file is caught even though its duplicates are in a different
+batch than the originals.
+
+Each key is stored as a 64-bit hash (pd.util.hash_pandas_object, as in
+streaming_profiler.py), in one sorted .npy file per provider and billing date:
+
+    data/dedup/cloud=aws/date=2025-01-15.npy
+
+Checking a batch only reads the partitions of the dates in that batch, and
+the membership test and the merge are vectorized (np.isin / np.union1d), so
+the cost tracks the size of the batch, never the length of the history.
+Because the partitions are per date, the index can be rewound to a date
+(drop_after).
+
+The index is for deliveries that add to what is loaded: --check classifies
+an incoming file against it before the file reaches the Bronze cache. The
+warehouse load and the backfill runner replace every row of the dates they
+load, so they dedup each batch on its own (deduplicate_batch) and never read
+or write the index.
+
+Policies for a batch:
+- drop:      keep the first row of each key, drop the rest
+- aggregate: sum the cost of rows that share a key within the batch
+Rows whose key is already in the index are re-deliveries and are always
+dropped.
+"""
+
+import argparse
+import os
+import shutil
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import SOURCES, iter_billing_chunks, load_billing, read_source_chunks
+from billing_frame import EPOCH, to_day_offset
+from part_a_profiling import key_columns
+
+DEDUP_DIR = 'data/dedup'
+DEDUP_POLICIES = ('drop', 'aggregate')
+
+
+def dedup_dir_for(warehouse_path):
+    """Index directory that belongs to a warehouse file (data/warehouse.db -> data/dedup)."""
+    return os.path.join(os.path.dirname(warehouse_path), 'dedup')
+
+
+def key_hashes(batch, id_col):
+    """64-bit hash of each row's composite key."""
+    columns = key_columns(id_col)
+    keys = batch[columns].astype({col: object for col in columns[1:]})
+    keys['date'] = pd.to_datetime(keys['date']).astype('datetime64[ns]')
+    return pd.util.hash_pandas_object(keys, index=False).to_numpy()
+
+
+def day_label(day):
+    """int day offset -> 'YYYY-MM-DD'."""
+    return str(EPOCH + np.timedelta64(int(day), 'D'))
+
+
+def group_by_day(days, values):
+    """Yield (day, values of that day) for int day offsets, in date order."""
+    order = np.argsort(days, kind='stable')
+    days, values = days[order], values[order]
+    starts = np.flatnonzero(np.r_[True, days[1:] != days[:-1]]) if len(days) else []
+    for day, part in zip(days[starts], np.split(values, starts[1:])):
+        yield day, part
+
+
+class DedupIndex:
+    """Key hashes of one provider's loaded rows, partitioned by billing date."""
+    
+    def __init__(self, provider, index_dir=DEDUP_DIR):
+        self.provider = provider
+        self.id_col = SOURCES[provider]['id_col']
+        self.path = os.path.join(index_dir, f'cloud={provider}')
+    
+    def partition_path(self, day):
+        return os.path.join(self.path, f'date={day_label(day)}.npy')
+    
+    def dates(self):
+        """Billing dates with a partition, sorted."""
+        if not os.path.isdir(self.path):
+            return []
+        return sorted(name[5:-4] for name in os.listdir(self.path)
+                      if name.startswith('date=') and name.endswith('.npy'))
+    
+    def read(self, day):
+        try:
+            return np.load(self.partition_path(day))
+        except FileNotFoundError:
+            return np.empty(0, dtype=np.uint64)
+    
+    def write(self, day, hashes):
+        path = self.partition_path(day)
+        os.makedirs(self.path, exist_ok=True)
+        tmp = path + '.tmp'
+        with open(tmp, 'wb') as f:
+            np.save(f, hashes)
+        os.replace(tmp, path)
+    
+    def clear(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+    
+    def drop_after(self, cutoff):
+        """Remove the partitions dated after `cutoff` ('YYYY-MM-DD'); returns how many."""
+        dropped = [d for d in self.dates() if d > cutoff]
+        for d in dropped:
+            os.remove(os.path.join(self.path, f'date={d}.npy'))
+        return len(dropped)
+    
+    def check(self, batch):
+        """
+        Classify the rows of a raw billing batch.
+        
+        Returns (hashes, days, seen, repeat): seen marks keys already in the
+        index, repeat marks keys that appeared earlier in the same batch.
+        """
+        hashes = key_hashes(batch, self.id_col)
+        days = to_day_offset(pd.to_datetime(batch['date']).to_numpy())
+        history = [self.read(day) for day in np.unique(days)]
+        history = np.concatenate(history) if history else np.empty(0, dtype=np.uint64)
+        seen = np.isin(hashes, history)
+        repeat = pd.Series(hashes).duplicated().to_numpy()
+        return hashes, days, seen, repeat
+    
+    def merge(self, hashes, days):
+        """Add key hashes to the partitions of their dates."""
+        for day, part in group_by_day(days, hashes):
+            self.write(day, np.union1d(self.read(day), part))
+    
+    def deduplicate(self, batch, policy='drop', merge=True):
+        """
+        Remove re-delivered and repeated keys from a batch, then (by default)
+        merge the surviving keys into the index.
+        
+        Returns (rows, stats).
+        """
+        check_policy(policy)
+        hashes, days, seen, repeat = self.check(batch)
+        rows, source = resolve_duplicates(batch, hashes, seen, repeat, policy)
+        stats = {
+            'rows_in': len(batch),
+            'redelivered': int(seen.sum()),
+            'in_batch_duplicates': int((repeat & ~seen).sum()),
+            'partitions_read': len(np.unique(days)),
+            'rows_out': len(rows),
+        }
+        if merge:
+            self.merge(hashes[source], days[source])
+        return rows, stats
+
+
+def check_policy(policy):
+    if policy not in DEDUP_POLICIES:
+        raise ValueError(f"Unknown dedup policy {policy!r} (expected one of {DEDUP_POLICIES})")
+
+
+def resolve_duplicates(batch, hashes, seen, repeat, policy):
+    """
+    Apply a policy to a classified batch: drop the `seen` rows, then drop or
+    sum the repeated keys. Returns (rows, source), source being the batch
+    position each output row's key comes from.
+    """
+    if policy == 'drop':
+        source = np.flatnonzero(~seen & ~repeat)
+        return batch.iloc[source].reset_index(drop=True), source
+    
+    new = batch[~seen].reset_index(drop=True)
+    uniques, first, inverse = np.unique(hashes[~seen], return_index=True, return_inverse=True)
+    cost = new['cost_usd'].to_numpy(dtype='float64')
+    totals = np.bincount(inverse, weights=np.nan_to_num(cost), minlength=len(uniques))
+    # Like SUM(): a key whose costs are all missing stays missing
+    present = np.bincount(inverse, weights=~np.isnan(cost), minlength=len(uniques))
+    order = np.argsort(first)
+    rows = new.iloc[first[order]].reset_index(drop=True)
+    rows['cost_usd'] = np.where(present > 0, totals, np.nan)[order]
+    return rows, np.flatnonzero(~seen)[first[order]]
+
+
+def deduplicate_batch(batch, id_col, policy='drop'):
+    """
+    Drop or sum the keys repeated within one batch, without an index. For a
+    batch that replaces every loaded row of its dates (the warehouse's reload
+    window, a backfill month) these are the only duplicates there can be.
+    
+    Returns (rows, stats).
+    """
+    check_policy(policy)
+    hashes = key_hashes(batch, id_col)
+    repeat = pd.Series(hashes).duplicated().to_numpy()
+    rows, _ = resolve_duplicates(batch, hashes, np.zeros(len(batch), dtype=bool), repeat, policy)
+    return rows, {'rows_in': len(batch), 'in_batch_duplicates': int(repeat.sum()), 'rows_out': len(rows)}
+
+
+def main(policy='drop', index_dir=DEDUP_DIR, check_path=None, provider='aws', merge=False, output=None):
+    print("=" * 80)
+    print(f"DEDUPLICATION INDEX ({policy})")
+    print("=" * 80)
+    print()
+    
+    if check_path:
+        # Check one incoming delivery against the index
+        index = DedupIndex(provider, index_dir)
+        batch = pd.concat(read_source_chunks(provider, source_path=check_path), ignore_index=True)
+        start = time.perf_counter()
+        rows, stats = index.deduplicate(batch, policy, merge)
+        elapsed = time.perf_counter() - start
+        print(f"{check_path} ({provider.upper()}): {stats['rows_in']:,} rows, "
+              f"{stats['redelivered']:,} already loaded, {stats['in_batch_duplicates']:,} repeated in the file "
+              f"-> {stats['rows_out']:,} rows ({elapsed * 1000:.1f} ms, {stats['partitions_read']} partitions read)")
+        if merge:
+            print(f"✓ Merged into {index.path}")
+        if output:
+            rows.to_csv(output, index=False, date_format='%Y-%m-%d')
+            print(f"✓ Deduplicated rows written to {output}")
+        return stats
+    
+    # Rebuild each provider's index from the Bronze cache, one partition batch
+    # at a time, then replay its latest day as a re-delivered file
+    results = {}
+    for provider in SOURCES:
+        index = DedupIndex(provider, index_dir)
+        index.clear()
+        totals = {'rows_in': 0, 'redelivered': 0, 'in_batch_duplicates': 0, 'rows_out': 0}
+        start = time.perf_counter()
+        for chunk in iter_billing_chunks(provider, 1_000_000):
+            _, stats = index.deduplicate(chunk, policy)
+            for key in totals:
+                totals[key] += stats[key]
+        build_time = time.perf_counter() - start
+        print(f"{provider.upper()}: indexed {totals['rows_out']:,} keys from {totals['rows_in']:,} rows "
+              f"in {build_time * 1000:.1f} ms ({totals['redelivered'] + totals['in_batch_duplicates']:,} "
+              f"duplicates, {len(index.dates())} date partitions)")
+        
+        billing = load_billing(provider)
+        last_day = billing[billing['date'] == billing['date'].max()]
+        start = time.perf_counter()
+        _, replay = index.deduplicate(last_day, policy, merge=False)
+        replay_time = time.perf_counter() - start
+        print(f"  re-delivery of {last_day['date'].max():%Y-%m-%d}: {replay['redelivered']:,} of "
+              f"{replay['rows_in']:,} rows caught in {replay_time * 1000:.1f} ms "
+              f"({replay['partitions_read']} partition read)")
+        results[provider] = {'build': totals, 'replay': replay}
+    print()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build or query the persistent billing-key dedup index.")
+    parser.add_argument('--policy', choices=DEDUP_POLICIES, default='drop',
+                        help="what to do with rows sharing a key within a batch")
+    parser.add_argument('--index-dir', default=DEDUP_DIR)
+    parser.add_argument('--check', default=None, metavar='CSV',
+                        help="check an incoming billing CSV against the index instead of rebuilding it")
+    parser.add_argument('--provider', choices=list(SOURCES), default='aws', help="provider of the --check file")
+    parser.add_argument('--merge', action='store_true', help="add the checked file's new keys to the index")
+    parser.add_argument('--output', default=None, help="write the checked file's deduplicated rows here")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.policy, args.index_dir, args.check, args.provider, args.merge, args.output)
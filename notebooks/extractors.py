@@ -0,0 +1,444 @@
+"""
+Billing Extractors
+K&Co Cloud Cost Intelligence Platform
+
+Asyncio implementation of Part D's extract_aws / extract_gcp tasks, writing
+straight into the raw zone:
+
+    data/raw/cloud=aws/year=2025/month=01/day=15/part-0.csv
+    data/raw/cloud=gcp/year=2025/month=01/day=15/billing-export-000000.csv
+
+Every request goes through one ApiClient per source, which combines
+- a token bucket at the source's rate limit (Cost Explorer: 5 requests/s),
+  taken before every attempt, retries included
+- a pool of keep-alive HTTP connections (at most `concurrency` in flight)
+- retries with exponential backoff and full jitter on 429 / 5xx /
+  connection errors, honouring Retry-After
+
+Concurrency comes from splitting the range by day: Cost Explorer is asked for
+each day separately, so every day paginates its own NextPageToken chain while
+the other days' pages are in flight; GCS lists each day's prefix and then
+downloads its export objects concurrently. A backfill therefore runs at the
+rate limit instead of one round trip at a time.
+
+Writes are streamed: each Cost Explorer page is appended to its day's file as
+it arrives and GCS objects are copied to disk chunk by chunk, never held
+whole in memory. Files are written under a temporary name and renamed when
+complete, so a failed or interrupted extract never leaves a partial file.
+The raw files have the source CSV columns, so ingest_cache.py can read them.
+
+Run against the local stand-ins (billing_api_standins.py) by default, or
+point --aws-endpoint / --gcs-endpoint at other servers. Request signing (AWS
+SigV4, Google OAuth) is not implemented; against the real services the
+client must sit behind an authenticating proxy.
+"""
+
+import argparse
+import asyncio
+import csv
+import json
+import os
+import random
+import ssl
+import time
+from urllib.parse import urlsplit
+
+import pandas as pd
+
+from ingest_cache import SOURCES, source_dtypes
+from billing_api_standins import (
+    AWS_RATE_LIMIT, CE_TARGET, EXPORT_BUCKET, GCS_RATE_LIMIT, CostExplorerStandIn, GCSStandIn, TokenBucket,
+    object_url
+)
+
+RAW_DIR = 'data/raw'
+DEFAULT_CONCURRENCY = 16
+DEFAULT_RETRIES = 6
+READ_CHUNK = 1 << 16
+
+RETRYABLE_STATUS = {429, 500, 502, 503, 504}
+
+
+class RetryableError(Exception):
+    """A failed attempt worth retrying (throttled, server error, dropped connection)."""
+    
+    def __init__(self, message, retry_after=None):
+        super().__init__(message)
+        self.retry_after = retry_after
+
+
+class HTTPError(Exception):
+    """A non-retryable HTTP error response."""
+
+
+def raw_partition_dir(raw_dir, provider, day):
+    """Raw-zone directory of one provider and day ('YYYY-MM-DD')."""
+    year, month, dom = day.split('-')
+    return os.path.join(raw_dir, f'cloud={provider}', f'year={year}', f'month={month}', f'day={dom}')
+
+
+def date_range(start, end):
+    """'YYYY-MM-DD' days from start to end inclusive."""
+    return [d.strftime('%Y-%m-%d') for d in pd.date_range(start, end, freq='D')]
+
+
+# ============================================================================
+# HTTP client
+# ============================================================================
+
+async def read_response(reader, sink=None):
+    """
+    Read one HTTP/1.1 response; returns (status, headers, body).
+    
+    With a sink, body chunks are passed to it as they arrive and body is None.
+    """
+    status_line = await reader.readline()
+    if not status_line:
+        raise ConnectionError("Connection closed before the response")
+    status = int(status_line.split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if line in (b'\r\n', b'\n', b''):
+            break
+        name, _, value = line.decode('latin-1').partition(':')
+        headers[name.strip().lower()] = value.strip()
+    
+    chunks = []
+    emit = sink if sink is not None else chunks.append
+    if headers.get('transfer-encoding', '').lower() == 'chunked':
+        while True:
+            size = int((await reader.readline()).split(b';')[0], 16)
+            if size == 0:
+                await reader.readline()
+                break
+            emit(await reader.readexactly(size))
+            await reader.readline()
+    else:
+        remaining = int(headers.get('content-length', 0))
+        while remaining:
+            chunk = await reader.readexactly(min(remaining, READ_CHUNK))
+            emit(chunk)
+            remaining -= len(chunk)
+    return status, headers, None if sink is not None else b''.join(chunks)
+
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections to one endpoint, at most `size` in use at once."""
+    
+    def __init__(self, endpoint, size=DEFAULT_CONCURRENCY):
+        url = urlsplit(endpoint)
+        self.host = url.hostname
+        self.secure = url.scheme == 'https'
+        self.port = url.port or (443 if self.secure else 80)
+        self.base_path = url.path.rstrip('/')
+        self._slots = asyncio.Semaphore(size)
+        self._idle = []
+        self.opened = 0
+    
+    async def _connect(self):
+        self.opened += 1
+        context = ssl.create_default_context() if self.secure else None
+        return await asyncio.open_connection(self.host, self.port, ssl=context)
+    
+    async def request(self, method, path, body=b'', headers=None, sink=None):
+        async with self._slots:
+            reader, writer = self._idle.pop() if self._idle else await self._connect()
+            head = [f'{method} {self.base_path}{path} HTTP/1.1', f'Host: {self.host}:{self.port}',
+                    f'Content-Length: {len(body)}', 'Connection: keep-alive']
+            head += [f'{name}: {value}' for name, value in (headers or {}).items()]
+            try:
+                writer.write(('\r\n'.join(head) + '\r\n\r\n').encode('latin-1') + body)
+                await writer.drain()
+                status, response_headers, data = await read_response(reader, sink)
+            except BaseException:
+                writer.close()
+                raise
+            if response_headers.get('connection', '').lower() == 'close':
+                writer.close()
+            else:
+                self._idle.append((reader, writer))
+            return status, response_headers, data
+    
+    async def close(self):
+        for _, writer in self._idle:
+            writer.close()
+        await asyncio.gather(*(writer.wait_closed() for _, writer in self._idle), return_exceptions=True)
+        self._idle.clear()
+
+
+class ApiClient:
+    """Rate-limited, pooled, retrying requests against one API endpoint."""
+    
+    def __init__(self, endpoint, rate, concurrency=DEFAULT_CONCURRENCY, retries=DEFAULT_RETRIES,
+                 base_delay=0.2, max_delay=10.0):
+        self.pool = ConnectionPool(endpoint, concurrency)
+        self.bucket = TokenBucket(rate)
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.stats = {'requests': 0, 'retries': 0, 'throttled': 0, 'bytes': 0}
+    
+    async def _attempt(self, method, path, body, headers, sink):
+        await self.bucket.acquire()
+        self.stats['requests'] += 1
+        try:
+            status, response_headers, data = await self.pool.request(method, path, body, headers, sink)
+        except (ConnectionError, asyncio.IncompleteReadError, asyncio.TimeoutError) as exc:
+            raise RetryableError(f"{type(exc).__name__}: {exc}") from exc
+        if status in RETRYABLE_STATUS:
+            if status == 429:
+                self.stats['throttled'] += 1
+            retry_after = response_headers.get('retry-after')
+            raise RetryableError(f"HTTP {status}", float(retry_after) if retry_after else None)
+        if status != 200:
+            raise HTTPError(f"{method} {path}: HTTP {status} {(data or b'')[:200]!r}")
+        return data
+    
+    async def request(self, method, path, body=b'', headers=None, open_sink=None):
+        """
+        Send a request until it succeeds; returns the body.
+        
+        open_sink() is called before every attempt and returns a callable
+        that receives the body as it streams in (the body is then None), so
+        a retried download starts its output over.
+        """
+        for attempt in range(self.retries + 1):
+            sink = open_sink() if open_sink else None
+            try:
+                data = await self._attempt(method, path, body, headers, sink)
+                self.stats['bytes'] += len(data) if data is not None else 0
+                return data
+            except RetryableError as exc:
+                if attempt == self.retries:
+                    raise
+                self.stats['retries'] += 1
+                backoff = random.uniform(0, min(self.max_delay, self.base_delay * 2 ** attempt))
+                await asyncio.sleep(max(exc.retry_after or 0, backoff))
+    
+    async def request_json(self, method, path, payload=None, headers=None):
+        body = json.dumps(payload).encode() if payload is not None else b''
+        return json.loads(await self.request(method, path, body, headers))
+    
+    async def close(self):
+        await self.pool.close()
+
+
+class StreamingFile:
+    """Output file written under a temporary name and renamed into place on commit()."""
+    
+    def __init__(self, path, mode='wb'):
+        self.path = path
+        self.mode = mode
+        self.tmp = path + '.tmp'
+        self.file = None
+        self.bytes = 0
+    
+    def open(self):
+        """(Re)start the file; returns its write method."""
+        if self.file is not None:
+            self.file.close()
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        self.file = open(self.tmp, self.mode, **({'newline': ''} if 'b' not in self.mode else {}))
+        self.bytes = 0
+        return self.write
+    
+    def write(self, data):
+        self.bytes += len(data)
+        self.file.write(data)
+    
+    def commit(self):
+        self.file.close()
+        os.replace(self.tmp, self.path)
+    
+    def abort(self):
+        if self.file is not None:
+            self.file.close()
+            os.remove(self.tmp)
+
+
+# ============================================================================
+# Extractors
+# ============================================================================
+
+async def extract_aws_day(client, day, raw_dir):
+    """One day of Cost Explorer line items -> the raw zone; returns rows written."""
+    out = StreamingFile(os.path.join(raw_partition_dir(raw_dir, 'aws', day), 'part-0.csv'), 'w')
+    out.open()
+    writer = csv.writer(out.file)
+    writer.writerow(['date', 'account_id', 'service', 'team', 'env', 'cost_usd'])
+    next_day = (pd.Timestamp(day) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+    request = {'TimePeriod': {'Start': day, 'End': next_day}, 'Granularity': 'DAILY',
+               'Metrics': ['UnblendedCost']}
+    rows = 0
+    try:
+        while True:
+            page = await client.request_json('POST', '/', request, {
+                'X-Amz-Target': CE_TARGET, 'Content-Type': 'application/x-amz-json-1.1'})
+            for result in page['ResultsByTime']:
+                date = result['TimePeriod']['Start']
+                for group in result['Groups']:
+                    writer.writerow([date, *group['Keys'], group['Metrics']['UnblendedCost']['Amount']])
+                    rows += 1
+            if not page.get('NextPageToken'):
+                break
+            request['NextPageToken'] = page['NextPageToken']
+    except BaseException:
+        out.abort()
+        raise
+    out.commit()
+    return rows
+
+
+async def extract_gcp_day(client, day, raw_dir, bucket=EXPORT_BUCKET):
+    """One day's billing export objects -> the raw zone; returns files written."""
+    prefix = day.replace('-', '/') + '/'
+    names, token = [], None
+    while True:
+        query = f'?prefix={prefix}' + (f'&pageToken={token}' if token else '')
+        listing = await client.request_json('GET', f'/storage/v1/b/{bucket}/o{query}')
+        names += [item['name'] for item in listing.get('items', [])]
+        token = listing.get('nextPageToken')
+        if not token:
+            break
+    
+    async def download(name):
+        out = StreamingFile(os.path.join(raw_partition_dir(raw_dir, 'gcp', day), os.path.basename(name)))
+        try:
+            await client.request('GET', object_url(bucket, name), open_sink=out.open)
+        except BaseException:
+            out.abort()
+            raise
+        out.commit()
+    
+    await asyncio.gather(*(download(name) for name in names))
+    return len(names)
+
+
+async def run_extract(provider, client, days, raw_dir):
+    """Extract every day concurrently (bounded by the client's pool and rate limit)."""
+    extract_day = extract_aws_day if provider == 'aws' else extract_gcp_day
+    start = time.perf_counter()
+    counts = await asyncio.gather(*(extract_day(client, day, raw_dir) for day in days))
+    elapsed = time.perf_counter() - start
+    return {
+        'provider': provider,
+        'days': len(days),
+        'rows' if provider == 'aws' else 'files': sum(counts),
+        **client.stats,
+        'seconds': elapsed,
+        'requests_per_second': client.stats['requests'] / elapsed if elapsed else None,
+    }
+
+
+def read_raw_zone(provider, raw_dir=RAW_DIR):
+    """All raw-zone files of a provider as one frame (source CSV schema)."""
+    frames = []
+    for root, _, files in os.walk(os.path.join(raw_dir, f'cloud={provider}')):
+        for name in sorted(files):
+            if name.endswith('.csv'):
+                frames.append(pd.read_csv(os.path.join(root, name), dtype=source_dtypes(provider)))
+    if not frames:
+        return pd.DataFrame()
+    frame = pd.concat(frames, ignore_index=True)
+    frame['date'] = pd.to_datetime(frame['date'])
+    return frame
+
+
+async def backfill(start, end, raw_dir=RAW_DIR, providers=tuple(SOURCES), aws_endpoint=None, gcs_endpoint=None,
+                   aws_rate=AWS_RATE_LIMIT, gcs_rate=GCS_RATE_LIMIT, concurrency=DEFAULT_CONCURRENCY,
+                   retries=DEFAULT_RETRIES, latency=0.0, fail_rate=0.0, aws_source=None, gcp_source=None):
+    """
+    Extract both providers for start..end (in parallel, like the DAG's
+    [extract_aws, extract_gcp]). Without endpoints, local stand-ins are started.
+    """
+    standins = []
+    if 'aws' in providers and aws_endpoint is None:
+        standins.append(CostExplorerStandIn(aws_source, rate=aws_rate, latency=latency, fail_rate=fail_rate))
+        aws_endpoint = await standins[-1].start()
+    if 'gcp' in providers and gcs_endpoint is None:
+        standins.append(GCSStandIn(gcp_source, rate=gcs_rate, latency=latency, fail_rate=fail_rate, seed=1))
+        gcs_endpoint = await standins[-1].start()
+    
+    clients = {}
+    if 'aws' in providers:
+        clients['aws'] = ApiClient(aws_endpoint, aws_rate, concurrency, retries)
+    if 'gcp' in providers:
+        clients['gcp'] = ApiClient(gcs_endpoint, gcs_rate, concurrency, retries)
+    days = date_range(start, end)
+    try:
+        results = await asyncio.gather(*(run_extract(p, client, days, raw_dir) for p, client in clients.items()))
+    finally:
+        for client in clients.values():
+            await client.close()
+        for standin in standins:
+            await standin.stop()
+    for result, client in zip(results, clients.values()):
+        result['connections'] = client.pool.opened
+    return {result['provider']: result for result in results}
+
+
+def main(start=None, end=None, raw_dir=RAW_DIR, providers=tuple(SOURCES), concurrency=DEFAULT_CONCURRENCY,
+         aws_rate=AWS_RATE_LIMIT, gcs_rate=GCS_RATE_LIMIT, latency=0.5, fail_rate=0.0, aws_endpoint=None,
+         gcs_endpoint=None, verify=True):
+    print("=" * 80)
+    print("BILLING EXTRACT (raw zone)")
+    print("=" * 80)
+    print()
+    
+    if start is None or end is None:
+        # Default to the whole range of the local source files
+        dates = pd.concat([pd.read_csv(SOURCES[p]['path'], usecols=['date'])['date'] for p in providers])
+        start, end = start or dates.min(), end or dates.max()
+    print(f"Extracting {start} .. {end} into {raw_dir} "
+          f"({'local stand-ins' if not (aws_endpoint or gcs_endpoint) else 'remote endpoints'}, "
+          f"{concurrency} connections, {latency * 1000:.0f} ms stand-in latency)")
+    print()
+    
+    results = asyncio.run(backfill(start, end, raw_dir, providers, aws_endpoint, gcs_endpoint, aws_rate, gcs_rate,
+                                   concurrency, latency=latency, fail_rate=fail_rate))
+    limits = {'aws': aws_rate, 'gcp': gcs_rate}
+    for provider, result in results.items():
+        output = f"{result['rows']:,} rows" if 'rows' in result else f"{result['files']:,} files"
+        print(f"✓ {provider.upper()}: {result['days']} days, {output}, {result['bytes'] / 1024 ** 2:.1f} MB "
+              f"in {result['seconds']:.1f}s")
+        print(f"  {result['requests']:,} requests ({result['requests_per_second']:.1f}/s against a "
+              f"{limits[provider]}/s limit), {result['retries']} retries ({result['throttled']} throttled), "
+              f"{result['connections']} connections opened")
+    print()
+    
+    if verify and not (aws_endpoint or gcs_endpoint):
+        # The stand-ins serve the source CSVs, so the raw zone must reproduce them
+        for provider in results:
+            raw = read_raw_zone(provider, raw_dir)
+            source = pd.read_csv(SOURCES[provider]['path'], dtype=source_dtypes(provider))
+            source = source[(source['date'] >= str(start)) & (source['date'] <= str(end))]
+            match = len(raw) == len(source) and abs(raw['cost_usd'].sum() - source['cost_usd'].sum()) < 0.01
+            print(f"{'✓' if match else '✗'} {provider.upper()} raw zone: {len(raw):,} rows, "
+                  f"${raw['cost_usd'].sum():,.2f} (source {len(source):,} rows, ${source['cost_usd'].sum():,.2f})")
+        print()
+    return results
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Extract billing data from Cost Explorer / GCS into the raw zone.")
+    parser.add_argument('--start', default=None, help="first day (default: start of the local data)")
+    parser.add_argument('--end', default=None, help="last day (default: end of the local data)")
+    parser.add_argument('--raw-dir', default=RAW_DIR)
+    parser.add_argument('--provider', choices=list(SOURCES), action='append', default=None,
+                        help="extract only this provider (repeatable)")
+    parser.add_argument('--concurrency', type=int, default=DEFAULT_CONCURRENCY,
+                        help="connections / requests in flight per source (1 = sequential)")
+    parser.add_argument('--aws-rate', type=float, default=AWS_RATE_LIMIT, help="Cost Explorer requests per second")
+    parser.add_argument('--gcs-rate', type=float, default=GCS_RATE_LIMIT, help="GCS requests per second")
+    parser.add_argument('--latency', type=float, default=0.5, help="stand-in service time per request (s)")
+    parser.add_argument('--fail-rate', type=float, default=0.0, help="share of stand-in requests that fail (503)")
+    parser.add_argument('--aws-endpoint', default=None, help="use this Cost Explorer endpoint instead of a stand-in")
+    parser.add_argument('--gcs-endpoint', default=None, help="use this GCS endpoint instead of a stand-in")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.start, args.end, args.raw_dir, tuple(args.provider or SOURCES), args.concurrency, args.aws_rate,
+         args.gcs_rate, args.latency, args.fail_rate, args.aws_endpoint, args.gcs_endpoint)
@@ -0,0 +1,226 @@
+"""
+Ingest Cache (Bronze Layer)
+K&Co Cloud Cost Intelligence Platform
+
+Converts each provider's billing CSV into typed Parquet files partitioned by
+cloud/year/month, mirroring the Bronze layout in Part D:
+
+    data/bronze/cloud=aws/year=2025/month=01/part-0.parquet
+    data/bronze/cloud=aws/_manifest.json
+
+The manifest records the source file's size, mtime and SHA-256. On load:
+- size and mtime unchanged          -> warm cache, no source I/O at all
+- size/mtime changed, hash the same -> touch the manifest, keep the cache
+- content changed                   -> re-ingest the CSV (chunked)
+
+Requires a Parquet engine (pyarrow). Without one, loads fall back to parsing
+the CSV directly so the scripts still run.
+"""
+
+import hashlib
+import json
+import os
+import shutil
+
+import pandas as pd
+
+BRONZE_DIR = 'data/bronze'
+INGEST_CHUNKSIZE = 500_000
+
+SOURCES = {
+    'aws': {'path': 'data/aws_line_items_12mo.csv', 'id_col': 'account_id'},
+    'gcp': {'path': 'data/gcp_billing_12mo.csv', 'id_col': 'project_id'},
+}
+
+
+def parquet_available():
+    try:
+        import pyarrow  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+def source_dtypes(provider):
+    """Explicit column types for a provider's CSV (date is parsed separately)."""
+    id_col = SOURCES[provider]['id_col']
+    return {id_col: str, 'service': str, 'team': str, 'env': str, 'cost_usd': 'float64'}
+
+
+def file_sha256(path, block_size=1 << 20):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def provider_dir(provider, bronze_dir=BRONZE_DIR):
+    return os.path.join(bronze_dir, f'cloud={provider}')
+
+
+def manifest_path(provider, bronze_dir=BRONZE_DIR):
+    return os.path.join(provider_dir(provider, bronze_dir), '_manifest.json')
+
+
+def read_manifest(provider, bronze_dir=BRONZE_DIR):
+    try:
+        with open(manifest_path(provider, bronze_dir)) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+
+def write_manifest(provider, manifest, bronze_dir=BRONZE_DIR):
+    path = manifest_path(provider, bronze_dir)
+    tmp = path + '.tmp'
+    with open(tmp, 'w') as f:
+        json.dump(manifest, f, indent=2)
+    os.replace(tmp, path)
+
+
+def read_source_chunks(provider, chunksize=INGEST_CHUNKSIZE, source_path=None):
+    """Yield typed chunks straight from a provider's CSV."""
+    path = source_path or SOURCES[provider]['path']
+    for chunk in pd.read_csv(path, chunksize=chunksize, dtype=source_dtypes(provider)):
+        chunk['date'] = pd.to_datetime(chunk['date'])
+        yield chunk
+
+
+def ingest(provider, bronze_dir=BRONZE_DIR, chunksize=INGEST_CHUNKSIZE, source_path=None, sha256=None):
+    """Convert one provider's CSV into partitioned Parquet and write its manifest."""
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    
+    path = source_path or SOURCES[provider]['path']
+    stat = os.stat(path)
+    schema = pa.schema(
+        [('date', pa.timestamp('ns'))]
+        + [(col, pa.float64() if col == 'cost_usd' else pa.string()) for col in source_dtypes(provider)]
+    )
+    final_dir = provider_dir(provider, bronze_dir)
+    staging_dir = final_dir + '.staging'
+    shutil.rmtree(staging_dir, ignore_errors=True)
+    
+    writers = {}
+    rows = 0
+    try:
+        for chunk in read_source_chunks(provider, chunksize, path):
+            rows += len(chunk)
+            keys = chunk['date'].dt.year * 100 + chunk['date'].dt.month
+            for key, part in chunk.groupby(keys, sort=False):
+                if key not in writers:
+                    part_dir = os.path.join(staging_dir, f'year={key // 100}', f'month={key % 100:02d}')
+                    os.makedirs(part_dir, exist_ok=True)
+                    writers[key] = pq.ParquetWriter(os.path.join(part_dir, 'part-0.parquet'), schema)
+                writers[key].write_table(pa.Table.from_pandas(part, preserve_index=False, schema=schema))
+    finally:
+        for writer in writers.values():
+            writer.close()
+    
+    # Swap the new partitions in as a unit
+    shutil.rmtree(final_dir, ignore_errors=True)
+    os.makedirs(staging_dir, exist_ok=True)
+    os.replace(staging_dir, final_dir)
+    
+    manifest = {
+        'provider': provider,
+        'source_path': path,
+        'source_size': stat.st_size,
+        'source_mtime_ns': stat.st_mtime_ns,
+        'source_sha256': sha256 or file_sha256(path),
+        'rows': rows,
+        'partitions': [
+            os.path.join(f'year={key // 100}', f'month={key % 100:02d}', 'part-0.parquet')
+            for key in sorted(writers)
+        ],
+    }
+    write_manifest(provider, manifest, bronze_dir)
+    return manifest
+
+
+def ensure_ingested(provider, bronze_dir=BRONZE_DIR, source_path=None, verbose=False):
+    """Return a valid manifest for the provider, re-ingesting only if the source changed."""
+    path = source_path or SOURCES[provider]['path']
+    stat = os.stat(path)
+    manifest = read_manifest(provider, bronze_dir)
+    
+    if manifest and manifest['source_path'] == path:
+        if (manifest['source_size'] == stat.st_size
+                and manifest['source_mtime_ns'] == stat.st_mtime_ns):
+            return manifest
+        
+        sha256 = file_sha256(path)
+        if manifest['source_sha256'] == sha256:
+            manifest['source_size'] = stat.st_size
+            manifest['source_mtime_ns'] = stat.st_mtime_ns
+            write_manifest(provider, manifest, bronze_dir)
+            return manifest
+    else:
+        sha256 = None
+    
+    if verbose:
+        print(f"  Ingesting {path} into {provider_dir(provider, bronze_dir)}...")
+    return ingest(provider, bronze_dir, source_path=path, sha256=sha256)
+
+
+def partition_files(provider, since=None, bronze_dir=BRONZE_DIR):
+    """Partition files for a provider, optionally only months on/after `since`."""
+    manifest = ensure_ingested(provider, bronze_dir)
+    files = []
+    for rel in manifest['partitions']:
+        year = int(rel.split('year=')[1][:4])
+        month = int(rel.split('month=')[1][:2])
+        if since is not None and (year, month) < (since.year, since.month):
+            continue
+        files.append(os.path.join(provider_dir(provider, bronze_dir), rel))
+    return files
+
+
+def load_billing(provider, columns=None, since=None, bronze_dir=BRONZE_DIR):
+    """
+    Load a provider's billing rows from the Bronze cache.
+    
+    `since` (a date/Timestamp) prunes whole month partitions before reading and
+    then filters rows, so incremental consumers only touch recent files.
+    """
+    if not parquet_available():
+        df = pd.concat(read_source_chunks(provider), ignore_index=True)
+        if since is not None:
+            df = df[df['date'] >= pd.Timestamp(since)].reset_index(drop=True)
+        return df[columns] if columns else df
+    
+    files = partition_files(provider, since, bronze_dir)
+    read_columns = columns
+    if columns and since is not None and 'date' not in columns:
+        read_columns = ['date'] + list(columns)
+    if files:
+        df = pd.concat([pd.read_parquet(f, columns=read_columns) for f in files], ignore_index=True)
+    else:
+        # Nothing at/after `since`: return an empty frame with the cached schema
+        all_files = partition_files(provider, bronze_dir=bronze_dir)
+        if not all_files:
+            return pd.DataFrame(columns=columns or ['date'] + list(source_dtypes(provider)))
+        df = pd.read_parquet(all_files[0], columns=read_columns).iloc[:0]
+    if since is not None:
+        df = df[df['date'] >= pd.Timestamp(since)].reset_index(drop=True)
+    return df[columns] if columns else df
+
+
+def iter_billing_chunks(provider, chunksize, bronze_dir=BRONZE_DIR):
+    """Stream a provider's cached rows in record batches of at most `chunksize`."""
+    if not parquet_available():
+        yield from read_source_chunks(provider, chunksize)
+        return
+    
+    import pyarrow.parquet as pq
+    
+    for path in partition_files(provider, bronze_dir=bronze_dir):
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            yield batch.to_pandas()
+
+
+if __name__ == "__main__":
+    for name in SOURCES:
+        m = ensure_ingested(name, verbose=True)
+        print(f"✓ {name.upper()}: {m['rows']:,} rows in {len(m['partitions'])} partitions")
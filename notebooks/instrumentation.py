@@ -0,0 +1,158 @@
+"""
+Run Instrumentation
+K&Co Cloud Cost Intelligence Platform
+
+Lightweight per-step instrumentation for the pipeline scripts. A RunRecorder
+wraps each profiling section / load / query in a `with recorder.step(...)`
+block and records:
+- wall time and CPU time
+- rows in / rows out (set by the caller on the yielded record)
+- peak and net traced memory (tracemalloc, optional) and the process
+  high-water RSS
+- any extra fields the caller attaches (e.g. the SQLite EXPLAIN QUERY PLAN)
+
+finish() returns the structured run report and writes it as JSON; with a
+profile path the whole run is also captured by cProfile and dumped for
+`python -m pstats` / snakeviz. The step durations are what Part D's
+"task duration" SLA monitoring consumes.
+
+Steps are flat (not nested): each one resets the tracemalloc peak. When no
+report is requested the scripts use NullRecorder, which does nothing.
+"""
+
+import cProfile
+import json
+import os
+import platform
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+from datetime import datetime, timezone
+
+import numpy as np
+
+MB = 1024 ** 2
+
+
+def max_rss_mb():
+    """Process high-water RSS in MB (None where the resource module is missing)."""
+    try:
+        import resource
+    except ImportError:
+        return None
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is KB on Linux and bytes on macOS
+    return rss / MB if platform.system() == 'Darwin' else rss / 1024
+
+
+def _json_default(value):
+    if isinstance(value, np.generic):
+        return value.item()
+    if isinstance(value, (datetime, np.datetime64)):
+        return str(value)
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class NullRecorder:
+    """Recorder that records nothing (instrumentation switched off)."""
+    
+    enabled = False
+    
+    @contextmanager
+    def step(self, name, rows_in=None):
+        yield {}
+    
+    def finish(self, report_path=None):
+        return None
+
+
+class RunRecorder:
+    """Collects per-step measurements for one run of a pipeline script."""
+    
+    enabled = True
+    
+    def __init__(self, run, trace_memory=False, profile_path=None, args=None):
+        self.run = run
+        self.trace_memory = trace_memory
+        self.profile_path = profile_path
+        self.args = args or {}
+        self.steps = []
+        self.started_at = datetime.now(timezone.utc)
+        self._wall = time.perf_counter()
+        self._cpu = time.process_time()
+        self._profiler = None
+        if trace_memory and not tracemalloc.is_tracing():
+            tracemalloc.start()
+        if profile_path:
+            self._profiler = cProfile.Profile()
+            self._profiler.enable()
+    
+    @contextmanager
+    def step(self, name, rows_in=None):
+        """Measure one step; the yielded dict can be given rows_out and extra fields."""
+        record = {'name': name, 'rows_in': rows_in, 'rows_out': None}
+        if self.trace_memory:
+            tracemalloc.reset_peak()
+            base = tracemalloc.get_traced_memory()[0]
+        wall, cpu = time.perf_counter(), time.process_time()
+        try:
+            yield record
+        finally:
+            record['wall_seconds'] = time.perf_counter() - wall
+            record['cpu_seconds'] = time.process_time() - cpu
+            if self.trace_memory:
+                current, peak = tracemalloc.get_traced_memory()
+                record['peak_mb'] = (peak - base) / MB
+                record['net_mb'] = (current - base) / MB
+            record['max_rss_mb'] = max_rss_mb()
+            self.steps.append(record)
+    
+    def report(self):
+        return {
+            'run': self.run,
+            'started_at': self.started_at.isoformat(timespec='seconds'),
+            'finished_at': datetime.now(timezone.utc).isoformat(timespec='seconds'),
+            'wall_seconds': time.perf_counter() - self._wall,
+            'cpu_seconds': time.process_time() - self._cpu,
+            'max_rss_mb': max_rss_mb(),
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'argv': sys.argv,
+            'args': self.args,
+            'profile_path': self.profile_path,
+            'steps': self.steps,
+        }
+    
+    def finish(self, report_path=None):
+        """Stop tracing/profiling, write the JSON report (and cProfile dump); return the report."""
+        if self._profiler is not None:
+            self._profiler.disable()
+            os.makedirs(os.path.dirname(self.profile_path) or '.', exist_ok=True)
+            self._profiler.dump_stats(self.profile_path)
+        report = self.report()
+        if self.trace_memory and tracemalloc.is_tracing():
+            tracemalloc.stop()
+        if report_path:
+            os.makedirs(os.path.dirname(report_path) or '.', exist_ok=True)
+            with open(report_path, 'w') as f:
+                json.dump(report, f, indent=2, default=_json_default)
+        return report
+
+
+def make_recorder(run, report_path=None, trace_memory=False, profile_path=None, args=None):
+    """RunRecorder if any output was requested, else NullRecorder."""
+    if report_path or profile_path or trace_memory:
+        return RunRecorder(run, trace_memory, profile_path, args)
+    return NullRecorder()
+
+
+def add_report_arguments(parser):
+    """--report / --trace-memory / --profile options shared by the pipeline scripts."""
+    parser.add_argument('--report', default=None,
+                        help="write a JSON run report (per-step wall/CPU time, rows, memory)")
+    parser.add_argument('--trace-memory', action='store_true',
+                        help="record per-step peak memory with tracemalloc (slower)")
+    parser.add_argument('--profile', default=None,
+                        help="dump a cProfile of the whole run to this path")
+    return parser
@@ -0,0 +1,242 @@
+"""
+Parallel Report Runner
+K&Co Cloud Cost Intelligence Platform
+
+Runs the Part A profiling and the Part C report suite on every core:
+- Part A (in-memory): one process task per (provider, profiling section);
+  each worker receives the compact provider frames once, at pool start-up
+- Part A (streaming): one process task per (provider, Bronze partition);
+  the per-partition ProfileAccumulators are merged in partition order
+- Part C: the report queries run concurrently on a thread pool, each thread
+  holding its own read-only connection to the on-disk warehouse (SQLite
+  releases the GIL while a statement executes)
+
+Results are always reassembled in the sequential order, so the printed
+reports are identical whatever the worker count.
+"""
+
+import argparse
+import os
+import sqlite3
+import threading
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+
+import pandas as pd
+
+from ingest_cache import SOURCES, iter_billing_chunks, parquet_available, partition_files
+from part_a_profiling import PROFILE_SECTIONS
+
+DEFAULT_WORKERS = os.cpu_count() or 1
+
+# Compact provider frames, set once per worker process by the pool initializer
+_worker_frames = None
+
+
+def resolve_workers(workers):
+    """Worker count to use: None or 0 means one per CPU core."""
+    return DEFAULT_WORKERS if not workers else max(1, int(workers))
+
+
+# ============================================================================
+# Part A: profiling
+# ============================================================================
+
+def _init_profile_worker(frames):
+    global _worker_frames
+    _worker_frames = frames
+
+
+def _profile_section(provider, section):
+    return PROFILE_SECTIONS[section](_worker_frames[provider], SOURCES[provider]['id_col'])
+
+
+def profile_providers_parallel(frames, workers=None):
+    """
+    Profile compact provider frames with one task per (provider, section).
+    
+    Returns {provider: profile dict}, in the order of `frames`, with the same
+    contents as part_a_profiling.profile_frame().
+    """
+    tasks = [(provider, section) for provider in frames for section in PROFILE_SECTIONS]
+    with ProcessPoolExecutor(resolve_workers(workers), initializer=_init_profile_worker,
+                             initargs=(frames,)) as pool:
+        futures = [pool.submit(_profile_section, provider, section) for provider, section in tasks]
+        results = [future.result() for future in futures]
+    
+    profiles = {provider: {} for provider in frames}
+    for (provider, _), metrics in zip(tasks, results):
+        profiles[provider].update(metrics)
+    return profiles
+
+
+def _profile_partition(provider, path, chunksize):
+    from streaming_profiler import profile_chunks
+    
+    if path is None:
+        chunks = iter_billing_chunks(provider, chunksize)
+    else:
+        import pyarrow.parquet as pq
+        chunks = (batch.to_pandas() for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize))
+    return profile_chunks(chunks, SOURCES[provider]['id_col'])
+
+
+def stream_profiles_parallel(providers, chunksize, workers=None):
+    """
+    Streaming profile with one task per (provider, Bronze partition).
+    
+    Without pyarrow there are no partitions, so each provider is one task.
+    Returns {provider: profile dict}, in the order of `providers`.
+    """
+    tasks = []
+    for provider in providers:
+        paths = partition_files(provider) if parquet_available() else [None]
+        tasks.extend((provider, path) for path in paths)
+    
+    with ProcessPoolExecutor(resolve_workers(workers)) as pool:
+        futures = [pool.submit(_profile_partition, provider, path, chunksize) for provider, path in tasks]
+        accumulators = [future.result() for future in futures]
+    
+    merged = {}
+    for (provider, _), acc in zip(tasks, accumulators):
+        merged[provider] = merged[provider].merge(acc) if provider in merged else acc
+    return {provider: merged[provider].result() for provider in providers}
+
+
+# ============================================================================
+# Part C: report queries
+# ============================================================================
+
+def connect_read_only(path):
+    """Read-only connection to an on-disk SQLite database."""
+    return sqlite3.connect(f"file:{os.path.abspath(path)}?mode=ro", uri=True, check_same_thread=False)
+
+
+def run_queries_parallel(path, queries, workers=None):
+    """
+    Run {name: query} concurrently, one read-only connection per thread.
+    
+    Returns {name: DataFrame} in the order of `queries`.
+    """
+    local = threading.local()
+    connections = []
+    lock = threading.Lock()
+    
+    def run(query):
+        if not hasattr(local, 'conn'):
+            local.conn = connect_read_only(path)
+            with lock:
+                connections.append(local.conn)
+        return pd.read_sql_query(query, local.conn)
+    
+    try:
+        with ThreadPoolExecutor(resolve_workers(workers)) as pool:
+            futures = {name: pool.submit(run, query) for name, query in queries.items()}
+            return {name: future.result() for name, future in futures.items()}
+    finally:
+        for conn in connections:
+            conn.close()
+
+
+# ============================================================================
+# Timing comparison
+# ============================================================================
+
+def results_match(expected, actual):
+    """
+    Profile dicts / report DataFrames from two runs agree, up to float
+    rounding (merging accumulators in a different grouping changes the last
+    bits of the streaming cost moments).
+    """
+    if isinstance(expected, dict):
+        return expected.keys() == actual.keys() and all(results_match(expected[k], actual[k]) for k in expected)
+    try:
+        if isinstance(expected, pd.DataFrame):
+            pd.testing.assert_frame_equal(expected, actual)
+        elif isinstance(expected, pd.Series):
+            pd.testing.assert_series_equal(expected, actual)
+        elif expected != actual:
+            return False
+    except AssertionError:
+        return False
+    return True
+
+
+def main(workers=None, warehouse_path=None, chunksize=None):
+    from billing_frame import load_compact_providers
+    from part_a_profiling import profile_frame
+    from part_c_sql_execution import REPORT_QUERIES
+    from streaming_profiler import profile_chunks
+    from warehouse import WAREHOUSE_PATH, connect, load_all
+    from aggregates import refresh_aggregates, touched_months
+    
+    workers = resolve_workers(workers)
+    warehouse_path = warehouse_path or WAREHOUSE_PATH
+    
+    print("=" * 80)
+    print(f"PARALLEL REPORT RUNNER ({workers} workers)")
+    print("=" * 80)
+    print()
+    
+    # Part A
+    if chunksize:
+        start = time.perf_counter()
+        sequential = {
+            provider: profile_chunks(iter_billing_chunks(provider, chunksize), spec['id_col']).result()
+            for provider, spec in SOURCES.items()
+        }
+        sequential_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = stream_profiles_parallel(list(SOURCES), chunksize, workers)
+        parallel_time = time.perf_counter() - start
+        label = f"Part A streaming profile ({chunksize:,}-row chunks)"
+    else:
+        frames = load_compact_providers()
+        start = time.perf_counter()
+        sequential = {provider: profile_frame(frames[provider], SOURCES[provider]['id_col']) for provider in frames}
+        sequential_time = time.perf_counter() - start
+        start = time.perf_counter()
+        parallel = profile_providers_parallel(frames, workers)
+        parallel_time = time.perf_counter() - start
+        label = "Part A profile"
+    print(f"{label}:")
+    print(f"  sequential: {sequential_time * 1000:8.1f} ms")
+    print(f"  parallel:   {parallel_time * 1000:8.1f} ms")
+    part_a_match = all(results_match(sequential[p], parallel[p]) for p in sequential)
+    print(f"  {'✓ results match' if part_a_match else '✗ results differ'}")
+    print()
+    
+    # Part C (bring the warehouse up to date first so the read-only connections see it)
+    conn = connect(warehouse_path)
+    refresh_aggregates(conn, touched_months(load_all(conn)))
+    start = time.perf_counter()
+    sequential = {name: pd.read_sql_query(query, conn) for name, query in REPORT_QUERIES.items()}
+    sequential_time = time.perf_counter() - start
+    conn.close()
+    start = time.perf_counter()
+    parallel = run_queries_parallel(warehouse_path, REPORT_QUERIES, workers)
+    parallel_time = time.perf_counter() - start
+    print("Part C report suite:")
+    print(f"  sequential: {sequential_time * 1000:8.1f} ms")
+    print(f"  parallel:   {parallel_time * 1000:8.1f} ms")
+    part_c_match = results_match(sequential, parallel)
+    print(f"  {'✓ results match' if part_c_match else '✗ results differ'}")
+    print()
+    
+    return {'part_a_match': part_a_match, 'part_c_match': part_c_match}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Part A and Part C reports in parallel.")
+    parser.add_argument('--workers', type=int, default=None,
+                        help="worker processes/threads (default: one per CPU core)")
+    parser.add_argument('--warehouse', default=None,
+                        help="SQLite warehouse file (default: data/warehouse.db)")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="compare the streaming profile in chunks of this many rows")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.workers, args.warehouse, args.chunksize)
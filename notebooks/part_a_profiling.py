@@ -3,31 +3,236 @@ Part A: Data Understanding & Quality Checks
 K&Co Cloud Cost Intelligence Platform
 
 This script performs comprehensive data profiling on AWS and GCP billing data.
+
+Two profiling modes produce the same report:
+- in-memory (default): each provider is loaded whole with pandas
+- streaming (--chunksize N): each provider is read in N-row chunks and folded
+  into mergeable accumulators (see streaming_profiler.py), so peak memory is
+  bounded by the chunk size rather than the file size
+
+With --workers N (0 = one per core) the providers and profiling sections (or,
+when streaming, the Bronze partitions) are profiled in a process pool; see
+parallel_runner.py.
+
+Both read from the Parquet cache built by ingest_cache.py, which converts the
+raw CSVs once and reuses them until the source files change.
+
+--report PATH writes a JSON run report with the wall/CPU time, rows and
+memory of every step (see instrumentation.py); --profile PATH adds a cProfile
+dump of the run.
 """
 
+import argparse
+
 import pandas as pd
 import numpy as np
 from datetime import datetime
 import json
 
-def main():
-    print("=" * 80)
-    print("K&CO DATA PROFILING ANALYSIS")
-    print("=" * 80)
-    print()
-    
-    # Load datasets
-    print("Loading datasets...")
-    aws_df = pd.read_csv('data/aws_line_items_12mo.csv')
-    gcp_df = pd.read_csv('data/gcp_billing_12mo.csv')
-    print(f"✓ AWS Data Loaded: {len(aws_df):,} records")
-    print(f"✓ GCP Data Loaded: {len(gcp_df):,} records")
-    print()
-    
-    # Convert dates
-    aws_df['date'] = pd.to_datetime(aws_df['date'])
-    gcp_df['date'] = pd.to_datetime(gcp_df['date'])
+from ingest_cache import iter_billing_chunks
+from billing_frame import (
+    load_compact_providers, from_day_offset, present_values, duplicated_keys, duplicated_rows
+)
+from instrumentation import NullRecorder, add_report_arguments, make_recorder
+
+
+def key_columns(id_col):
+    """Composite key that defines the billing grain for one provider."""
+    return ['date', id_col, 'service', 'team', 'env']
+
+
+def profile_columns(id_col):
+    """Every column the profile reads: the billing grain plus cost."""
+    return [*key_columns(id_col), 'cost_usd']
+
+
+def profile_shape(df, id_col):
+    """Row/column counts, memory footprint (of the compact frame) and missing values."""
+    return {
+        'row_count': len(df),
+        'column_count': len(df.columns),
+        'memory_bytes': df.memory_usage(deep=True).sum(),
+        'memory_layout': 'compact',
+        'missing_values': df.isnull().sum().sum(),
+    }
+
+
+def profile_duplicates(df, id_col):
+    """Full-row and composite-key duplicate counts."""
+    return {
+        'duplicate_rows': duplicated_rows(df).sum(),
+        'key_duplicates': duplicated_keys(df, key_columns(id_col)).sum(),
+    }
+
+
+def profile_dates(df, id_col):
+    """Date range, gaps and average daily cost."""
+    days = df['date'].to_numpy()
+    cost = df['cost_usd'].to_numpy(dtype='float64')
+    first, last = days.min(), days.max()
+    day_rows = np.bincount(days - first)
+    day_cost = np.bincount(days - first, weights=np.nan_to_num(cost))
+    active = day_rows > 0
+    min_date, max_date = from_day_offset([first, last])
+    return {
+        'min_date': min_date,
+        'max_date': max_date,
+        'unique_dates': int(active.sum()),
+        'missing_dates': int((~active).sum()),
+        'avg_daily_cost': day_cost[active].mean(),
+    }
+
+
+def profile_dimensions(df, id_col):
+    """Environment counts and the distinct services, teams, envs and IDs."""
+    env_codes = df['env'].cat.codes.to_numpy()
+    env_rows = np.bincount(env_codes[env_codes >= 0], minlength=len(df['env'].cat.categories))
+    present = np.flatnonzero(env_rows)
+    env_counts = pd.Series(
+        env_rows[present],
+        index=pd.Index(df['env'].cat.categories[present], name='env'),
+        name='count'
+    ).sort_values(ascending=False, kind='stable')
+    return {
+        'env_counts': env_counts,
+        'services': present_values(df, 'service'),
+        'teams': present_values(df, 'team'),
+        'envs': present_values(df, 'env'),
+        'ids': present_values(df, id_col),
+    }
+
+
+def profile_costs(df, id_col):
+    """cost_usd distribution, credits, zero costs and totals."""
+    cost = df['cost_usd'].to_numpy(dtype='float64')
+    return {
+        'cost_describe': df['cost_usd'].describe(),
+        'negative_costs': (cost < 0).sum(),
+        'zero_costs': (cost == 0).sum(),
+        'cost_min': np.nanmin(cost),
+        'cost_max': np.nanmax(cost),
+        'total_cost': np.nansum(cost),
+    }
+
+
+# Independent profiling sections: each reads only the frame, so they can run
+# in any order (or in parallel, see parallel_runner.py) and be merged
+PROFILE_SECTIONS = {
+    'shape': profile_shape,
+    'duplicates': profile_duplicates,
+    'dates': profile_dates,
+    'dimensions': profile_dimensions,
+    'costs': profile_costs,
+}
+
+
+def profile_frame(df, id_col, recorder=None, label='profile'):
+    """
+    Compute every metric used by the report from a compact provider frame
+    (see billing_frame.py): dates are int32 day offsets and the string
+    dimensions are shared-dictionary categoricals, so every count, distinct
+    and duplicate check below runs on integer codes.
+    
+    With a recorder, each section is recorded as step `<label>.<section>`.
+    """
+    recorder = recorder or NullRecorder()
+    metrics = {}
+    for name, section in PROFILE_SECTIONS.items():
+        with recorder.step(f'{label}.{name}', rows_in=len(df)):
+            metrics.update(section(df, id_col))
+    return metrics
+
+
+def build_risks(aws, gcp):
+    """The 7 data quality risks, parameterised by the profiled metrics."""
+    return [
+        {
+            'risk': 'Negative Cost Values',
+            'description': f'Found {aws["negative_costs"]} negative costs in AWS and {gcp["negative_costs"]} in GCP',
+            'impact': 'Can skew financial reporting and analytics',
+            'remediation': 'Investigate if these are credits/refunds. Create separate column for credits or flag them explicitly.'
+        },
+        {
+            'risk': 'Duplicate Records on Key Columns',
+            'description': f'Found {aws["key_duplicates"]} duplicates in AWS and {gcp["key_duplicates"]} in GCP',
+            'impact': 'Double-counting costs leading to inflated spend reports',
+            'remediation': 'Implement deduplication logic based on composite key. Aggregate costs if legitimate.'
+        },
+        {
+            'risk': 'Inconsistent Service Naming',
+            'description': 'Same services appear in both AWS and GCP (EC2, RDS, S3, Lambda, EKS)',
+            'impact': 'Confusion in cross-cloud analysis; GCP should use different service names',
+            'remediation': 'Create service mapping table to standardize names across clouds.'
+        },
+        {
+            'risk': 'Missing Date Continuity',
+            'description': f'{aws["missing_dates"]} missing dates in AWS, {gcp["missing_dates"]} in GCP',
+            'impact': 'Incomplete time-series analysis and trending',
+            'remediation': 'Implement data completeness checks. Fill gaps with zero-cost records or flag missing days.'
+        },
+        {
+            'risk': 'No Data Type Validation',
+            'description': 'Columns loaded as generic types; no explicit validation of account_id, project_id formats',
+            'impact': 'Invalid IDs could enter system undetected',
+            'remediation': 'Implement schema validation with expected data types and regex patterns for IDs.'
+        },
+        {
+            'risk': 'Wide Cost Range Without Outlier Detection',
+            'description': f'AWS costs range from ${aws["cost_min"]:.2f} to ${aws["cost_max"]:.2f}',
+            'impact': 'Anomalous spikes may go unnoticed without automated detection',
+            'remediation': 'Implement statistical outlier detection (IQR, Z-score) and alerting.'
+        },
+        {
+            'risk': 'No Referential Integrity Checks',
+            'description': 'Team, service, env values not validated against master lists',
+            'impact': 'Typos and invalid values can fragment reporting',
+            'remediation': 'Create dimension tables with valid values. Enforce foreign key constraints.'
+        }
+    ]
+
+
+def build_summary_stats(aws, gcp):
+    """Section 11 summary table for both providers."""
+    def column(m):
+        return [
+            f"{m['row_count']:,}",
+            f"{m['min_date'].date()} to {m['max_date'].date()}",
+            f"{m['unique_dates']}",
+            f"{m['missing_dates']}",
+            f"{len(m['services'])}",
+            f"{len(m['teams'])}",
+            f"{len(m['envs'])}",
+            f"{len(m['ids'])}",
+            f"${m['total_cost']:,.2f}",
+            f"${m['avg_daily_cost']:,.2f}",
+            f"{m['negative_costs']}",
+            f"{m['key_duplicates']}",
+            f"{m['missing_values']}"
+        ]
     
+    return pd.DataFrame({
+        'Metric': [
+            'Total Records',
+            'Date Range',
+            'Unique Dates',
+            'Missing Dates',
+            'Unique Services',
+            'Unique Teams',
+            'Unique Environments',
+            'Unique Accounts/Projects',
+            'Total Cost (USD)',
+            'Average Daily Cost (USD)',
+            'Negative Cost Records',
+            'Duplicate Records (Key)',
+            'Missing Values'
+        ],
+        'AWS': column(aws),
+        'GCP': column(gcp)
+    })
+
+
+def print_report(aws, gcp):
+    """Print report sections 1-11 from two profile dicts."""
     # 1. Basic Profiling
     print("=" * 80)
     print("1. BASIC DATA PROFILING")
@@ -36,11 +241,12 @@ def main():
     
     profiling_summary = pd.DataFrame({
         'Dataset': ['AWS', 'GCP'],
-        'Row Count': [len(aws_df), len(gcp_df)],
-        'Column Count': [len(aws_df.columns), len(gcp_df.columns)],
-        'Memory (MB)': [
-            f"{aws_df.memory_usage(deep=True).sum() / 1024**2:.2f}",
-            f"{gcp_df.memory_usage(deep=True).sum() / 1024**2:.2f}"
+        'Row Count': [aws['row_count'], gcp['row_count']],
+        'Column Count': [aws['column_count'], gcp['column_count']],
+        # Streaming and in-memory runs measure different layouts; say which
+        f"Memory (MB, {aws['memory_layout']})": [
+            f"{aws['memory_bytes'] / 1024**2:.2f}",
+            f"{gcp['memory_bytes'] / 1024**2:.2f}"
         ]
     })
     print(profiling_summary.to_string(index=False))
@@ -52,10 +258,8 @@ def main():
     print("=" * 80)
     print()
     
-    aws_missing = aws_df.isnull().sum().sum()
-    gcp_missing = gcp_df.isnull().sum().sum()
-    print(f"AWS Total Missing Values: {aws_missing}")
-    print(f"GCP Total Missing Values: {gcp_missing}")
+    print(f"AWS Total Missing Values: {aws['missing_values']}")
+    print(f"GCP Total Missing Values: {gcp['missing_values']}")
     print()
     
     # 3. Duplicate Records
@@ -64,16 +268,11 @@ def main():
     print("=" * 80)
     print()
     
-    aws_duplicates = aws_df.duplicated().sum()
-    gcp_duplicates = gcp_df.duplicated().sum()
-    aws_key_duplicates = aws_df.duplicated(subset=['date', 'account_id', 'service', 'team', 'env']).sum()
-    gcp_key_duplicates = gcp_df.duplicated(subset=['date', 'project_id', 'service', 'team', 'env']).sum()
-    
-    print(f"AWS Complete Duplicate Rows: {aws_duplicates} ({aws_duplicates/len(aws_df)*100:.2f}%)")
-    print(f"GCP Complete Duplicate Rows: {gcp_duplicates} ({gcp_duplicates/len(gcp_df)*100:.2f}%)")
+    print(f"AWS Complete Duplicate Rows: {aws['duplicate_rows']} ({aws['duplicate_rows']/aws['row_count']*100:.2f}%)")
+    print(f"GCP Complete Duplicate Rows: {gcp['duplicate_rows']} ({gcp['duplicate_rows']/gcp['row_count']*100:.2f}%)")
     print()
-    print(f"AWS Duplicates on Key Columns: {aws_key_duplicates}")
-    print(f"GCP Duplicates on Key Columns: {gcp_key_duplicates}")
+    print(f"AWS Duplicates on Key Columns: {aws['key_duplicates']}")
+    print(f"GCP Duplicates on Key Columns: {gcp['key_duplicates']}")
     print()
     
     # 4. Date Range Analysis
@@ -82,28 +281,16 @@ def main():
     print("=" * 80)
     print()
     
-    print("AWS Date Range:")
-    print(f"  Min Date: {aws_df['date'].min().date()}")
-    print(f"  Max Date: {aws_df['date'].max().date()}")
-    print(f"  Date Span: {(aws_df['date'].max() - aws_df['date'].min()).days} days")
-    print(f"  Unique Dates: {aws_df['date'].nunique()}")
-    print()
-    
-    print("GCP Date Range:")
-    print(f"  Min Date: {gcp_df['date'].min().date()}")
-    print(f"  Max Date: {gcp_df['date'].max().date()}")
-    print(f"  Date Span: {(gcp_df['date'].max() - gcp_df['date'].min()).days} days")
-    print(f"  Unique Dates: {gcp_df['date'].nunique()}")
-    print()
-    
-    # Check for date gaps
-    aws_date_range = pd.date_range(start=aws_df['date'].min(), end=aws_df['date'].max(), freq='D')
-    aws_missing_dates = set(aws_date_range) - set(aws_df['date'].unique())
-    gcp_date_range = pd.date_range(start=gcp_df['date'].min(), end=gcp_df['date'].max(), freq='D')
-    gcp_missing_dates = set(gcp_date_range) - set(gcp_df['date'].unique())
+    for label, m in (('AWS', aws), ('GCP', gcp)):
+        print(f"{label} Date Range:")
+        print(f"  Min Date: {m['min_date'].date()}")
+        print(f"  Max Date: {m['max_date'].date()}")
+        print(f"  Date Span: {(m['max_date'] - m['min_date']).days} days")
+        print(f"  Unique Dates: {m['unique_dates']}")
+        print()
     
-    print(f"AWS Missing Dates: {len(aws_missing_dates)}")
-    print(f"GCP Missing Dates: {len(gcp_missing_dates)}")
+    print(f"AWS Missing Dates: {aws['missing_dates']}")
+    print(f"GCP Missing Dates: {gcp['missing_dates']}")
     print()
     
     # 5. Environment Values
@@ -113,11 +300,11 @@ def main():
     print()
     
     print("AWS Environments:")
-    print(aws_df['env'].value_counts().to_string())
+    print(aws['env_counts'].to_string())
     print()
     
     print("GCP Environments:")
-    print(gcp_df['env'].value_counts().to_string())
+    print(gcp['env_counts'].to_string())
     print()
     
     # 6. Service Names
@@ -126,9 +313,9 @@ def main():
     print("=" * 80)
     print()
     
-    print(f"AWS Unique Services ({aws_df['service'].nunique()}): {sorted(aws_df['service'].unique())}")
+    print(f"AWS Unique Services ({len(aws['services'])}): {aws['services']}")
     print()
-    print(f"GCP Unique Services ({gcp_df['service'].nunique()}): {sorted(gcp_df['service'].unique())}")
+    print(f"GCP Unique Services ({len(gcp['services'])}): {gcp['services']}")
     print()
     
     # 7. Team Analysis
@@ -137,8 +324,8 @@ def main():
     print("=" * 80)
     print()
     
-    print(f"AWS Teams ({aws_df['team'].nunique()}): {sorted(aws_df['team'].unique())}")
-    print(f"GCP Teams ({gcp_df['team'].nunique()}): {sorted(gcp_df['team'].unique())}")
+    print(f"AWS Teams ({len(aws['teams'])}): {aws['teams']}")
+    print(f"GCP Teams ({len(gcp['teams'])}): {gcp['teams']}")
     print()
     
     # 8. Cost Analysis
@@ -147,17 +334,12 @@ def main():
     print("=" * 80)
     print()
     
-    print("AWS Cost Statistics:")
-    print(aws_df['cost_usd'].describe().to_string())
-    print(f"\nNegative Costs: {(aws_df['cost_usd'] < 0).sum()} records")
-    print(f"Zero Costs: {(aws_df['cost_usd'] == 0).sum()} records")
-    print()
-    
-    print("GCP Cost Statistics:")
-    print(gcp_df['cost_usd'].describe().to_string())
-    print(f"\nNegative Costs: {(gcp_df['cost_usd'] < 0).sum()} records")
-    print(f"Zero Costs: {(gcp_df['cost_usd'] == 0).sum()} records")
-    print()
+    for label, m in (('AWS', aws), ('GCP', gcp)):
+        print(f"{label} Cost Statistics:")
+        print(m['cost_describe'].to_string())
+        print(f"\nNegative Costs: {m['negative_costs']} records")
+        print(f"Zero Costs: {m['zero_costs']} records")
+        print()
     
     # 9. Account/Project IDs
     print("=" * 80)
@@ -165,9 +347,9 @@ def main():
     print("=" * 80)
     print()
     
-    print(f"AWS Unique Account IDs ({aws_df['account_id'].nunique()}): {sorted(aws_df['account_id'].unique())}")
+    print(f"AWS Unique Account IDs ({len(aws['ids'])}): {aws['ids']}")
     print()
-    print(f"GCP Unique Project IDs ({gcp_df['project_id'].nunique()}): {sorted(gcp_df['project_id'].unique())}")
+    print(f"GCP Unique Project IDs ({len(gcp['ids'])}): {gcp['ids']}")
     print()
     
     # 10. Data Quality Risks
@@ -176,50 +358,7 @@ def main():
     print("=" * 80)
     print()
     
-    risks = [
-        {
-            'risk': 'Negative Cost Values',
-            'description': f'Found {(aws_df["cost_usd"] < 0).sum()} negative costs in AWS and {(gcp_df["cost_usd"] < 0).sum()} in GCP',
-            'impact': 'Can skew financial reporting and analytics',
-            'remediation': 'Investigate if these are credits/refunds. Create separate column for credits or flag them explicitly.'
-        },
-        {
-            'risk': 'Duplicate Records on Key Columns',
-            'description': f'Found {aws_key_duplicates} duplicates in AWS and {gcp_key_duplicates} in GCP',
-            'impact': 'Double-counting costs leading to inflated spend reports',
-            'remediation': 'Implement deduplication logic based on composite key. Aggregate costs if legitimate.'
-        },
-        {
-            'risk': 'Inconsistent Service Naming',
-            'description': 'Same services appear in both AWS and GCP (EC2, RDS, S3, Lambda, EKS)',
-            'impact': 'Confusion in cross-cloud analysis; GCP should use different service names',
-            'remediation': 'Create service mapping table to standardize names across clouds.'
-        },
-        {
-            'risk': 'Missing Date Continuity',
-            'description': f'{len(aws_missing_dates)} missing dates in AWS, {len(gcp_missing_dates)} in GCP',
-            'impact': 'Incomplete time-series analysis and trending',
-            'remediation': 'Implement data completeness checks. Fill gaps with zero-cost records or flag missing days.'
-        },
-        {
-            'risk': 'No Data Type Validation',
-            'description': 'Columns loaded as generic types; no explicit validation of account_id, project_id formats',
-            'impact': 'Invalid IDs could enter system undetected',
-            'remediation': 'Implement schema validation with expected data types and regex patterns for IDs.'
-        },
-        {
-            'risk': 'Wide Cost Range Without Outlier Detection',
-            'description': f'AWS costs range from ${aws_df["cost_usd"].min():.2f} to ${aws_df["cost_usd"].max():.2f}',
-            'impact': 'Anomalous spikes may go unnoticed without automated detection',
-            'remediation': 'Implement statistical outlier detection (IQR, Z-score) and alerting.'
-        },
-        {
-            'risk': 'No Referential Integrity Checks',
-            'description': 'Team, service, env values not validated against master lists',
-            'impact': 'Typos and invalid values can fragment reporting',
-            'remediation': 'Create dimension tables with valid values. Enforce foreign key constraints.'
-        }
-    ]
+    risks = build_risks(aws, gcp)
     
     for idx, risk in enumerate(risks, 1):
         print(f"Risk #{idx}: {risk['risk']}")
@@ -234,57 +373,69 @@ def main():
     print("=" * 80)
     print()
     
-    summary_stats = pd.DataFrame({
-        'Metric': [
-            'Total Records',
-            'Date Range',
-            'Unique Dates',
-            'Missing Dates',
-            'Unique Services',
-            'Unique Teams',
-            'Unique Environments',
-            'Unique Accounts/Projects',
-            'Total Cost (USD)',
-            'Average Daily Cost (USD)',
-            'Negative Cost Records',
-            'Duplicate Records (Key)',
-            'Missing Values'
-        ],
-        'AWS': [
-            f"{len(aws_df):,}",
-            f"{aws_df['date'].min().date()} to {aws_df['date'].max().date()}",
-            f"{aws_df['date'].nunique()}",
-            f"{len(aws_missing_dates)}",
-            f"{aws_df['service'].nunique()}",
-            f"{aws_df['team'].nunique()}",
-            f"{aws_df['env'].nunique()}",
-            f"{aws_df['account_id'].nunique()}",
-            f"${aws_df['cost_usd'].sum():,.2f}",
-            f"${aws_df.groupby('date')['cost_usd'].sum().mean():,.2f}",
-            f"{(aws_df['cost_usd'] < 0).sum()}",
-            f"{aws_key_duplicates}",
-            f"{aws_missing}"
-        ],
-        'GCP': [
-            f"{len(gcp_df):,}",
-            f"{gcp_df['date'].min().date()} to {gcp_df['date'].max().date()}",
-            f"{gcp_df['date'].nunique()}",
-            f"{len(gcp_missing_dates)}",
-            f"{gcp_df['service'].nunique()}",
-            f"{gcp_df['team'].nunique()}",
-            f"{gcp_df['env'].nunique()}",
-            f"{gcp_df['project_id'].nunique()}",
-            f"${gcp_df['cost_usd'].sum():,.2f}",
-            f"${gcp_df.groupby('date')['cost_usd'].sum().mean():,.2f}",
-            f"{(gcp_df['cost_usd'] < 0).sum()}",
-            f"{gcp_key_duplicates}",
-            f"{gcp_missing}"
-        ]
-    })
+    summary_stats = build_summary_stats(aws, gcp)
     
     print(summary_stats.to_string(index=False))
     print()
     
+    return risks, summary_stats
+
+
+def main(chunksize=None, workers=1, recorder=None):
+    recorder = recorder or NullRecorder()
+    
+    print("=" * 80)
+    print("K&CO DATA PROFILING ANALYSIS")
+    print("=" * 80)
+    print()
+    
+    aws_df = gcp_df = None
+    if chunksize:
+        # Streaming mode: one pass per provider, never holding more than a chunk
+        from streaming_profiler import profile_chunks
+        
+        print(f"Streaming datasets in chunks of {chunksize:,} rows...")
+        if workers == 1:
+            with recorder.step('stream_profile.aws') as step:
+                aws = profile_chunks(iter_billing_chunks('aws', chunksize), 'account_id').result()
+                step['rows_in'] = aws['row_count']
+            with recorder.step('stream_profile.gcp') as step:
+                gcp = profile_chunks(iter_billing_chunks('gcp', chunksize), 'project_id').result()
+                step['rows_in'] = gcp['row_count']
+        else:
+            from parallel_runner import stream_profiles_parallel
+            with recorder.step('stream_profile') as step:
+                profiles = stream_profiles_parallel(['aws', 'gcp'], chunksize, workers)
+                step['rows_in'] = sum(p['row_count'] for p in profiles.values())
+            aws, gcp = profiles['aws'], profiles['gcp']
+        print(f"✓ AWS Data Streamed: {aws['row_count']:,} records")
+        print(f"✓ GCP Data Streamed: {gcp['row_count']:,} records")
+        print()
+    else:
+        # Load datasets (dictionary-encoded, from the Bronze cache)
+        print("Loading datasets...")
+        with recorder.step('load') as step:
+            frames = load_compact_providers(columns={'aws': profile_columns('account_id'),
+                                                     'gcp': profile_columns('project_id')})
+            step['rows_out'] = sum(len(df) for df in frames.values())
+        aws_df, gcp_df = frames['aws'], frames['gcp']
+        print(f"✓ AWS Data Loaded: {len(aws_df):,} records")
+        print(f"✓ GCP Data Loaded: {len(gcp_df):,} records")
+        print()
+        
+        if workers == 1:
+            aws = profile_frame(aws_df, 'account_id', recorder, 'profile.aws')
+            gcp = profile_frame(gcp_df, 'project_id', recorder, 'profile.gcp')
+        else:
+            from parallel_runner import profile_providers_parallel
+            with recorder.step('profile', rows_in=len(aws_df) + len(gcp_df)):
+                profiles = profile_providers_parallel(frames, workers)
+            aws, gcp = profiles['aws'], profiles['gcp']
+    
+    with recorder.step('report') as step:
+        risks, summary_stats = print_report(aws, gcp)
+        step['rows_out'] = len(summary_stats)
+    
     print("=" * 80)
     print("ANALYSIS COMPLETE")
     print("=" * 80)
@@ -295,11 +446,25 @@ def main():
         'gcp_df': gcp_df,
         'summary_stats': summary_stats,
         'risks': risks,
-        'aws_key_duplicates': aws_key_duplicates,
-        'gcp_key_duplicates': gcp_key_duplicates,
-        'aws_missing_dates': len(aws_missing_dates),
-        'gcp_missing_dates': len(gcp_missing_dates)
+        'aws_key_duplicates': aws['key_duplicates'],
+        'gcp_key_duplicates': gcp['key_duplicates'],
+        'aws_missing_dates': aws['missing_dates'],
+        'gcp_missing_dates': gcp['missing_dates']
     }
 
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Profile AWS and GCP billing data.")
+    parser.add_argument('--chunksize', type=int, default=None,
+                        help="stream each CSV in chunks of this many rows instead of loading it whole")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="profile providers and sections in this many processes (0 = one per core)")
+    add_report_arguments(parser)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    results = main()
+    args = parse_args()
+    recorder = make_recorder('part_a_profiling', args.report, args.trace_memory, args.profile, vars(args))
+    results = main(chunksize=args.chunksize, workers=args.workers, recorder=recorder)
+    recorder.finish(args.report)
@@ -1,33 +1,309 @@
 """
 Part C: SQL Query Execution
 Execute SQL transformations and generate sample outputs
+
+Data is kept in a persistent SQLite warehouse (warehouse.py) and loaded
+incrementally against a per-provider date watermark. The report queries read
+the materialized monthly aggregates (aggregates.py), which are refreshed only
+for the months a load touched.
+
+With --workers N (0 = one per core) the report queries run concurrently on a
+thread pool of read-only connections (see parallel_runner.py).
+
+--report PATH writes a JSON run report with the wall/CPU time, rows, memory
+and EXPLAIN QUERY PLAN of every load, refresh and query step (see
+instrumentation.py); --profile PATH adds a cProfile dump of the run.
+
+--dedup drop|aggregate drops (or sums) rows whose composite key repeats
+within a load batch (dedup_index.deduplicate_batch). Each load replaces
+every row of the dates it reads, so these are the only duplicates a load can
+hold; check a new delivery against the persistent index with
+dedup_index.py --check.
+
+--distinct approx serves the COUNT(DISTINCT) columns of Queries 3 and 4 from
+the HyperLogLog sketches stored with the monthly aggregates
+(distinct_sketches.py) instead of counting exactly.
+
+Every load also updates the per-series date-completeness bitmaps next to the
+warehouse (completeness_index.py).
+
+--cache serves repeated report queries from the on-disk result cache next to
+the warehouse (query_cache.py); entries made stale by this run's loads are
+purged before the reports run.
 """
 
+import argparse
+
 import pandas as pd
-import sqlite3
-from datetime import datetime
 
-def main():
+from ingest_cache import SOURCES
+from warehouse import (
+    WAREHOUSE_PATH, LATE_ARRIVAL_DAYS, UNIFIED_VIEW_SQL, connect, explain_queries, explain_query, incremental_load
+)
+from aggregates import REFRESH_DAILY_SQL, REFRESH_MONTHLY_SQL, refresh_aggregates, touched_months
+from dedup_index import DEDUP_POLICIES
+from completeness_index import completeness_path_for
+from alert_state import alert_state_path_for
+from distinct_sketches import approx_distinct
+from query_cache import DEFAULT_MAX_MB, QueryCache, format_summary, query_cache_dir_for
+from instrumentation import NullRecorder, add_report_arguments, make_recorder
+
+# ============================================================================
+# Report queries (read from the materialized aggregates in aggregates.py)
+# ============================================================================
+
+# Verify unified table
+VERIFY_QUERY = """
+SELECT 
+    cloud_provider,
+    SUM(row_count) AS record_count,
+    COUNT(DISTINCT cloud_account_id) AS unique_accounts,
+    ROUND(SUM(cost_sum), 2) AS total_cost_usd,
+    (SELECT MIN(date) FROM agg_daily_provider d WHERE d.cloud_provider = m.cloud_provider) AS min_date,
+    (SELECT MAX(date) FROM agg_daily_provider d WHERE d.cloud_provider = m.cloud_provider) AS max_date
+FROM agg_monthly_billing m
+GROUP BY cloud_provider
+"""
+
+# Query 2: Monthly Spend by Cloud Provider
+QUERY2_MONTHLY_BY_PROVIDER = """
+SELECT 
+    cloud_provider,
+    year,
+    month,
+    month_label,
+    SUM(row_count) AS transaction_count,
+    ROUND(SUM(cost_sum), 2) AS total_cost_usd,
+    ROUND(SUM(cost_sum) / SUM(cost_count), 2) AS avg_cost_per_transaction,
+    ROUND(SUM(credit_sum), 2) AS total_credits,
+    ROUND(SUM(charge_sum), 2) AS total_charges
+FROM agg_monthly_billing
+GROUP BY 
+    month_key,
+    cloud_provider
+ORDER BY 
+    month_key,
+    cloud_provider
+"""
+
+# Query 3: Monthly Spend by Team & Environment
+QUERY3_MONTHLY_BY_TEAM_ENV = """
+SELECT 
+    team,
+    environment,
+    year,
+    month,
+    month_label,
+    SUM(row_count) AS transaction_count,
+    ROUND(SUM(cost_sum), 2) AS total_cost_usd,
+    ROUND(SUM(cost_sum) / SUM(cost_count), 2) AS avg_cost,
+    COUNT(DISTINCT cloud_account_id) AS accounts_used,
+    COUNT(DISTINCT service) AS services_used
+FROM agg_monthly_billing
+GROUP BY 
+    month_key,
+    team,
+    environment
+ORDER BY 
+    month_key,
+    total_cost_usd DESC
+LIMIT 20
+"""
+
+# Query 3 (pivot): environments as columns
+QUERY3_TEAM_PIVOT = """
+SELECT 
+    team,
+    year,
+    month,
+    ROUND(SUM(CASE WHEN environment = 'prod' THEN cost_sum ELSE 0 END), 2) AS prod_cost,
+    ROUND(SUM(CASE WHEN environment = 'staging' THEN cost_sum ELSE 0 END), 2) AS staging_cost,
+    ROUND(SUM(CASE WHEN environment = 'dev' THEN cost_sum ELSE 0 END), 2) AS dev_cost,
+    ROUND(SUM(cost_sum), 2) AS total_cost,
+    ROUND(
+        SUM(CASE WHEN environment = 'prod' THEN cost_sum ELSE 0 END) * 100.0 / NULLIF(SUM(cost_sum), 0),
+        2
+    ) AS prod_pct
+FROM agg_monthly_billing
+GROUP BY 
+    month_key,
+    team
+ORDER BY 
+    month_key,
+    total_cost DESC
+LIMIT 15
+"""
+
+# Query 4: Top 5 Most Expensive Services (by provider)
+QUERY4_TOP_SERVICES = """
+SELECT 
+    service,
+    cloud_provider,
+    SUM(charge_count) AS transaction_count,
+    ROUND(SUM(charge_sum), 2) AS total_cost_usd,
+    ROUND(SUM(charge_sum) / (SUM(cost_count) - SUM(credit_count)), 2) AS avg_cost_per_transaction,
+    ROUND(MIN(charge_min), 2) AS min_cost,
+    ROUND(MAX(charge_max), 2) AS max_cost,
+    COUNT(DISTINCT team) AS teams_using,
+    COUNT(DISTINCT environment) AS environments_using
+FROM agg_monthly_billing
+WHERE charge_count > 0
+GROUP BY service, cloud_provider
+ORDER BY total_cost_usd DESC
+LIMIT 5
+"""
+
+# Query 4 (combined): Top 5 services across clouds
+QUERY4_TOP_SERVICES_COMBINED = """
+SELECT 
+    service,
+    SUM(charge_count) AS transaction_count,
+    ROUND(SUM(charge_sum), 2) AS total_cost_usd,
+    ROUND(SUM(charge_sum) / (SUM(cost_count) - SUM(credit_count)), 2) AS avg_cost_per_transaction,
+    ROUND(SUM(CASE WHEN cloud_provider = 'AWS' THEN charge_sum ELSE 0 END), 2) AS aws_cost,
+    ROUND(SUM(CASE WHEN cloud_provider = 'GCP' THEN charge_sum ELSE 0 END), 2) AS gcp_cost,
+    ROUND(
+        SUM(charge_sum) * 100.0 / SUM(SUM(charge_sum)) OVER (),
+        2
+    ) AS pct_of_total_spend
+FROM agg_monthly_billing
+WHERE charge_count > 0
+GROUP BY service
+ORDER BY total_cost_usd DESC
+LIMIT 5
+"""
+
+# Additional insights: overall totals
+TOTAL_QUERY = """
+SELECT 
+    ROUND(SUM(cost_sum), 2) AS total_spend,
+    ROUND(ABS(SUM(credit_sum)), 2) AS total_credits,
+    ROUND(SUM(charge_sum), 2) AS total_charges,
+    SUM(row_count) AS total_records,
+    (SELECT COUNT(DISTINCT date) FROM agg_daily_provider) AS unique_dates
+FROM agg_monthly_billing
+"""
+
+# Report name -> query, in report order (matches the dict returned by main)
+REPORT_QUERIES = {
+    'unified_summary': VERIFY_QUERY,
+    'monthly_by_provider': QUERY2_MONTHLY_BY_PROVIDER,
+    'monthly_by_team_env': QUERY3_MONTHLY_BY_TEAM_ENV,
+    'monthly_by_team_pivot': QUERY3_TEAM_PIVOT,
+    'top_services': QUERY4_TOP_SERVICES,
+    'top_services_combined': QUERY4_TOP_SERVICES_COMBINED,
+    'total_summary': TOTAL_QUERY,
+}
+
+
+# --distinct approx: report -> (sketch grouping, key columns, period,
+# {report column: sketched column}); these COUNT(DISTINCT) columns are
+# filled from merged sketches instead of being counted by the query
+APPROX_DISTINCT_COLUMNS = {
+    'monthly_by_team_env': ('team_env', ['team', 'environment'], 'month',
+                            {'accounts_used': 'cloud_account_id', 'services_used': 'service'}),
+    'top_services': ('service', ['service', 'cloud_provider'], 'all',
+                     {'teams_using': 'team', 'environments_using': 'environment'}),
+}
+
+
+def report_queries(distinct='exact'):
+    """The report queries, with the sketched COUNT(DISTINCT) columns left NULL in approx mode."""
+    queries = dict(REPORT_QUERIES)
+    if distinct == 'approx':
+        for name, (_, _, _, columns) in APPROX_DISTINCT_COLUMNS.items():
+            for column, source in columns.items():
+                exact = f"COUNT(DISTINCT {source}) AS {column}"
+                assert exact in queries[name], f"{name} has no {exact}"
+                queries[name] = queries[name].replace(exact, f"NULL AS {column}")
+    return queries
+
+
+def fill_approx_distinct(conn, reports):
+    """Fill the APPROX_DISTINCT_COLUMNS of the reports from the stored sketches."""
+    for name, (grouping, by, period, columns) in APPROX_DISTINCT_COLUMNS.items():
+        report = reports[name]
+        estimates = approx_distinct(conn, grouping, by, list(columns.values()), period)
+        keys = report[by].copy()
+        if period == 'month':
+            keys.insert(0, 'period', report['year'] * 100 + report['month'])
+        matched = keys.merge(estimates, on=list(keys.columns), how='left')
+        for column, source in columns.items():
+            report[column] = matched[source].to_numpy()
+    return reports
+
+
+# Queries whose plans are checked with --explain (parameter values don't affect the plan)
+EXPLAIN_QUERIES = {
+    **REPORT_QUERIES,
+    'refresh_monthly': (REFRESH_MONTHLY_SQL, (0,)),
+    'refresh_daily': (REFRESH_DAILY_SQL, (0, '', '')),
+}
+
+
+def run_reports(conn, recorder=None, queries=None, cache=None):
+    """
+    Run every report query (or `queries`) on an open warehouse connection, in order.
+    
+    With a recorder, each query is a `query.<name>` step whose record also
+    carries the query plan (captured after the timed run). With a QueryCache,
+    results are read from / stored in it and the step records the outcome.
+    """
+    recorder = recorder or NullRecorder()
+    reports = {}
+    for name, query in (queries or REPORT_QUERIES).items():
+        with recorder.step(f'query.{name}') as step:
+            if cache is None:
+                reports[name] = pd.read_sql_query(query, conn)
+            else:
+                reports[name], step['cache'] = cache.read_sql(conn, query)
+            step['rows_out'] = len(reports[name])
+        if recorder.enabled:
+            step['query_plan'] = explain_query(conn, query)
+    return reports
+
+
+def main(warehouse_path=WAREHOUSE_PATH, late_arrival_days=LATE_ARRIVAL_DAYS, full_refresh=False, explain=False,
+         workers=1, dedup=None, distinct='exact', recorder=None, cache_mb=None):
+    recorder = recorder or NullRecorder()
+    cache = None if cache_mb is None else QueryCache(query_cache_dir_for(warehouse_path), cache_mb * 1024 ** 2)
+    
     print("=" * 80)
     print("PART C: SQL TRANSFORMATIONS - EXECUTION")
     print("=" * 80)
     print()
     
-    # Load data
-    print("Loading datasets...")
-    aws_df = pd.read_csv('data/aws_line_items_12mo.csv')
-    gcp_df = pd.read_csv('data/gcp_billing_12mo.csv')
-    print(f"✓ Loaded {len(aws_df):,} AWS records")
-    print(f"✓ Loaded {len(gcp_df):,} GCP records")
+    # Open the persistent warehouse and load only what changed since the last run
+    print(f"Loading datasets into {warehouse_path}...")
+    conn = connect(warehouse_path)
+    load_stats = []
+    for provider in SOURCES:
+        with recorder.step(f'load.{provider}') as step:
+            stats = incremental_load(conn, provider, late_arrival_days, full_refresh, dedup,
+                                     completeness_path_for(warehouse_path), alert_state_path_for(warehouse_path))
+            step.update(rows_in=stats['rows_inserted'], rows_out=stats['rows_total'], mode=stats['mode'])
+        load_stats.append(stats)
+    for stats in load_stats:
+        label = stats['provider'].upper()
+        if stats['mode'] == 'full':
+            print(f"✓ {label}: full load of {stats['rows_inserted']:,} records")
+        else:
+            print(f"✓ {label}: replaced {stats['rows_deleted']:,} / inserted {stats['rows_inserted']:,} "
+                  f"records after {stats['replaced_after']}")
+        if stats['dedup']:
+            print(f"  dedup: {'summed' if dedup == 'aggregate' else 'dropped'} "
+                  f"{stats['dedup']['in_batch_duplicates']:,} repeated-key rows")
+        print(f"  {stats['rows_total']:,} records in warehouse, watermark {stats['watermark']}")
     print()
     
-    # Create in-memory SQLite database
-    conn = sqlite3.connect(':memory:')
-    
-    # Load data into SQLite
-    aws_df.to_sql('aws_line_items_12mo', conn, index=False, if_exists='replace')
-    gcp_df.to_sql('gcp_billing_12mo', conn, index=False, if_exists='replace')
-    print("✓ Data loaded into SQLite")
+    # Refresh the monthly aggregates for the months this load touched
+    with recorder.step('refresh_aggregates') as step:
+        refreshed = refresh_aggregates(conn, touched_months(load_stats))
+        step['months'] = refreshed
+    print(f"✓ Refreshed monthly aggregates for {len(refreshed)} month(s): "
+          f"{', '.join(str(m) for m in refreshed) or 'none'}")
+    if cache is not None:
+        print(f"✓ Purged {cache.purge_stale(conn)} stale cached result(s)")
     print()
     
     # ========================================================================
@@ -38,49 +314,32 @@ def main():
     print("=" * 80)
     print()
     
-    query1 = """
-    CREATE VIEW vw_unified_cloud_billing AS
-    SELECT 
-        date,
-        'AWS' AS cloud_provider,
-        account_id AS cloud_account_id,
-        service,
-        team,
-        env AS environment,
-        cost_usd,
-        CASE WHEN cost_usd < 0 THEN 1 ELSE 0 END AS is_credit
-    FROM aws_line_items_12mo
-    
-    UNION ALL
-    
-    SELECT 
-        date,
-        'GCP' AS cloud_provider,
-        project_id AS cloud_account_id,
-        service,
-        team,
-        env AS environment,
-        cost_usd,
-        CASE WHEN cost_usd < 0 THEN 1 ELSE 0 END AS is_credit
-    FROM gcp_billing_12mo
-    """
+    query1 = UNIFIED_VIEW_SQL
     
     conn.execute(query1)
+    conn.commit()
     
-    # Verify unified table
-    verify_query = """
-    SELECT 
-        cloud_provider,
-        COUNT(*) AS record_count,
-        COUNT(DISTINCT cloud_account_id) AS unique_accounts,
-        ROUND(SUM(cost_usd), 2) AS total_cost_usd,
-        MIN(date) AS min_date,
-        MAX(date) AS max_date
-    FROM vw_unified_cloud_billing
-    GROUP BY cloud_provider
-    """
+    # Run the report suite (concurrently on read-only connections if workers > 1)
+    queries = report_queries(distinct)
+    if workers == 1:
+        reports = run_reports(conn, recorder, queries, cache)
+    else:
+        from parallel_runner import run_queries_parallel
+        with recorder.step('queries') as step:
+            # Only the cache misses go to the thread pool
+            cached = cache.cached_results(conn, queries) if cache is not None else {}
+            misses = {name: query for name, query in queries.items() if name not in cached}
+            computed = run_queries_parallel(warehouse_path, misses, workers) if misses else {}
+            if cache is not None:
+                cache.store_results(conn, misses, computed)
+            reports = {name: cached[name] if name in cached else computed[name] for name in queries}
+            step['rows_out'] = sum(len(df) for df in reports.values())
+    if distinct == 'approx':
+        with recorder.step('approx_distinct'):
+            reports = fill_approx_distinct(conn, reports)
     
-    result1 = pd.read_sql_query(verify_query, conn)
+    # Verify unified table
+    result1 = reports['unified_summary']
     print("Unified Table Summary:")
     print(result1.to_string(index=False))
     print()
@@ -93,30 +352,7 @@ def main():
     print("=" * 80)
     print()
     
-    query2 = """
-    SELECT 
-        cloud_provider,
-        CAST(strftime('%Y', date) AS INTEGER) AS year,
-        CAST(strftime('%m', date) AS INTEGER) AS month,
-        strftime('%Y-%m', date) AS month_label,
-        COUNT(*) AS transaction_count,
-        ROUND(SUM(cost_usd), 2) AS total_cost_usd,
-        ROUND(AVG(cost_usd), 2) AS avg_cost_per_transaction,
-        ROUND(SUM(CASE WHEN is_credit THEN cost_usd ELSE 0 END), 2) AS total_credits,
-        ROUND(SUM(CASE WHEN NOT is_credit THEN cost_usd ELSE 0 END), 2) AS total_charges
-    FROM vw_unified_cloud_billing
-    GROUP BY 
-        cloud_provider,
-        strftime('%Y', date),
-        strftime('%m', date),
-        strftime('%Y-%m', date)
-    ORDER BY 
-        year,
-        month,
-        cloud_provider
-    """
-    
-    result2 = pd.read_sql_query(query2, conn)
+    result2 = reports['monthly_by_provider']
     print("Monthly Spend by Cloud Provider:")
     print(result2.to_string(index=False))
     print()
@@ -129,64 +365,13 @@ def main():
     print("=" * 80)
     print()
     
-    query3 = """
-    SELECT 
-        team,
-        environment,
-        CAST(strftime('%Y', date) AS INTEGER) AS year,
-        CAST(strftime('%m', date) AS INTEGER) AS month,
-        strftime('%Y-%m', date) AS month_label,
-        COUNT(*) AS transaction_count,
-        ROUND(SUM(cost_usd), 2) AS total_cost_usd,
-        ROUND(AVG(cost_usd), 2) AS avg_cost,
-        COUNT(DISTINCT cloud_account_id) AS accounts_used,
-        COUNT(DISTINCT service) AS services_used
-    FROM vw_unified_cloud_billing
-    GROUP BY 
-        team,
-        environment,
-        strftime('%Y', date),
-        strftime('%m', date),
-        strftime('%Y-%m', date)
-    ORDER BY 
-        year,
-        month,
-        total_cost_usd DESC
-    LIMIT 20
-    """
-    
-    result3 = pd.read_sql_query(query3, conn)
+    result3 = reports['monthly_by_team_env']
     print("Monthly Spend by Team & Environment (Top 20):")
     print(result3.to_string(index=False))
     print()
     
     # Pivot version
-    query3_pivot = """
-    SELECT 
-        team,
-        CAST(strftime('%Y', date) AS INTEGER) AS year,
-        CAST(strftime('%m', date) AS INTEGER) AS month,
-        ROUND(SUM(CASE WHEN environment = 'prod' THEN cost_usd ELSE 0 END), 2) AS prod_cost,
-        ROUND(SUM(CASE WHEN environment = 'staging' THEN cost_usd ELSE 0 END), 2) AS staging_cost,
-        ROUND(SUM(CASE WHEN environment = 'dev' THEN cost_usd ELSE 0 END), 2) AS dev_cost,
-        ROUND(SUM(cost_usd), 2) AS total_cost,
-        ROUND(
-            SUM(CASE WHEN environment = 'prod' THEN cost_usd ELSE 0 END) * 100.0 / NULLIF(SUM(cost_usd), 0),
-            2
-        ) AS prod_pct
-    FROM vw_unified_cloud_billing
-    GROUP BY 
-        team,
-        strftime('%Y', date),
-        strftime('%m', date)
-    ORDER BY 
-        year,
-        month,
-        total_cost DESC
-    LIMIT 15
-    """
-    
-    result3_pivot = pd.read_sql_query(query3_pivot, conn)
+    result3_pivot = reports['monthly_by_team_pivot']
     print("\\nMonthly Spend by Team (Pivot by Environment - Top 15):")
     print(result3_pivot.to_string(index=False))
     print()
@@ -199,50 +384,13 @@ def main():
     print("=" * 80)
     print()
     
-    query4 = """
-    SELECT 
-        service,
-        cloud_provider,
-        COUNT(*) AS transaction_count,
-        ROUND(SUM(cost_usd), 2) AS total_cost_usd,
-        ROUND(AVG(cost_usd), 2) AS avg_cost_per_transaction,
-        ROUND(MIN(cost_usd), 2) AS min_cost,
-        ROUND(MAX(cost_usd), 2) AS max_cost,
-        COUNT(DISTINCT team) AS teams_using,
-        COUNT(DISTINCT environment) AS environments_using
-    FROM vw_unified_cloud_billing
-    WHERE NOT is_credit
-    GROUP BY service, cloud_provider
-    ORDER BY total_cost_usd DESC
-    LIMIT 5
-    """
-    
-    result4 = pd.read_sql_query(query4, conn)
+    result4 = reports['top_services']
     print("Top 5 Most Expensive Services (by Cloud Provider):")
     print(result4.to_string(index=False))
     print()
     
     # Combined across clouds
-    query4_combined = """
-    SELECT 
-        service,
-        COUNT(*) AS transaction_count,
-        ROUND(SUM(cost_usd), 2) AS total_cost_usd,
-        ROUND(AVG(cost_usd), 2) AS avg_cost_per_transaction,
-        ROUND(SUM(CASE WHEN cloud_provider = 'AWS' THEN cost_usd ELSE 0 END), 2) AS aws_cost,
-        ROUND(SUM(CASE WHEN cloud_provider = 'GCP' THEN cost_usd ELSE 0 END), 2) AS gcp_cost,
-        ROUND(
-            SUM(cost_usd) * 100.0 / (SELECT SUM(cost_usd) FROM vw_unified_cloud_billing WHERE NOT is_credit),
-            2
-        ) AS pct_of_total_spend
-    FROM vw_unified_cloud_billing
-    WHERE NOT is_credit
-    GROUP BY service
-    ORDER BY total_cost_usd DESC
-    LIMIT 5
-    """
-    
-    result4_combined = pd.read_sql_query(query4_combined, conn)
+    result4_combined = reports['top_services_combined']
     print("\\nTop 5 Services Overall (Combined AWS + GCP):")
     print(result4_combined.to_string(index=False))
     print()
@@ -256,21 +404,32 @@ def main():
     print()
     
     # Total spend summary
-    total_query = """
-    SELECT 
-        ROUND(SUM(cost_usd), 2) AS total_spend,
-        ROUND(SUM(CASE WHEN is_credit THEN ABS(cost_usd) ELSE 0 END), 2) AS total_credits,
-        ROUND(SUM(CASE WHEN NOT is_credit THEN cost_usd ELSE 0 END), 2) AS total_charges,
-        COUNT(*) AS total_records,
-        COUNT(DISTINCT date) AS unique_dates
-    FROM vw_unified_cloud_billing
-    """
-    
-    total_result = pd.read_sql_query(total_query, conn)
+    total_result = reports['total_summary']
     print("Overall Summary:")
     print(total_result.to_string(index=False))
     print()
     
+    if explain:
+        print("=" * 80)
+        print("QUERY PLANS")
+        print("=" * 80)
+        print()
+        
+        plans = explain_queries(conn, EXPLAIN_QUERIES)
+        print(plans.to_string(index=False))
+        print()
+        flagged = plans[plans['warning'] != '']
+        if len(flagged):
+            print(f"⚠ {len(flagged)} plan step(s) fall back to a scan or temp B-tree grouping")
+        else:
+            print("✓ Every query is served by an index (no full scans or temp B-tree grouping)")
+        print()
+    
+    if cache is not None:
+        cache.close()
+        print(f"Query cache: {format_summary(cache.summary())}")
+        print()
+    
     conn.close()
     
     print("=" * 80)
@@ -287,5 +446,32 @@ def main():
         'total_summary': total_result
     }
 
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the Part C SQL transformations.")
+    parser.add_argument('--warehouse', default=WAREHOUSE_PATH,
+                        help="SQLite warehouse file (created on first run)")
+    parser.add_argument('--late-days', type=int, default=LATE_ARRIVAL_DAYS,
+                        help="days before the watermark to replace on each incremental load")
+    parser.add_argument('--full-refresh', action='store_true',
+                        help="reload all history instead of loading incrementally")
+    parser.add_argument('--explain', action='store_true',
+                        help="print EXPLAIN QUERY PLAN for the report and refresh queries")
+    parser.add_argument('--workers', type=int, default=1,
+                        help="run the report queries on this many threads (0 = one per core)")
+    parser.add_argument('--dedup', choices=DEDUP_POLICIES, default=None,
+                        help="drop or aggregate rows whose composite key was already loaded or repeats")
+    parser.add_argument('--distinct', choices=['exact', 'approx'], default='exact',
+                        help="COUNT(DISTINCT) columns: exact, or estimated from HyperLogLog sketches")
+    parser.add_argument('--cache', action='store_true',
+                        help="serve repeated report queries from the on-disk result cache")
+    parser.add_argument('--cache-mb', type=float, default=DEFAULT_MAX_MB, help="size bound of the result cache")
+    add_report_arguments(parser)
+    return parser.parse_args(argv)
+
+
 if __name__ == "__main__":
-    results = main()
+    args = parse_args()
+    recorder = make_recorder('part_c_sql_execution', args.report, args.trace_memory, args.profile, vars(args))
+    results = main(args.warehouse, args.late_days, args.full_refresh, args.explain, args.workers, args.dedup,
+                   args.distinct, recorder, args.cache_mb if args.cache else None)
+    recorder.finish(args.report)
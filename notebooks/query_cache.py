@@ -0,0 +1,339 @@
+"""
+Query Result Cache
+K&Co Cloud Cost Intelligence Platform
+
+On-disk cache of report query results, so dashboards that re-issue the same
+Part C queries get the stored DataFrame back instead of re-running SQL.
+
+An entry's key is a SHA-256 of
+- the normalized SQL (comments dropped, whitespace collapsed and keywords /
+  identifiers lower-cased outside quoted literals, so formatting changes
+  don't miss)
+- the query parameters
+- the load version of every table the query reads: the (watermark,
+  load_count) of each provider in the warehouse's load_state table, plus
+  the warehouse id, which is new whenever load_state is recreated (a deleted
+  warehouse, a schema upgrade), so a rebuilt warehouse never matches old keys
+
+Every cacheable query reads a load-versioned table, so any load (which
+moves a provider's watermark / load_count) changes every key, and
+purge_stale() then deletes every entry. Queries that read anything the
+cache cannot version (star schema tables, CTEs, temp tables) bypass it.
+
+Results are stored one file per entry (Parquet when pyarrow is installed,
+else pickle) with a JSON manifest:
+
+    data/query_cache/<key>.parquet
+    data/query_cache/manifest.json
+
+The total size is bounded: after each store the least recently used entries
+are evicted until the cache fits in max_bytes. A hit only updates the
+in-memory LRU order; it reaches the manifest with the next put(), purge or
+close(), so serving a hit writes no file. hits / misses / bypassed /
+evictions / invalidations are counted per QueryCache instance.
+
+The manifest is rewritten atomically but not locked; concurrent writers can
+lose each other's entries (never corrupt one), which only costs a re-run.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import re
+import sqlite3
+import time
+
+import pandas as pd
+
+from ingest_cache import parquet_available
+from warehouse import WAREHOUSE_PATH, connect, warehouse_id
+
+QUERY_CACHE_DIR = 'data/query_cache'
+DEFAULT_MAX_MB = 256
+
+# Warehouse tables (and views) whose contents change only through
+# incremental_load and the aggregate refresh that follows it
+LOAD_VERSIONED_TABLES = {
+    'unified_cloud_billing', 'vw_unified_cloud_billing', 'load_state',
+    'agg_monthly_billing', 'agg_daily_provider', 'agg_monthly_sketches',
+}
+
+QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\")")
+TABLE_REFERENCE = re.compile(r'\b(?:from|join)\s+([a-z_][a-z0-9_]*)')
+
+
+def query_cache_dir_for(warehouse_path):
+    """Cache directory that belongs to a warehouse file (data/warehouse.db -> data/query_cache)."""
+    return os.path.join(os.path.dirname(warehouse_path), 'query_cache')
+
+
+def normalize_sql(sql):
+    """Canonical form of a query: no comments, single spaces, lower case outside quotes."""
+    parts = QUOTED.split(sql)
+    for i in range(0, len(parts), 2):
+        text = re.sub(r'--[^\n]*', ' ', parts[i])
+        text = re.sub(r'/\*.*?\*/', ' ', text, flags=re.S)
+        parts[i] = re.sub(r'\s+', ' ', text).lower()
+    normalized = ''.join(parts).strip()
+    return normalized[:-1].rstrip() if normalized.endswith(';') else normalized
+
+
+def referenced_tables(normalized):
+    """Tables named after FROM / JOIN in a normalized query."""
+    unquoted = ' '.join(QUOTED.split(normalized)[::2])
+    return sorted(set(TABLE_REFERENCE.findall(unquoted)))
+
+
+def load_versions(conn):
+    """
+    {provider: 'watermark#load_count'} from the warehouse's load_state
+    table, plus {'warehouse_id': id} once anything is loaded.
+    """
+    try:
+        rows = conn.execute("SELECT provider, watermark, load_count FROM load_state ORDER BY provider").fetchall()
+    except sqlite3.OperationalError:
+        return {}
+    versions = {provider: f'{watermark}#{load_count}' for provider, watermark, load_count in rows}
+    if versions:
+        versions['warehouse_id'] = warehouse_id(conn)
+    return versions
+
+
+class QueryCache:
+    """Size-bounded LRU cache of query results, keyed on SQL, params and load versions."""
+    
+    def __init__(self, cache_dir=QUERY_CACHE_DIR, max_bytes=DEFAULT_MAX_MB * 1024 ** 2):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self.suffix = '.parquet' if parquet_available() else '.pkl'
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.entries = self._read_manifest()
+        # Hit counts / LRU times not yet written to the manifest
+        self.dirty = False
+        self.stats = {'hits': 0, 'misses': 0, 'bypassed': 0, 'evictions': 0, 'invalidations': 0}
+        if self.size_bytes() > max_bytes:
+            # Opened with a smaller bound than the cache was filled with
+            self.evict()
+            self._write_manifest()
+    
+    def _read_manifest(self):
+        try:
+            with open(self.manifest_path) as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+    
+    def _write_manifest(self):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        tmp = self.manifest_path + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f, indent=1)
+        os.replace(tmp, self.manifest_path)
+        self.dirty = False
+    
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key + self.suffix)
+    
+    def _remove(self, key):
+        entry = self.entries.pop(key)
+        try:
+            os.remove(os.path.join(self.cache_dir, entry['file']))
+        except FileNotFoundError:
+            pass
+    
+    def lookup_key(self, conn, sql, params=()):
+        """
+        (key, tables, versions) for a query, or (None, tables, None) when it
+        reads a table the cache cannot version.
+        """
+        normalized = normalize_sql(sql)
+        tables = referenced_tables(normalized)
+        if not tables or not set(tables) <= LOAD_VERSIONED_TABLES:
+            return None, tables, None
+        versions = load_versions(conn)
+        payload = json.dumps([normalized, list(params), versions], default=str)
+        return hashlib.sha256(payload.encode()).hexdigest(), tables, versions
+    
+    def get(self, key):
+        """Cached result for a key, or None."""
+        entry = self.entries.get(key)
+        if entry is None:
+            return None
+        try:
+            path = os.path.join(self.cache_dir, entry['file'])
+            frame = pd.read_parquet(path) if path.endswith('.parquet') else pd.read_pickle(path)
+        except (FileNotFoundError, OSError, ValueError):
+            # Unreadable: drop the file too, so it stops counting against max_bytes
+            self._remove(key)
+            self._write_manifest()
+            return None
+        entry['last_used'] = time.time()
+        entry['hits'] += 1
+        self.dirty = True
+        return frame
+    
+    def put(self, key, frame, tables, versions, sql=''):
+        """Store a result, then evict least recently used entries beyond max_bytes."""
+        os.makedirs(self.cache_dir, exist_ok=True)
+        path = self._path(key)
+        tmp = path + '.tmp'
+        if self.suffix == '.parquet':
+            frame.to_parquet(tmp, index=False)
+        else:
+            frame.to_pickle(tmp)
+        os.replace(tmp, path)
+        now = time.time()
+        self.entries[key] = {
+            'file': os.path.basename(path),
+            'bytes': os.path.getsize(path),
+            'tables': tables,
+            'versions': versions,
+            'created': now,
+            'last_used': now,
+            'hits': 0,
+            'sql': normalize_sql(sql)[:120],
+        }
+        self.evict(keep=key)
+        self._write_manifest()
+    
+    def evict(self, keep=None):
+        """Drop least recently used entries until the cache fits in max_bytes."""
+        total = self.size_bytes()
+        for key in sorted(self.entries, key=lambda k: self.entries[k]['last_used']):
+            if total <= self.max_bytes:
+                break
+            if key == keep:
+                continue
+            total -= self.entries[key]['bytes']
+            self._remove(key)
+            self.stats['evictions'] += 1
+    
+    def read_sql(self, conn, sql, params=()):
+        """pd.read_sql_query through the cache; returns (frame, 'hit' | 'miss' | 'bypass')."""
+        key, tables, versions = self.lookup_key(conn, sql, params)
+        if key is None:
+            self.stats['bypassed'] += 1
+            return pd.read_sql_query(sql, conn, params=params or None), 'bypass'
+        frame = self.get(key)
+        if frame is not None:
+            self.stats['hits'] += 1
+            return frame, 'hit'
+        self.stats['misses'] += 1
+        frame = pd.read_sql_query(sql, conn, params=params or None)
+        self.put(key, frame, tables, versions, sql)
+        return frame, 'miss'
+    
+    def cached_results(self, conn, queries):
+        """{name: frame} for the {name: query} already in the cache (counted as hits)."""
+        found = {}
+        for name, query in queries.items():
+            key = self.lookup_key(conn, query)[0]
+            frame = self.get(key) if key else None
+            if frame is not None:
+                found[name] = frame
+        self.stats['hits'] += len(found)
+        return found
+    
+    def store_results(self, conn, queries, frames):
+        """Store {name: frame} computed outside the cache for {name: query} (counted as misses)."""
+        for name, frame in frames.items():
+            key, tables, versions = self.lookup_key(conn, queries[name])
+            if key is None:
+                self.stats['bypassed'] += 1
+            else:
+                self.stats['misses'] += 1
+                self.put(key, frame, tables, versions, queries[name])
+    
+    def purge_stale(self, conn):
+        """Delete the entries whose load versions no longer match the warehouse; returns how many."""
+        current = load_versions(conn)
+        stale = [key for key, entry in self.entries.items() if entry['versions'] != current]
+        for key in stale:
+            self._remove(key)
+        if stale or self.dirty:
+            self._write_manifest()
+        self.stats['invalidations'] += len(stale)
+        return len(stale)
+    
+    def close(self):
+        """Write the LRU updates of the hits since the last manifest write."""
+        if self.dirty:
+            self._write_manifest()
+    
+    def clear(self):
+        for key in list(self.entries):
+            self._remove(key)
+        self._write_manifest()
+    
+    def size_bytes(self):
+        return sum(entry['bytes'] for entry in self.entries.values())
+    
+    def summary(self):
+        lookups = self.stats['hits'] + self.stats['misses']
+        return {
+            **self.stats,
+            'hit_rate': self.stats['hits'] / lookups if lookups else None,
+            'entries': len(self.entries),
+            'size_mb': self.size_bytes() / 1024 ** 2,
+        }
+
+
+def format_summary(summary):
+    hit_rate = 'n/a' if summary['hit_rate'] is None else f"{summary['hit_rate']:.0%}"
+    return (f"{summary['hits']} hits / {summary['misses']} misses ({hit_rate}), "
+            f"{summary['bypassed']} bypassed, {summary['evictions']} evicted, "
+            f"{summary['invalidations']} invalidated; {summary['entries']} entries, {summary['size_mb']:.2f} MB")
+
+
+def main(warehouse_path=WAREHOUSE_PATH, cache_dir=None, max_mb=DEFAULT_MAX_MB, rounds=3, clear=False):
+    from part_c_sql_execution import REPORT_QUERIES
+    
+    print("=" * 80)
+    print("QUERY RESULT CACHE")
+    print("=" * 80)
+    print()
+    
+    cache = QueryCache(cache_dir or query_cache_dir_for(warehouse_path), max_mb * 1024 ** 2)
+    if clear:
+        cache.clear()
+        print(f"✓ Cleared {cache.cache_dir}")
+    
+    # Replay the report suite as a dashboard would, without loading anything
+    conn = connect(warehouse_path)
+    purged = cache.purge_stale(conn)
+    print(f"Load versions: {load_versions(conn) or 'none (empty warehouse)'}; purged {purged} stale entries")
+    print()
+    
+    timings = []
+    for round_no in range(1, rounds + 1):
+        outcomes = []
+        start = time.perf_counter()
+        for name, query in REPORT_QUERIES.items():
+            _, outcome = cache.read_sql(conn, query)
+            outcomes.append(outcome)
+        elapsed = time.perf_counter() - start
+        timings.append(elapsed)
+        print(f"Round {round_no}: {len(REPORT_QUERIES)} queries in {elapsed * 1000:.1f} ms "
+              f"({outcomes.count('hit')} hits, {outcomes.count('miss')} misses)")
+    conn.close()
+    cache.close()
+    
+    print()
+    print(f"Cache: {format_summary(cache.summary())}")
+    return {'timings': timings, 'summary': cache.summary()}
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Replay the Part C report queries through the result cache.")
+    parser.add_argument('--warehouse', default=WAREHOUSE_PATH)
+    parser.add_argument('--cache-dir', default=None, help="cache directory (default: next to the warehouse)")
+    parser.add_argument('--max-mb', type=float, default=DEFAULT_MAX_MB, help="size bound of the cache")
+    parser.add_argument('--rounds', type=int, default=3, help="how many times to run the report suite")
+    parser.add_argument('--clear', action='store_true', help="empty the cache first")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.warehouse, args.cache_dir, args.max_mb, args.rounds, args.clear)
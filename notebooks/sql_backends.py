@@ -0,0 +1,484 @@
+"""
+SQL Execution Backends
+K&Co Cloud Cost Intelligence Platform
+
+Runs the canonical Part C file (sql/part_c_transformations.sql, PostgreSQL
+dialect) as-is on an embedded engine, instead of maintaining hand-ported
+copies of its queries:
+
+- load_statements() splits the file into statements (semicolons inside
+  quotes and comments are ignored) and names each one after the comment
+  above it, e.g. 'query_2_monthly_spend_by_cloud_provider'
+- translate() rewrites the PostgreSQL-only constructs for the target engine:
+      EXTRACT(YEAR|MONTH|DAY FROM d)   -> strftime() casts       (SQLite)
+      DATE_TRUNC('month'|'year', d)    -> date(d, 'start of ...') (SQLite)
+      TO_CHAR(d, 'Month YYYY' ...)     -> month-name expressions  (both)
+      CREATE OR REPLACE VIEW           -> DROP + CREATE VIEW      (SQLite)
+  Everything else (CASE, window functions, LAG, TRUE/FALSE) runs unchanged.
+- SQLiteBackend loads the two source tables from the Bronze cache into an
+  in-memory database; DuckDBBackend defines them as views over the Bronze
+  Parquet files, so DuckDB scans the Parquet directly with its multi-threaded
+  vectorized executor.
+
+Statements that need a table neither backend has (Query 6 needs Part B's
+dim_service, built by star_schema.py) read it from the warehouse when it is
+there and are skipped otherwise.
+
+parity() runs every statement on both engines and compares the results
+after normalizing types (dates as ISO strings, booleans as 0/1, integral
+floats as ints); floats match to a relative 1e-9, since the engines may sum
+in a different order. Columns produced by ROUND(..., n) match to 10^-n: the
+engines round half-way values differently (SQLite rounds 8439.294999999998
+to 8439.3, DuckDB to 8439.29), and half-cent ties are routine in cost data.
+PARITY_CHECKS holds such cases, and parity() runs them with the file.
+"""
+
+import argparse
+import os
+import re
+import sqlite3
+import time
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import BRONZE_DIR, SOURCES, load_billing, provider_dir
+from warehouse import WAREHOUSE_PATH
+
+CANONICAL_SQL = 'sql/part_c_transformations.sql'
+BACKENDS = ('sqlite', 'duckdb')
+
+# Source table of each provider in the canonical file
+SOURCE_TABLES = {'aws': 'aws_line_items_12mo', 'gcp': 'gcp_billing_12mo'}
+
+# Part B tables some statements join to; read from the warehouse if present
+WAREHOUSE_TABLES = ['dim_service']
+
+FLOAT_TOLERANCE = 1e-9
+
+# Statements run on both engines by parity() besides the file's own
+PARITY_CHECKS = {
+    # An unrounded average both engines compute alike, on a half-cent tie
+    'check_round_half_cent_tie': "SELECT ROUND(CAST(8439.294999999998 AS DOUBLE), 2) AS rounded",
+}
+
+
+def duckdb_available():
+    try:
+        import duckdb  # noqa: F401
+        return True
+    except ImportError:
+        return False
+
+
+# ============================================================================
+# Parsing
+# ============================================================================
+
+TOKEN = re.compile(r"'(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|--[^\n]*|/\*.*?\*/|;", re.S)
+
+
+def split_statements(text):
+    """[(comments above the statement, statement)] for each ;-terminated statement."""
+    statements, start = [], 0
+    for match in TOKEN.finditer(text):
+        if match.group() == ';':
+            statements.append(text[start:match.start()])
+            start = match.end()
+    if text[start:].strip():
+        statements.append(text[start:])
+    
+    parsed = []
+    for chunk in statements:
+        comments, body = [], []
+        for line in chunk.strip('\n').split('\n'):
+            if not body and (line.strip().startswith('--') or not line.strip()):
+                comments.append(line.strip()[2:].strip())
+            else:
+                body.append(line)
+        if ''.join(body).strip():
+            parsed.append((comments, '\n'.join(body).strip()))
+    return parsed
+
+
+def statement_name(comments, fallback):
+    """
+    snake_case name from the comments above a statement: its 'Query N: ...'
+    heading if it has one, else the first title-like comment.
+    """
+    titles = [c for c in comments if c and not set(c) <= set('-=') and not c.lower().startswith('purpose')]
+    headings = [c for c in titles if re.match(r'query \d+\b', c, re.I)]
+    if not titles:
+        return fallback
+    title = re.sub(r'\(.*?\)', '', headings[-1] if headings else titles[0])
+    return re.sub(r'[^a-z0-9]+', '_', title.lower()).strip('_')
+
+
+def load_statements(path=CANONICAL_SQL):
+    """{name: statement} for the canonical SQL file, in file order."""
+    with open(path) as f:
+        text = f.read()
+    statements = {}
+    for i, (comments, sql) in enumerate(split_statements(text), start=1):
+        name = statement_name(comments[-6:], f'statement_{i}')
+        while name in statements:
+            name += '_2'
+        statements[name] = sql
+    return statements
+
+
+# ============================================================================
+# Dialect translation
+# ============================================================================
+
+MONTH_NAMES_PADDED = ''.join(f'{name:<9}' for name in [
+    'January', 'February', 'March', 'April', 'May', 'June', 'July', 'August', 'September', 'October',
+    'November', 'December'])
+MONTH_ABBREVIATIONS = 'JanFebMarAprMayJunJulAugSepOctNovDec'
+
+# PostgreSQL TO_CHAR patterns -> expression builders per dialect ({} is the date expression)
+TO_CHAR_PATTERNS = {
+    'sqlite': {
+        'Month': f"substr('{MONTH_NAMES_PADDED}', CAST(strftime('%m', {{}}) AS INTEGER) * 9 - 8, 9)",
+        'Mon': f"substr('{MONTH_ABBREVIATIONS}', CAST(strftime('%m', {{}}) AS INTEGER) * 3 - 2, 3)",
+        'YYYY': "strftime('%Y', {})",
+        'MM': "strftime('%m', {})",
+        'DD': "strftime('%d', {})",
+    },
+    'duckdb': {
+        # PostgreSQL blank-pads month names to 9 characters
+        'Month': "rpad(strftime({}, '%B'), 9, ' ')",
+        'Mon': "strftime({}, '%b')",
+        'YYYY': "strftime({}, '%Y')",
+        'MM': "strftime({}, '%m')",
+        'DD': "strftime({}, '%d')",
+    },
+}
+TO_CHAR_TOKEN = re.compile('|'.join(sorted(TO_CHAR_PATTERNS['sqlite'], key=len, reverse=True)))
+
+EXTRACT_CALL = re.compile(r'EXTRACT\(\s*(YEAR|MONTH|DAY)\s+FROM\s+([\w.]+)\s*\)', re.I)
+DATE_TRUNC_CALL = re.compile(r"DATE_TRUNC\(\s*'(year|month|day)'\s*,\s*([\w.]+)\s*\)", re.I)
+TO_CHAR_CALL = re.compile(r"TO_CHAR\(\s*([\w.]+)\s*,\s*'([^']*)'\s*\)", re.I)
+CREATE_OR_REPLACE_VIEW = re.compile(r'CREATE\s+OR\s+REPLACE\s+VIEW\s+([\w.]+)', re.I)
+
+STRFTIME_PARTS = {'year': '%Y', 'month': '%m', 'day': '%d'}
+
+
+def to_char(expr, fmt, dialect):
+    """Concatenation of the pieces of a TO_CHAR format."""
+    patterns = TO_CHAR_PATTERNS[dialect]
+    pieces, pos = [], 0
+    for match in TO_CHAR_TOKEN.finditer(fmt):
+        if match.start() > pos:
+            pieces.append("'" + fmt[pos:match.start()].replace("'", "''") + "'")
+        pieces.append(patterns[match.group()].format(expr))
+        pos = match.end()
+    if pos < len(fmt):
+        pieces.append("'" + fmt[pos:].replace("'", "''") + "'")
+    return '(' + ' || '.join(pieces) + ')'
+
+
+def translate(sql, dialect):
+    """Rewrite a PostgreSQL statement for 'sqlite' or 'duckdb'."""
+    sql = TO_CHAR_CALL.sub(lambda m: to_char(m.group(1), m.group(2), dialect), sql)
+    if dialect == 'sqlite':
+        sql = EXTRACT_CALL.sub(
+            lambda m: f"CAST(strftime('{STRFTIME_PARTS[m.group(1).lower()]}', {m.group(2)}) AS INTEGER)", sql)
+        sql = DATE_TRUNC_CALL.sub(
+            lambda m: f"date({m.group(2)})" if m.group(1).lower() == 'day'
+            else f"date({m.group(2)}, 'start of {m.group(1).lower()}')", sql)
+        sql = CREATE_OR_REPLACE_VIEW.sub(
+            lambda m: f'DROP VIEW IF EXISTS {m.group(1)};\nCREATE VIEW {m.group(1)}', sql)
+    return sql
+
+
+def rounded_columns(sql):
+    """{result column: n} for the select items of the form ROUND(..., n) [AS] name."""
+    columns = {}
+    for match in re.finditer(r'\bROUND\s*\(', sql, re.I):
+        depth, pos, last_comma = 1, match.end(), None
+        while depth and pos < len(sql):
+            char = sql[pos]
+            depth += {'(': 1, ')': -1}.get(char, 0)
+            if char == ',' and depth == 1:
+                last_comma = pos
+            pos += 1
+        digits = re.fullmatch(r'\s*(\d+)\s*', sql[last_comma + 1:pos - 1]) if last_comma else None
+        alias = re.match(r'\s*(?:AS\s+)?(\w+)\s*(?:,|FROM\b|$)', sql[pos:], re.I)
+        if digits and alias:
+            columns[alias.group(1).lower()] = int(digits.group(1))
+    return columns
+
+
+def returns_rows(sql):
+    return re.match(r'\s*(SELECT|WITH)\b', sql, re.I) is not None
+
+
+def missing_tables(sql, available):
+    """Tables a statement reads (FROM / JOIN) that the backend does not have."""
+    sql = EXTRACT_CALL.sub('', re.sub(r'--[^\n]*', '', sql))
+    ctes = {name.lower() for name in re.findall(r'(\w+)\s+AS\s*\(', sql, re.I)}
+    tables = {name.lower() for name in re.findall(r'\b(?:FROM|JOIN)\s+([A-Za-z_]\w*)', sql, re.I)}
+    return sorted(tables - ctes - {name.lower() for name in available})
+
+
+def warehouse_tables(warehouse_path):
+    """{name: DataFrame} of the WAREHOUSE_TABLES present in the warehouse."""
+    if not warehouse_path or not os.path.exists(warehouse_path):
+        return {}
+    conn = sqlite3.connect(f'file:{warehouse_path}?mode=ro', uri=True)
+    try:
+        present = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'table'")}
+        return {name: pd.read_sql_query(f"SELECT * FROM {name}", conn) for name in WAREHOUSE_TABLES
+                if name in present}
+    finally:
+        conn.close()
+
+
+# ============================================================================
+# Backends
+# ============================================================================
+
+class SQLiteBackend:
+    """In-memory SQLite database holding the source tables from the Bronze cache."""
+    
+    name = 'sqlite'
+    
+    def __init__(self, bronze_dir=BRONZE_DIR, warehouse_path=WAREHOUSE_PATH, threads=None):
+        self.conn = sqlite3.connect(':memory:')
+        for provider, table in SOURCE_TABLES.items():
+            frame = load_billing(provider, bronze_dir=bronze_dir)
+            frame = frame.assign(date=frame['date'].dt.strftime('%Y-%m-%d'))
+            frame.to_sql(table, self.conn, index=False)
+        for name, frame in warehouse_tables(warehouse_path).items():
+            frame.to_sql(name, self.conn, index=False)
+    
+    def tables(self):
+        return [row[0] for row in self.conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'view')")]
+    
+    def execute(self, sql):
+        sql = translate(sql, self.name)
+        if returns_rows(sql):
+            return pd.read_sql_query(sql, self.conn)
+        self.conn.executescript(sql)
+        return None
+    
+    def close(self):
+        self.conn.close()
+
+
+class DuckDBBackend:
+    """DuckDB with the source tables as views over the Bronze Parquet partitions."""
+    
+    name = 'duckdb'
+    
+    def __init__(self, bronze_dir=BRONZE_DIR, warehouse_path=WAREHOUSE_PATH, threads=None):
+        import duckdb
+        self.conn = duckdb.connect()
+        if threads:
+            self.conn.execute(f"SET threads = {int(threads)}")
+        for provider, table in SOURCE_TABLES.items():
+            pattern = os.path.join(provider_dir(provider, bronze_dir), '**', '*.parquet')
+            id_col = SOURCES[provider]['id_col']
+            self.conn.execute(f"""
+                CREATE VIEW {table} AS
+                SELECT CAST(date AS DATE) AS date, {id_col}, service, team, env, cost_usd
+                FROM read_parquet('{pattern}', hive_partitioning = false)
+            """)
+        for name, frame in warehouse_tables(warehouse_path).items():
+            self.conn.register(f'{name}_frame', frame)
+            self.conn.execute(f"CREATE TABLE {name} AS SELECT * FROM {name}_frame")
+    
+    def tables(self):
+        return [row[0] for row in self.conn.execute("SELECT table_name FROM information_schema.tables").fetchall()]
+    
+    def execute(self, sql):
+        sql = translate(sql, self.name)
+        if returns_rows(sql):
+            return self.conn.execute(sql).df()
+        self.conn.execute(sql)
+        return None
+    
+    def close(self):
+        self.conn.close()
+
+
+def make_backend(name, bronze_dir=BRONZE_DIR, warehouse_path=WAREHOUSE_PATH, threads=None):
+    if name == 'duckdb':
+        if not duckdb_available():
+            raise RuntimeError("The duckdb backend needs the duckdb package (pip install duckdb)")
+        return DuckDBBackend(bronze_dir, warehouse_path, threads)
+    if name == 'sqlite':
+        return SQLiteBackend(bronze_dir, warehouse_path, threads)
+    raise ValueError(f"Unknown backend {name!r} (expected one of {BACKENDS})")
+
+
+def run_statements(backend, statements):
+    """
+    Run {name: statement} in order on a backend.
+    
+    Returns {name: {'result': DataFrame | None, 'seconds': float, 'skipped': reason | None}}.
+    """
+    runs = {}
+    for name, sql in statements.items():
+        missing = missing_tables(sql, backend.tables())
+        if missing:
+            runs[name] = {'result': None, 'seconds': 0.0, 'skipped': f"needs {', '.join(missing)}"}
+            continue
+        start = time.perf_counter()
+        result = backend.execute(sql)
+        runs[name] = {'result': result, 'seconds': time.perf_counter() - start, 'skipped': None}
+    return runs
+
+
+# ============================================================================
+# Parity
+# ============================================================================
+
+def normalize_result(frame):
+    """Engine-neutral copy of a result: ISO date strings, 0/1 booleans, ints for integral floats."""
+    out = {}
+    for column in frame.columns:
+        values = frame[column]
+        if pd.api.types.is_datetime64_any_dtype(values):
+            values = values.dt.strftime('%Y-%m-%d').where(values.notna(), None)
+        elif pd.api.types.is_bool_dtype(values):
+            values = values.astype('int64')
+        elif pd.api.types.is_numeric_dtype(values):
+            numbers = values.astype('float64')
+            finite = numbers[np.isfinite(numbers)]
+            values = numbers if not (finite == np.round(finite)).all() else numbers.astype('Int64')
+        else:
+            values = values.astype(object).where(values.notna(), None)
+        out[column] = values.reset_index(drop=True)
+    return pd.DataFrame(out, columns=frame.columns)
+
+
+def frames_equal(left, right, rounded=None):
+    """Column-wise equality; `rounded` ({column: n}) columns may differ by 10^-n."""
+    if list(left.columns) != list(right.columns) or len(left) != len(right):
+        return False
+    rounded = rounded or {}
+    for column in left.columns:
+        a, b = left[column], right[column]
+        if column.lower() in rounded or a.dtype == 'float64' or b.dtype == 'float64':
+            a, b = a.astype('float64').to_numpy(), b.astype('float64').to_numpy()
+            # One unit in the last rounded place, plus the error of representing it
+            atol = 10.0 ** -rounded[column.lower()] * (1 + 1e-6) if column.lower() in rounded else FLOAT_TOLERANCE
+            if not np.allclose(a, b, rtol=FLOAT_TOLERANCE, atol=atol, equal_nan=True):
+                return False
+        elif not a.astype(object).equals(b.astype(object)):
+            return False
+    return True
+
+
+def compare_results(left, right, rounded=None):
+    """
+    'identical', 'identical up to row order' or a short description of the
+    difference; `rounded` is rounded_columns() of the statement.
+    """
+    if left is None or right is None:
+        return 'identical' if left is None and right is None else 'one backend returned no result'
+    if list(left.columns) != list(right.columns):
+        return f"columns differ: {list(left.columns)} vs {list(right.columns)}"
+    if len(left) != len(right):
+        return f"row counts differ: {len(left)} vs {len(right)}"
+    left, right = normalize_result(left), normalize_result(right)
+    if frames_equal(left, right, rounded):
+        return 'identical'
+    # Ties in ORDER BY may come back in either order
+    keys = list(left.columns)
+    if frames_equal(left.sort_values(keys, ignore_index=True), right.sort_values(keys, ignore_index=True), rounded):
+        return 'identical up to row order'
+    return 'values differ'
+
+
+def parity(statements, bronze_dir=BRONZE_DIR, warehouse_path=WAREHOUSE_PATH, threads=None):
+    """
+    Run every statement (and PARITY_CHECKS) on SQLite and DuckDB; returns one
+    comparison row per statement.
+    """
+    statements = {**statements, **PARITY_CHECKS}
+    runs = {}
+    for name in BACKENDS:
+        backend = make_backend(name, bronze_dir, warehouse_path, threads)
+        try:
+            runs[name] = run_statements(backend, statements)
+        finally:
+            backend.close()
+    rows = []
+    for statement in statements:
+        sqlite_run, duckdb_run = runs['sqlite'][statement], runs['duckdb'][statement]
+        skipped = sqlite_run['skipped'] or duckdb_run['skipped']
+        rows.append({
+            'statement': statement,
+            'rows': None if sqlite_run['result'] is None else len(sqlite_run['result']),
+            'sqlite_ms': sqlite_run['seconds'] * 1000,
+            'duckdb_ms': duckdb_run['seconds'] * 1000,
+            'parity': f'skipped ({skipped})' if skipped
+            else compare_results(sqlite_run['result'], duckdb_run['result'], rounded_columns(statements[statement])),
+        })
+    return pd.DataFrame(rows)
+
+
+def main(backend='duckdb', sql_path=CANONICAL_SQL, statement=None, check_parity=False, threads=None,
+         warehouse_path=WAREHOUSE_PATH, bronze_dir=BRONZE_DIR):
+    print("=" * 80)
+    print(f"CANONICAL SQL ON {'SQLITE + DUCKDB (PARITY)' if check_parity else backend.upper()}")
+    print("=" * 80)
+    print()
+    
+    statements = load_statements(sql_path)
+    if statement:
+        # Views the selected statement may depend on still have to be created first
+        statements = {name: sql for name, sql in statements.items()
+                      if name == statement or not returns_rows(sql)}
+        if statement not in statements:
+            raise SystemExit(f"No statement {statement!r} in {sql_path}")
+    print(f"{len(statements)} statements from {sql_path}")
+    print()
+    
+    if check_parity:
+        report = parity(statements, bronze_dir, warehouse_path, threads)
+        print(report.to_string(index=False, float_format=lambda v: f'{v:.1f}'))
+        print()
+        failed = report[~report['parity'].str.startswith(('identical', 'skipped'))]
+        if len(failed):
+            print(f"✗ {len(failed)} statement(s) differ between the backends")
+        else:
+            print("✓ Both backends return the same results for every statement")
+        return report
+    
+    engine = make_backend(backend, bronze_dir, warehouse_path, threads)
+    try:
+        runs = run_statements(engine, statements)
+    finally:
+        engine.close()
+    for name, run in runs.items():
+        if run['skipped']:
+            print(f"-- {name}: skipped ({run['skipped']})")
+        elif run['result'] is None:
+            print(f"-- {name}: ok ({run['seconds'] * 1000:.1f} ms)")
+        else:
+            print(f"-- {name}: {len(run['result']):,} rows ({run['seconds'] * 1000:.1f} ms)")
+            print(run['result'].head(20).to_string(index=False))
+        print()
+    return runs
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the canonical Part C SQL file on SQLite or DuckDB.")
+    parser.add_argument('--backend', choices=BACKENDS, default='duckdb')
+    parser.add_argument('--sql', default=CANONICAL_SQL, help="PostgreSQL-dialect SQL file to run")
+    parser.add_argument('--statement', default=None, help="run only this named statement (plus the DDL)")
+    parser.add_argument('--parity', action='store_true', help="run on both backends and compare the results")
+    parser.add_argument('--threads', type=int, default=None, help="DuckDB worker threads (default: all cores)")
+    parser.add_argument('--warehouse', default=WAREHOUSE_PATH, help="warehouse to read Part B tables from")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    result = main(args.backend, args.sql, args.statement, args.parity, args.threads, args.warehouse)
+    if args.parity and (~result['parity'].str.startswith(('identical', 'skipped'))).any():
+        raise SystemExit(1)
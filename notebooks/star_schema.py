@@ -0,0 +1,454 @@
+"""
+Star Schema Builder
+K&Co Cloud Cost Intelligence Platform
+
+Builds the Part B star schema (docs/Part_B_Data_Model.md) in the warehouse
+from the two billing sources:
+
+    fact_cloud_billing -> dim_date, dim_cloud_provider, dim_cloud_account,
+                          dim_service, dim_team, dim_environment
+
+Every dimension key is resolved without row-wise lookups: a batch's column is
+factorized once, only its distinct members are merged against the stored
+dimension, members not seen before get the next keys (in sorted order, so a
+rebuild from the same data assigns the same keys), and the fact key column is
+a single array take through the codes. Keys are never reassigned, so they are
+stable across incremental loads and BI extracts can cache them.
+
+The fact table holds integer keys only (plus cost, a line-item count and the
+load time as epoch seconds) at the Part B grain - day x account x service x
+team x environment - with credits kept as separate rows (is_credit) so gross,
+credit and net spend all stay reportable. dim_cloud_account is an addition
+to the Part B model so the account column is an integer key too. dim_date is
+keyed YYYYMMDD and covers whole calendar years around the loaded dates.
+
+Loads follow the warehouse's late-arrival strategy: each provider's fact rows
+after (latest loaded date - late_arrival_days) are replaced.
+"""
+
+import argparse
+from datetime import datetime, timezone
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import SOURCES, load_billing
+from billing_frame import PROVIDER_LABELS
+from warehouse import WAREHOUSE_PATH, LATE_ARRIVAL_DAYS, connect
+
+FISCAL_YEAR_START_MONTH = 1
+
+PROVIDER_NAMES = {'AWS': 'Amazon Web Services', 'GCP': 'Google Cloud Platform', 'Azure': 'Microsoft Azure'}
+
+SERVICE_CATEGORIES = {
+    'EC2': 'Compute', 'Compute Engine': 'Compute',
+    'EKS': 'Containers', 'GKE': 'Containers',
+    'Lambda': 'Serverless', 'Cloud Functions': 'Serverless',
+    'RDS': 'Database', 'Cloud SQL': 'Database',
+    'S3': 'Storage', 'Cloud Storage': 'Storage',
+}
+SERVICE_DESCRIPTIONS = {
+    'EC2': 'Elastic Compute Cloud',
+    'EKS': 'Elastic Kubernetes Service',
+    'Lambda': 'Serverless functions',
+    'RDS': 'Relational Database Service',
+    'S3': 'Simple Storage Service',
+    'Compute Engine': 'Google Compute Engine',
+    'Cloud SQL': 'Google Cloud SQL',
+}
+PRODUCTION_ENVS = {'prod', 'production'}
+
+# Stand-in for missing dimension values (the natural keys are NOT NULL)
+UNKNOWN = 'Unknown'
+
+STAR_SCHEMA = [
+    """
+    CREATE TABLE IF NOT EXISTS dim_date (
+        date_id INTEGER PRIMARY KEY,
+        date TEXT NOT NULL UNIQUE,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        quarter INTEGER NOT NULL,
+        day_of_week TEXT NOT NULL,
+        is_weekend INTEGER NOT NULL,
+        month_name TEXT NOT NULL,
+        fiscal_year INTEGER,
+        fiscal_quarter INTEGER
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_cloud_provider (
+        cloud_provider_id INTEGER PRIMARY KEY,
+        provider_name TEXT NOT NULL,
+        provider_code TEXT NOT NULL UNIQUE,
+        billing_account_id TEXT,
+        is_active INTEGER NOT NULL DEFAULT 1
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_cloud_account (
+        account_key INTEGER PRIMARY KEY,
+        cloud_account_id TEXT NOT NULL,
+        cloud_provider TEXT NOT NULL,
+        UNIQUE (cloud_account_id, cloud_provider)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_service (
+        service_id INTEGER PRIMARY KEY,
+        service_name TEXT NOT NULL,
+        service_category TEXT NOT NULL,
+        cloud_provider TEXT NOT NULL,
+        service_description TEXT,
+        is_active INTEGER NOT NULL DEFAULT 1,
+        UNIQUE (service_name, cloud_provider)
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_team (
+        team_id INTEGER PRIMARY KEY,
+        team_name TEXT NOT NULL UNIQUE,
+        department TEXT,
+        cost_center TEXT,
+        team_lead TEXT,
+        budget_usd REAL
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS dim_environment (
+        environment_id INTEGER PRIMARY KEY,
+        env_name TEXT NOT NULL UNIQUE,
+        env_type TEXT NOT NULL,
+        is_production INTEGER NOT NULL,
+        cost_allocation_pct REAL DEFAULT 100.00
+    )
+    """,
+    """
+    CREATE TABLE IF NOT EXISTS fact_cloud_billing (
+        billing_id INTEGER PRIMARY KEY,
+        date_id INTEGER NOT NULL REFERENCES dim_date (date_id),
+        cloud_provider_id INTEGER NOT NULL REFERENCES dim_cloud_provider (cloud_provider_id),
+        account_key INTEGER NOT NULL REFERENCES dim_cloud_account (account_key),
+        service_id INTEGER NOT NULL REFERENCES dim_service (service_id),
+        team_id INTEGER NOT NULL REFERENCES dim_team (team_id),
+        environment_id INTEGER NOT NULL REFERENCES dim_environment (environment_id),
+        is_credit INTEGER NOT NULL,
+        cost_usd REAL NOT NULL,
+        line_item_count INTEGER NOT NULL,
+        record_created_at INTEGER NOT NULL
+    )
+    """,
+    # The Part B indexes, plus the provider/date pair the incremental delete uses
+    "CREATE INDEX IF NOT EXISTS idx_fact_date_provider_service "
+    "ON fact_cloud_billing (date_id, cloud_provider_id, service_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_team_env ON fact_cloud_billing (team_id, environment_id)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_account ON fact_cloud_billing (account_key)",
+    "CREATE INDEX IF NOT EXISTS idx_fact_provider_date ON fact_cloud_billing (cloud_provider_id, date_id)",
+]
+
+FACT_COLUMNS = ['date_id', 'cloud_provider_id', 'account_key', 'service_id', 'team_id', 'environment_id',
+                'is_credit', 'cost_usd', 'line_item_count', 'record_created_at']
+
+# Grain of the fact table (every key column plus the credit flag)
+FACT_GRAIN = FACT_COLUMNS[:7]
+
+
+def init_star_schema(conn):
+    columns = {row[1]: row[2] for row in conn.execute("PRAGMA table_info(fact_cloud_billing)")}
+    if columns.get('record_created_at') == 'TEXT':
+        # Older layout stored an ISO string per fact row; the fact table is
+        # derived, so drop it and let the next build reload it (dimension keys are kept)
+        conn.execute("DROP TABLE fact_cloud_billing")
+    for ddl in STAR_SCHEMA:
+        conn.execute(ddl)
+    conn.commit()
+
+
+def date_ids(dates):
+    """datetime64 values -> YYYYMMDD integer keys."""
+    dates = pd.DatetimeIndex(dates)
+    return (dates.year * 10000 + dates.month * 100 + dates.day).to_numpy().astype('int64')
+
+
+# ============================================================================
+# Dimensions
+# ============================================================================
+
+def provider_attributes(members):
+    return members.assign(
+        provider_name=members['provider_code'].map(PROVIDER_NAMES).fillna(members['provider_code']),
+        billing_account_id=None,
+        is_active=1,
+    )
+
+
+def service_attributes(members):
+    return members.assign(
+        service_category=members['service_name'].map(SERVICE_CATEGORIES).fillna('Other'),
+        service_description=members['service_name'].map(SERVICE_DESCRIPTIONS),
+        is_active=1,
+    )
+
+
+def environment_attributes(members):
+    production = members['env_name'].str.lower().isin(PRODUCTION_ENVS)
+    return members.assign(
+        env_type=np.where(production, 'production', 'non-production'),
+        is_production=production.astype('int64'),
+        cost_allocation_pct=100.0,
+    )
+
+
+# Table -> (key column, natural key columns, attributes for new members)
+DIMENSIONS = {
+    'dim_cloud_provider': ('cloud_provider_id', ['provider_code'], provider_attributes),
+    'dim_cloud_account': ('account_key', ['cloud_account_id', 'cloud_provider'], None),
+    'dim_service': ('service_id', ['service_name', 'cloud_provider'], service_attributes),
+    'dim_team': ('team_id', ['team_name'], None),
+    'dim_environment': ('environment_id', ['env_name'], environment_attributes),
+}
+
+
+def conform_dimension(conn, table, values):
+    """
+    Surrogate key for every row of `values` (the natural key columns of one
+    dimension, one row per fact row), adding members not seen before.
+    """
+    key, natural, attributes = DIMENSIONS[table]
+    values = values[natural].astype(object).fillna(UNKNOWN)
+    codes = values.groupby(natural, sort=False).ngroup().to_numpy()
+    members = values.drop_duplicates().reset_index(drop=True)
+    
+    stored = pd.read_sql_query(f"SELECT {key}, {', '.join(natural)} FROM {table}", conn)
+    members = members.merge(stored, on=natural, how='left')
+    new = members[key].isna().to_numpy()
+    if new.any():
+        added = members[new].sort_values(natural).drop(columns=key)
+        added.insert(0, key, np.arange(len(added)) + int(stored[key].max() if len(stored) else 0) + 1)
+        if attributes is not None:
+            added = attributes(added)
+        conn.executemany(
+            f"INSERT INTO {table} ({', '.join(added.columns)}) VALUES ({', '.join('?' * len(added.columns))})",
+            added.astype(object).where(added.notna(), None).itertuples(index=False, name=None)
+        )
+        members.loc[new, key] = added[key].reindex(members.index[new]).to_numpy()
+    return members[key].to_numpy().astype('int64')[codes]
+
+
+def extend_dim_date(conn, first, last):
+    """Make sure dim_date covers the calendar years of first..last."""
+    start = pd.Timestamp(year=pd.Timestamp(first).year, month=1, day=1)
+    end = pd.Timestamp(year=pd.Timestamp(last).year, month=12, day=31)
+    covered = conn.execute("SELECT MIN(date), MAX(date) FROM dim_date").fetchone()
+    if covered[0] is not None and covered[0] <= f"{start:%Y-%m-%d}" and covered[1] >= f"{end:%Y-%m-%d}":
+        return 0
+    
+    dates = pd.date_range(start, end, freq='D')
+    fiscal_month = (dates.month - FISCAL_YEAR_START_MONTH) % 12
+    # A fiscal year starting mid-year is named after the calendar year it ends in
+    fiscal_year = dates.year + ((dates.month >= FISCAL_YEAR_START_MONTH) & (FISCAL_YEAR_START_MONTH > 1))
+    frame = pd.DataFrame({
+        'date_id': date_ids(dates),
+        'date': dates.strftime('%Y-%m-%d'),
+        'year': dates.year,
+        'month': dates.month,
+        'quarter': dates.quarter,
+        'day_of_week': dates.day_name(),
+        'is_weekend': (dates.dayofweek >= 5).astype(int),
+        'month_name': dates.month_name(),
+        'fiscal_year': fiscal_year,
+        'fiscal_quarter': fiscal_month // 3 + 1,
+    })
+    before = conn.total_changes
+    conn.executemany(
+        f"INSERT OR IGNORE INTO dim_date ({', '.join(frame.columns)}) VALUES ({', '.join('?' * len(frame.columns))})",
+        frame.astype(object).itertuples(index=False, name=None)
+    )
+    return conn.total_changes - before
+
+
+# ============================================================================
+# Fact table
+# ============================================================================
+
+def fact_rows(conn, batch, provider, created_at):
+    """Raw billing rows for one provider -> integer-keyed fact rows at the Part B grain."""
+    label = PROVIDER_LABELS[provider]
+    raw = pd.DataFrame({
+        'provider_code': label,
+        'cloud_provider': label,
+        'cloud_account_id': batch[SOURCES[provider]['id_col']],
+        'service_name': batch['service'],
+        'team_name': batch['team'],
+        'env_name': batch['env'],
+    })
+    cost = batch['cost_usd'].to_numpy(dtype='float64')
+    keyed = pd.DataFrame({
+        'date_id': date_ids(batch['date']),
+        'cloud_provider_id': conform_dimension(conn, 'dim_cloud_provider', raw),
+        'account_key': conform_dimension(conn, 'dim_cloud_account', raw),
+        'service_id': conform_dimension(conn, 'dim_service', raw),
+        'team_id': conform_dimension(conn, 'dim_team', raw),
+        'environment_id': conform_dimension(conn, 'dim_environment', raw),
+        'is_credit': (cost < 0).astype('int64'),
+        'cost_usd': np.nan_to_num(cost),
+    })
+    fact = keyed.groupby(FACT_GRAIN, sort=True).agg(
+        cost_usd=('cost_usd', 'sum'), line_item_count=('cost_usd', 'size')
+    ).reset_index()
+    fact['record_created_at'] = created_at
+    return fact
+
+
+def fact_cutoff(conn, provider_id, late_arrival_days):
+    """date_id after which a provider's fact rows are replaced (None = no rows yet)."""
+    row = conn.execute(
+        "SELECT MAX(date_id) FROM fact_cloud_billing WHERE cloud_provider_id = ?", (provider_id,)
+    ).fetchone()
+    if row[0] is None:
+        return None
+    latest = pd.Timestamp(str(row[0]))
+    return int(date_ids([latest - pd.Timedelta(days=late_arrival_days)])[0])
+
+
+def build_star_schema(conn, late_arrival_days=LATE_ARRIVAL_DAYS, full_refresh=False):
+    """Load both providers into the star schema; returns per-provider stats."""
+    init_star_schema(conn)
+    created_at = int(datetime.now(timezone.utc).timestamp())
+    stats = []
+    for provider in SOURCES:
+        label = PROVIDER_LABELS[provider]
+        provider_id = conn.execute(
+            "SELECT cloud_provider_id FROM dim_cloud_provider WHERE provider_code = ?", (label,)
+        ).fetchone()
+        cutoff = None if full_refresh or provider_id is None else fact_cutoff(conn, provider_id[0], late_arrival_days)
+        since = None if cutoff is None else pd.Timestamp(str(cutoff)) + pd.Timedelta(days=1)
+        batch = load_billing(provider, since=since)
+        
+        with conn:
+            fact = fact_rows(conn, batch, provider, created_at)
+            if len(batch):
+                extend_dim_date(conn, batch['date'].min(), batch['date'].max())
+            provider_id = conform_dimension(conn, 'dim_cloud_provider', pd.DataFrame({'provider_code': [label]}))[0]
+            if cutoff is None:
+                deleted = conn.execute(
+                    "DELETE FROM fact_cloud_billing WHERE cloud_provider_id = ?", (int(provider_id),)
+                ).rowcount
+            else:
+                deleted = conn.execute(
+                    "DELETE FROM fact_cloud_billing WHERE cloud_provider_id = ? AND date_id > ?",
+                    (int(provider_id), cutoff)
+                ).rowcount
+            conn.executemany(
+                f"INSERT INTO fact_cloud_billing ({', '.join(FACT_COLUMNS)}) "
+                f"VALUES ({', '.join('?' * len(FACT_COLUMNS))})",
+                fact[FACT_COLUMNS].astype(object).itertuples(index=False, name=None)
+            )
+        stats.append({
+            'provider': provider,
+            'mode': 'full' if cutoff is None else 'incremental',
+            'line_items': len(batch),
+            'fact_rows_deleted': deleted,
+            'fact_rows_inserted': len(fact),
+        })
+    return stats
+
+
+# ============================================================================
+# Reports on the star schema
+# ============================================================================
+
+# Query 6 of part_c_transformations.sql, joined on integer keys
+SERVICE_CATEGORY_QUERY = """
+SELECT
+    s.service_category,
+    ROUND(SUM(f.cost_usd), 2) AS total_cost_usd,
+    SUM(f.line_item_count) AS transaction_count,
+    ROUND(SUM(f.cost_usd) * 100.0 / (SELECT SUM(cost_usd) FROM fact_cloud_billing), 2) AS pct_of_total
+FROM fact_cloud_billing f
+JOIN dim_service s ON f.service_id = s.service_id
+GROUP BY s.service_category
+ORDER BY total_cost_usd DESC
+"""
+
+# Part B sample query 1: monthly spend by cloud provider
+MONTHLY_PROVIDER_QUERY = """
+SELECT
+    cp.provider_name,
+    d.year,
+    d.month,
+    ROUND(SUM(f.cost_usd), 2) AS total_cost,
+    ROUND(SUM(CASE WHEN f.is_credit = 1 THEN f.cost_usd ELSE 0 END), 2) AS credits
+FROM fact_cloud_billing f
+JOIN dim_cloud_provider cp ON f.cloud_provider_id = cp.cloud_provider_id
+JOIN dim_date d ON f.date_id = d.date_id
+GROUP BY cp.provider_name, d.year, d.month
+ORDER BY d.year, d.month, cp.provider_name
+"""
+
+# Part B sample query 3: team spend by environment
+TEAM_ENV_QUERY = """
+SELECT
+    t.team_name,
+    e.env_name,
+    ROUND(SUM(f.cost_usd), 2) AS total_cost,
+    SUM(f.line_item_count) AS record_count
+FROM fact_cloud_billing f
+JOIN dim_team t ON f.team_id = t.team_id
+JOIN dim_environment e ON f.environment_id = e.environment_id
+GROUP BY t.team_name, e.env_name
+ORDER BY t.team_name, total_cost DESC
+"""
+
+
+def main(warehouse_path=WAREHOUSE_PATH, late_arrival_days=LATE_ARRIVAL_DAYS, full_refresh=False):
+    print("=" * 80)
+    print("STAR SCHEMA BUILD")
+    print("=" * 80)
+    print()
+    
+    conn = connect(warehouse_path)
+    for stats in build_star_schema(conn, late_arrival_days, full_refresh):
+        print(f"✓ {stats['provider'].upper()} ({stats['mode']}): {stats['line_items']:,} line items -> "
+              f"{stats['fact_rows_inserted']:,} fact rows (replaced {stats['fact_rows_deleted']:,})")
+    print()
+    
+    sizes = {table: conn.execute(f"SELECT COUNT(*) FROM {table}").fetchone()[0]
+             for table in ['fact_cloud_billing', 'dim_date', *DIMENSIONS]}
+    print("Table sizes:")
+    for table, rows in sizes.items():
+        print(f"  {table:<22} {rows:>8,}")
+    print()
+    
+    # The fact table must carry the same spend and line items as the flat table
+    if conn.execute("SELECT name FROM sqlite_master WHERE name = 'unified_cloud_billing'").fetchone():
+        fact = conn.execute("SELECT SUM(cost_usd), SUM(line_item_count) FROM fact_cloud_billing").fetchone()
+        flat = conn.execute("SELECT SUM(cost_usd), COUNT(*) FROM unified_cloud_billing").fetchone()
+        match = abs((fact[0] or 0) - (flat[0] or 0)) < 0.01 and fact[1] == flat[1]
+        print(f"{'✓' if match else '✗'} Reconciliation with unified_cloud_billing: "
+              f"${fact[0] or 0:,.2f} / {fact[1] or 0:,} line items vs ${flat[0] or 0:,.2f} / {flat[1]:,}")
+        print()
+    
+    for title, query in [("Cost by service category (Query 6)", SERVICE_CATEGORY_QUERY),
+                         ("Monthly spend by cloud provider", MONTHLY_PROVIDER_QUERY),
+                         ("Team spend by environment", TEAM_ENV_QUERY)]:
+        print(f"{title}:")
+        print(pd.read_sql_query(query, conn).to_string(index=False))
+        print()
+    
+    conn.close()
+    return sizes
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Build the Part B star schema in the warehouse.")
+    parser.add_argument('--warehouse', default=WAREHOUSE_PATH, help="SQLite warehouse file")
+    parser.add_argument('--late-days', type=int, default=LATE_ARRIVAL_DAYS,
+                        help="days before each provider's latest fact date to replace")
+    parser.add_argument('--full-refresh', action='store_true', help="rebuild the fact table from scratch")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    main(args.warehouse, args.late_days, args.full_refresh)
@@ -0,0 +1,292 @@
+"""
+Streaming Profiler
+K&Co Cloud Cost Intelligence Platform
+
+Single-pass, chunked version of the Part A profiling metrics.
+
+Each chunk (from a raw CSV or the Parquet cache) is folded into a
+ProfileAccumulator; accumulators are mergeable, so chunks (or whole files)
+can be profiled independently and combined. Only the accumulator state is
+kept between chunks:
+- running counts, sums, min/max and Welford moments for cost_usd
+- a cost histogram at cent resolution for the describe() quartiles
+- per-date cost totals and distinct value sets for the small dimensions
+- 64-bit row/key hashes for the duplicate counts, spilled to disk
+
+In memory, state scales with the number of distinct dates, dimension values
+and cent-level cost values, never with the raw width or length of the file.
+The row/key hashes (8 bytes per row each) are buffered up to
+HASH_SPILL_THRESHOLD and then appended to temporary per-bucket files, split
+by their top bits; the duplicate counts read one bucket at a time, so they
+need about 8 bytes x rows / HASH_BUCKETS of memory and the rest stays on
+disk.
+"""
+
+import os
+import shutil
+import tempfile
+import weakref
+
+import numpy as np
+import pandas as pd
+
+from part_a_profiling import key_columns
+
+DEFAULT_CHUNKSIZE = 100_000
+
+# Pending hashes are spilled to the bucket files once they hold this many values
+HASH_SPILL_THRESHOLD = 1_000_000
+# Bucket files per hash set (a power of two: buckets are the top hash bits)
+HASH_BUCKETS = 256
+BUCKET_SHIFT = np.uint64(64 - HASH_BUCKETS.bit_length() + 1)
+
+
+class DistinctHashes:
+    """
+    Distinct count over 64-bit hashes: buffered in memory, spilled to
+    per-bucket files, counted one bucket at a time.
+    
+    Equal hashes always land in the same bucket, so the distinct count is the
+    sum of the buckets' distinct counts. The spill directories are removed
+    when the set is garbage-collected; pickling (e.g. returning the set from
+    a worker process) and merge() hand them over to the receiving set.
+    """
+    
+    def __init__(self):
+        self.pending = []
+        self.pending_size = 0
+        self.spill_dirs = []
+        self._cleanup = {}
+    
+    def add(self, hashes):
+        self.pending.append(np.unique(hashes))
+        self.pending_size += len(self.pending[-1])
+        if self.pending_size >= HASH_SPILL_THRESHOLD:
+            self.spill()
+    
+    def merge(self, other):
+        for part in other.pending:
+            self.add(part)
+        for path in other.spill_dirs:
+            other._release(path)
+            self._own(path)
+        other.pending, other.pending_size, other.spill_dirs = [], 0, []
+    
+    def spill(self):
+        """Append the pending hashes to this set's bucket files."""
+        if not self.pending:
+            return
+        hashes = np.unique(np.concatenate(self.pending))
+        self.pending, self.pending_size = [], 0
+        if not self.spill_dirs:
+            self._own(tempfile.mkdtemp(prefix='distinct-hashes-'))
+        # Sorted, so each bucket is one contiguous run
+        bounds = np.searchsorted(hashes >> BUCKET_SHIFT, np.arange(HASH_BUCKETS + 1, dtype=np.uint64))
+        for bucket in np.flatnonzero(np.diff(bounds)):
+            with open(self._bucket_path(self.spill_dirs[0], bucket), 'ab') as f:
+                hashes[bounds[bucket]:bounds[bucket + 1]].tofile(f)
+    
+    def count(self):
+        if not self.spill_dirs:
+            return len(np.unique(np.concatenate(self.pending))) if self.pending else 0
+        self.spill()
+        total = 0
+        for bucket in range(HASH_BUCKETS):
+            parts = [np.fromfile(path, dtype=np.uint64) for path in
+                     (self._bucket_path(d, bucket) for d in self.spill_dirs) if os.path.exists(path)]
+            if parts:
+                total += len(np.unique(np.concatenate(parts)))
+        return total
+    
+    @staticmethod
+    def _bucket_path(spill_dir, bucket):
+        return os.path.join(spill_dir, f'bucket-{bucket:03d}.u64')
+    
+    def _own(self, path):
+        self.spill_dirs.append(path)
+        self._cleanup[path] = weakref.finalize(self, shutil.rmtree, path, True)
+    
+    def _release(self, path):
+        self._cleanup.pop(path).detach()
+    
+    def __getstate__(self):
+        # The pickled copy takes over the spill directories
+        for path in self.spill_dirs:
+            self._release(path)
+        return {'pending': self.pending, 'pending_size': self.pending_size, 'spill_dirs': self.spill_dirs}
+    
+    def __setstate__(self, state):
+        self.pending, self.pending_size, self.spill_dirs = state['pending'], state['pending_size'], []
+        self._cleanup = {}
+        for path in state['spill_dirs']:
+            self._own(path)
+
+
+class ProfileAccumulator:
+    """Mergeable accumulator for every metric in the Part A report."""
+    
+    def __init__(self, id_col):
+        self.id_col = id_col
+        self.row_count = 0
+        self.columns = None
+        self.memory_bytes = 0
+        self.index_bytes = 0
+        self.missing_values = 0
+        self.row_hashes = DistinctHashes()
+        self.key_hashes = DistinctHashes()
+        self.daily_cost = pd.Series(dtype='float64')
+        self.env_counts = {}
+        self.services = set()
+        self.teams = set()
+        self.envs = set()
+        self.ids = set()
+        # cost_usd moments (Chan/Welford) and exact-at-cent histogram
+        self.cost_n = 0
+        self.cost_mean = 0.0
+        self.cost_m2 = 0.0
+        self.cost_sum = 0.0
+        self.cost_min = np.inf
+        self.cost_max = -np.inf
+        self.cost_cents = pd.Series(dtype='int64')
+        self.negative_costs = 0
+        self.zero_costs = 0
+    
+    def update(self, chunk):
+        """Fold one chunk of billing rows into the accumulator."""
+        chunk = chunk.copy()
+        chunk['date'] = pd.to_datetime(chunk['date'])
+        if self.columns is None:
+            self.columns = list(chunk.columns)
+            self.index_bytes = chunk.memory_usage(deep=True)['Index']
+        
+        self.row_count += len(chunk)
+        self.memory_bytes += chunk.memory_usage(deep=True, index=False).sum()
+        self.missing_values += chunk.isnull().sum().sum()
+        
+        self.row_hashes.add(pd.util.hash_pandas_object(chunk, index=False).to_numpy())
+        self.key_hashes.add(
+            pd.util.hash_pandas_object(chunk[key_columns(self.id_col)], index=False).to_numpy()
+        )
+        
+        cost = chunk['cost_usd']
+        self.daily_cost = self.daily_cost.add(cost.groupby(chunk['date']).sum(), fill_value=0)
+        for env, count in chunk['env'].value_counts().items():
+            self.env_counts[env] = self.env_counts.get(env, 0) + count
+        self.services.update(chunk['service'].dropna().unique())
+        self.teams.update(chunk['team'].dropna().unique())
+        self.envs.update(chunk['env'].dropna().unique())
+        self.ids.update(chunk[self.id_col].dropna().unique())
+        
+        values = cost.dropna().to_numpy(dtype='float64')
+        if len(values):
+            self._merge_moments(len(values), values.mean(), ((values - values.mean()) ** 2).sum())
+            self.cost_sum += values.sum()
+            self.cost_min = min(self.cost_min, values.min())
+            self.cost_max = max(self.cost_max, values.max())
+            cents = pd.Series(np.round(values * 100).astype('int64')).value_counts()
+            self.cost_cents = self.cost_cents.add(cents, fill_value=0).astype('int64')
+            self.negative_costs += int((values < 0).sum())
+            self.zero_costs += int((values == 0).sum())
+        return self
+    
+    def merge(self, other):
+        """Combine another accumulator (e.g. from a parallel worker) into this one."""
+        if self.columns is None:
+            self.columns = other.columns
+            self.index_bytes = other.index_bytes
+        self.row_count += other.row_count
+        self.memory_bytes += other.memory_bytes
+        self.missing_values += other.missing_values
+        self.row_hashes.merge(other.row_hashes)
+        self.key_hashes.merge(other.key_hashes)
+        self.daily_cost = self.daily_cost.add(other.daily_cost, fill_value=0)
+        for env, count in other.env_counts.items():
+            self.env_counts[env] = self.env_counts.get(env, 0) + count
+        self.services |= other.services
+        self.teams |= other.teams
+        self.envs |= other.envs
+        self.ids |= other.ids
+        if other.cost_n:
+            self._merge_moments(other.cost_n, other.cost_mean, other.cost_m2)
+        self.cost_sum += other.cost_sum
+        self.cost_min = min(self.cost_min, other.cost_min)
+        self.cost_max = max(self.cost_max, other.cost_max)
+        self.cost_cents = self.cost_cents.add(other.cost_cents, fill_value=0).astype('int64')
+        self.negative_costs += other.negative_costs
+        self.zero_costs += other.zero_costs
+        return self
+    
+    def _merge_moments(self, n, mean, m2):
+        total = self.cost_n + n
+        delta = mean - self.cost_mean
+        self.cost_mean += delta * n / total
+        self.cost_m2 += m2 + delta ** 2 * self.cost_n * n / total
+        self.cost_n = total
+    
+    def _quantile(self, q):
+        """Linear-interpolated quantile (pandas default) from the cent histogram."""
+        hist = self.cost_cents.sort_index()
+        cumulative = hist.cumsum().to_numpy()
+        values = hist.index.to_numpy() / 100
+        position = q * (self.cost_n - 1)
+        lower = int(np.floor(position))
+        upper = int(np.ceil(position))
+        lo_value = values[np.searchsorted(cumulative, lower, side='right')]
+        hi_value = values[np.searchsorted(cumulative, upper, side='right')]
+        return lo_value + (hi_value - lo_value) * (position - lower)
+    
+    def cost_describe(self):
+        std = np.sqrt(self.cost_m2 / (self.cost_n - 1)) if self.cost_n > 1 else np.nan
+        return pd.Series(
+            [float(self.cost_n), self.cost_mean, std, self.cost_min,
+             self._quantile(0.25), self._quantile(0.5), self._quantile(0.75), self.cost_max],
+            index=['count', 'mean', 'std', 'min', '25%', '50%', '75%', 'max'],
+            name='cost_usd'
+        )
+    
+    def result(self):
+        """Finalise into the same profile dict as part_a_profiling.profile_frame()."""
+        dates = self.daily_cost.index
+        date_range = pd.date_range(start=dates.min(), end=dates.max(), freq='D')
+        env_counts = pd.Series(self.env_counts, name='count', dtype='int64')
+        env_counts.index.name = 'env'
+        
+        return {
+            'row_count': self.row_count,
+            'column_count': len(self.columns),
+            # Sum over the raw chunks (object strings), not the compact layout
+            'memory_bytes': self.memory_bytes + self.index_bytes,
+            'memory_layout': 'raw chunks',
+            'missing_values': self.missing_values,
+            'duplicate_rows': self.row_count - self.row_hashes.count(),
+            'key_duplicates': self.row_count - self.key_hashes.count(),
+            'min_date': dates.min(),
+            'max_date': dates.max(),
+            'unique_dates': len(dates),
+            'missing_dates': len(date_range) - len(dates),
+            'env_counts': env_counts.sort_values(ascending=False, kind='stable'),
+            'services': sorted(self.services),
+            'teams': sorted(self.teams),
+            'envs': sorted(self.envs),
+            'ids': sorted(self.ids),
+            'cost_describe': self.cost_describe(),
+            'negative_costs': self.negative_costs,
+            'zero_costs': self.zero_costs,
+            'cost_min': self.cost_min,
+            'cost_max': self.cost_max,
+            'total_cost': self.cost_sum,
+            'avg_daily_cost': self.daily_cost.mean(),
+        }
+
+
+def profile_chunks(chunks, id_col):
+    """Profile any iterable of raw billing chunks in one pass."""
+    acc = ProfileAccumulator(id_col)
+    for chunk in chunks:
+        acc.update(chunk)
+    return acc
+
+
+def profile_csv(path, id_col, chunksize=DEFAULT_CHUNKSIZE):
+    """Stream one raw billing CSV and return its profile dict."""
+    return profile_chunks(pd.read_csv(path, chunksize=chunksize), id_col).result()
@@ -0,0 +1,166 @@
+"""
+Synthetic Billing Data Generator
+K&Co Cloud Cost Intelligence Platform
+
+Deterministic, seeded generator for AWS- and GCP-shaped billing CSVs with the
+same schema as the files in data/, at any size (1e4 to 1e8+ rows):
+
+    date,account_id,service,team,env,cost_usd      (AWS)
+    date,project_id,service,team,env,cost_usd      (GCP)
+
+Shape of the data:
+- skew: accounts/projects and services are drawn from Zipf-like weights, and
+  costs are lognormal with a per-service scale, so a few series dominate spend
+- credits: CREDIT_RATE of rows are small negative costs (refunds/credits)
+- key duplicates: DUPLICATE_RATE of rows repeat the previous row's
+  (date, account, service, team, env) key with a different cost
+- date gaps: GAP_RATE of the days in the range have no rows at all
+
+Rows are written in date order, in fixed-size chunks. Every chunk draws from
+its own generator seeded by (seed, provider, chunk index), so the output is
+identical for a given seed regardless of memory limits, and the number of
+accounts grows with the row count the way a real organisation's would.
+"""
+
+import argparse
+import os
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import SOURCES
+
+START_DATE = '2025-01-01'
+DAYS = 365
+
+SERVICES = ['EC2', 'EKS', 'Lambda', 'RDS', 'S3']
+TEAMS = ['Core', 'Data', 'Web']
+ENVS = ['dev', 'prod', 'staging']
+
+# Median cost per line item for each service (lognormal scale)
+SERVICE_MEDIAN_COST = {'EC2': 140.0, 'EKS': 120.0, 'Lambda': 60.0, 'RDS': 110.0, 'S3': 45.0}
+COST_SIGMA = 0.7
+ZIPF_EXPONENT = 1.1
+
+CREDIT_RATE = 0.006
+DUPLICATE_RATE = 0.1
+GAP_RATE = 0.02
+
+# One account/project per this many rows (at least the three in the sample data)
+ROWS_PER_ACCOUNT = 100_000
+
+CHUNK_ROWS = 1_000_000
+
+PROVIDER_SEEDS = {'aws': 1, 'gcp': 2}
+GCP_PROJECT_NAMES = ['alpha', 'beta', 'gamma', 'delta', 'epsilon', 'zeta', 'eta', 'theta']
+
+
+def zipf_weights(n, exponent=ZIPF_EXPONENT):
+    weights = 1.0 / np.arange(1, n + 1) ** exponent
+    return weights / weights.sum()
+
+
+def account_ids(provider, rows, seed):
+    """Account/project IDs for a dataset of `rows` rows (sample-data IDs first)."""
+    count = max(3, rows // ROWS_PER_ACCOUNT)
+    if provider == 'aws':
+        ids = [str(d) * 12 for d in (1, 2, 3)]
+        rng = np.random.default_rng([seed, PROVIDER_SEEDS[provider], 0xACC])
+        extra = rng.choice(9 * 10 ** 11, size=count - 3, replace=False) + 10 ** 11 if count > 3 else []
+        return ids + [str(int(i)) for i in extra]
+    names = [f'proj-{name}' for name in GCP_PROJECT_NAMES]
+    return (names + [f'proj-{i:05d}' for i in range(len(names), count)])[:count]
+
+
+def active_days(provider, seed, start=START_DATE, days=DAYS, gap_rate=GAP_RATE):
+    """Day offsets (since 1970-01-01) that have data, after dropping the gap days."""
+    first = (np.datetime64(start, 'D') - np.datetime64('1970-01-01', 'D')).astype('int64')
+    offsets = np.arange(first, first + days)
+    rng = np.random.default_rng([seed, PROVIDER_SEEDS[provider], 0xDA7])
+    # The first and last day always have data so the range itself is stable
+    gaps = rng.random(days) < gap_rate
+    gaps[[0, -1]] = False
+    return offsets[~gaps]
+
+
+def generate_chunk(provider, rows, chunk, seed, accounts, days, chunk_rows=CHUNK_ROWS,
+                   credit_rate=CREDIT_RATE, duplicate_rate=DUPLICATE_RATE):
+    """Rows [chunk * chunk_rows, ...) of a provider's synthetic dataset."""
+    rng = np.random.default_rng([seed, PROVIDER_SEEDS[provider], chunk])
+    begin = chunk * chunk_rows
+    n = min(chunk_rows, rows - begin)
+    
+    # Rows are spread evenly over the active days, in date order
+    position = np.arange(begin, begin + n, dtype='int64')
+    day = days[position * len(days) // rows]
+    account = rng.choice(len(accounts), size=n, p=zipf_weights(len(accounts)))
+    service = rng.choice(len(SERVICES), size=n, p=zipf_weights(len(SERVICES), 0.6))
+    team = rng.integers(0, len(TEAMS), n)
+    env = rng.integers(0, len(ENVS), n)
+    
+    # Key duplicates copy every key column from the last non-duplicate row
+    duplicate = rng.random(n) < duplicate_rate
+    duplicate[0] = False
+    source = np.maximum.accumulate(np.where(duplicate, 0, np.arange(n)))
+    day, account, service, team, env = (a[source] for a in (day, account, service, team, env))
+    
+    median = np.array([SERVICE_MEDIAN_COST[s] for s in SERVICES])[service]
+    cost = median * rng.lognormal(0.0, COST_SIGMA, n)
+    credit = rng.random(n) < credit_rate
+    cost[credit] = -rng.uniform(1, 50, credit.sum())
+    
+    id_col = SOURCES[provider]['id_col']
+    return pd.DataFrame({
+        'date': (np.datetime64('1970-01-01', 'D') + day.astype('timedelta64[D]')).astype(str),
+        id_col: np.asarray(accounts, dtype=object)[account],
+        'service': np.asarray(SERVICES, dtype=object)[service],
+        'team': np.asarray(TEAMS, dtype=object)[team],
+        'env': np.asarray(ENVS, dtype=object)[env],
+        'cost_usd': np.round(cost, 2),
+    })
+
+
+def generate(provider, rows, seed=0, start=START_DATE, days=DAYS, chunk_rows=CHUNK_ROWS):
+    """Yield a provider's synthetic dataset as DataFrame chunks, in date order."""
+    accounts = account_ids(provider, rows, seed)
+    day_offsets = active_days(provider, seed, start, days)
+    for chunk in range((rows + chunk_rows - 1) // chunk_rows):
+        yield generate_chunk(provider, rows, chunk, seed, accounts, day_offsets, chunk_rows)
+
+
+def write_dataset(out_dir, rows, seed=0, start=START_DATE, days=DAYS, chunk_rows=CHUNK_ROWS, verbose=False):
+    """
+    Write both providers' CSVs under out_dir, using the same file names as
+    data/ (so out_dir can stand in for the project root). `rows` is per
+    provider. Returns {provider: path}.
+    """
+    paths = {}
+    for provider, spec in SOURCES.items():
+        path = os.path.join(out_dir, spec['path'])
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w', newline='') as f:
+            for i, chunk in enumerate(generate(provider, rows, seed, start, days, chunk_rows)):
+                chunk.to_csv(f, index=False, header=(i == 0))
+        os.replace(tmp_path, path)
+        paths[provider] = path
+        if verbose:
+            print(f"✓ {provider.upper()}: {rows:,} rows -> {path}")
+    return paths
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Generate seeded synthetic AWS/GCP billing CSVs.")
+    parser.add_argument('--rows', type=int, default=100_000, help="rows per provider")
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--days', type=int, default=DAYS, help="days of history starting at --start")
+    parser.add_argument('--start', default=START_DATE)
+    parser.add_argument('--out', default=None,
+                        help="output root; CSVs go to <out>/data/ (default: data/synthetic/<rows>)")
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    out_dir = args.out or os.path.join('data', 'synthetic', str(args.rows))
+    write_dataset(out_dir, args.rows, args.seed, args.start, args.days, verbose=True)
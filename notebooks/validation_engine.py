@@ -0,0 +1,436 @@
+"""
+Fused Validation Engine
+K&Co Cloud Cost Intelligence Platform
+
+The raw / cleaned zone checkpoints of the pipeline design (Part D, section 5)
+and the data quality risks of Part A, written once as a declarative rule set
+(RULES) and evaluated in a single pass per chunk.
+
+The rules are compiled per provider into one plan per column:
+- string-like columns (date, account/project ID, service, team, env) are
+  factorized once per chunk. Every rule on the column is evaluated on the
+  distinct values only, giving a lookup table of violation bits per value,
+  and one gather (lut[codes]) ORs them into the row bitmap. Values already
+  seen in earlier chunks are not evaluated again, so the ID regex runs once
+  per ID, not once per row
+- cost_usd is parsed once; its rules are vectorized comparisons
+- the composite key hash is built from hashes of the distinct values of
+  the already factorized columns; repeats within the chunk set the
+  key_unique bit, and the distinct hashes are merged across chunks for the
+  total repeat count
+
+Each chunk yields a bitmap with one bit per rule (uint16 for up to 16
+rules). The per-rule counts come from the distinct bit patterns, and the
+first few offending rows of each rule are kept as samples. Adding a rule
+adds a lookup-table column or a comparison, not another scan of the data.
+
+Work is split into tasks for a process pool: line-aligned byte ranges of the
+source CSVs, the extracted raw-zone day files (extractors.py), or the Bronze
+Parquet partitions. CSVs are read as text, so malformed dates and costs are
+reported rather than failing the read. File-level checks (header matches the
+expected schema, file has rows) are reported as problems. Sample locations
+are file@<byte offset of the task's range>+<row within it> (file+<row> for
+Parquet).
+
+Repeats of a key across chunks are included in key_unique's count but not
+in a row's bitmap, so `failing_rows` counts rows failing a rule within
+their own chunk.
+"""
+
+import argparse
+import glob
+import io
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import SOURCES, partition_files, source_dtypes
+from parallel_runner import resolve_workers
+from star_schema import SERVICE_CATEGORIES
+from streaming_profiler import DEFAULT_CHUNKSIZE, DistinctHashes
+
+RAW_DIR = 'data/raw'
+ZONES = ('source', 'raw', 'bronze')
+PART_BYTES = 16 * 1024 ** 2
+SAMPLE_SIZE = 5
+SEVERITIES = ('warning', 'critical')
+
+ID_PATTERNS = {'aws': r'\d{12}', 'gcp': r'[a-z][a-z0-9-]{4,28}[a-z0-9]'}
+APPROVED_SERVICES = sorted(SERVICE_CATEGORIES)
+APPROVED_TEAMS = ['Core', 'Data', 'Web']
+APPROVED_ENVS = ['dev', 'prod', 'staging']
+
+# Rule name -> (check, columns, argument, severity); 'id' is the provider's
+# account / project column. date_in_window is only active with a window.
+RULES = {
+    'required_not_null': ('not_null', ['date', 'id', 'service', 'team', 'env', 'cost_usd'], None, 'critical'),
+    'date_valid': ('date', ['date'], None, 'critical'),
+    'date_in_window': ('date_window', ['date'], None, 'critical'),
+    'cost_numeric': ('numeric', ['cost_usd'], None, 'critical'),
+    'cost_not_negative': ('min', ['cost_usd'], 0, 'warning'),
+    'id_format': ('regex', ['id'], ID_PATTERNS, 'critical'),
+    'service_approved': ('in_set', ['service'], APPROVED_SERVICES, 'warning'),
+    'team_approved': ('in_set', ['team'], APPROVED_TEAMS, 'warning'),
+    'env_approved': ('in_set', ['env'], APPROVED_ENVS, 'warning'),
+    'key_unique': ('unique', ['date', 'id', 'service', 'team', 'env'], None, 'critical'),
+}
+
+# Checks evaluated row by row on the parsed number; the rest run on distinct values
+NUMERIC_CHECKS = {'numeric', 'min'}
+
+# Key hashes combine the per-column value hashes FNV-style (uint64 arithmetic wraps)
+KEY_MULTIPLIER = np.uint64(0x100000001B3)
+NULL_HASH = np.uint64(0x9E3779B97F4A7C15)
+
+
+def expected_columns(provider):
+    return ['date', *source_dtypes(provider)]
+
+
+def parse_dates(values):
+    """Distinct date values (text or datetime) -> DatetimeIndex, NaT where not a YYYY-MM-DD date."""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        return pd.DatetimeIndex(values)
+    return pd.DatetimeIndex(pd.to_datetime(values.astype(str), format='%Y-%m-%d', errors='coerce'))
+
+
+def value_check(check, argument, provider, window):
+    """Function of an Index of distinct non-null values -> boolean violation array."""
+    if check == 'regex':
+        pattern = argument[provider] if isinstance(argument, dict) else argument
+        return lambda values: ~np.asarray(values.astype(str).str.fullmatch(pattern), dtype=bool)
+    if check == 'in_set':
+        return lambda values: ~values.isin(argument)
+    if check == 'date':
+        return lambda values: np.asarray(parse_dates(values).isna())
+    if check == 'date_window':
+        start, end = window
+        
+        def outside(values):
+            dates = parse_dates(values)
+            bad = np.zeros(len(dates), dtype=bool)
+            if start is not None:
+                bad |= np.asarray(dates < start)
+            if end is not None:
+                bad |= np.asarray(dates > end)
+            return bad
+        return outside
+    raise ValueError(f"unknown check {check!r}")
+
+
+class CompiledRules:
+    """A rule set compiled for one provider into per-column plans over one violation bitmap."""
+    
+    def __init__(self, provider, rules=RULES, window=None):
+        id_col = SOURCES[provider]['id_col']
+        self.provider = provider
+        self.names = []
+        self.severities = []
+        self.null_bits = {}        # column -> bits set where the value is missing
+        self.value_rules = {}      # column -> [(bit, check on distinct values)]
+        self.numeric_rules = {}    # column -> [(bit, check, argument)]
+        self.key = None            # (rule index, key columns)
+        for name, (check, columns, argument, severity) in rules.items():
+            if check == 'date_window' and (window is None or window == (None, None)):
+                continue
+            bit = 1 << len(self.names)
+            columns = [id_col if column == 'id' else column for column in columns]
+            if check == 'unique':
+                self.key = (len(self.names), columns)
+            for column in columns:
+                self.null_bits.setdefault(column, 0)
+                if check == 'not_null':
+                    self.null_bits[column] |= bit
+                elif check in NUMERIC_CHECKS:
+                    self.numeric_rules.setdefault(column, []).append((bit, check, argument))
+                elif check != 'unique':
+                    self.value_rules.setdefault(column, []).append((bit, value_check(check, argument, provider,
+                                                                                     window)))
+            self.names.append(name)
+            self.severities.append(severity)
+        mixed = set(self.value_rules) & set(self.numeric_rules)
+        if mixed:
+            raise ValueError(f"columns {sorted(mixed)} mix numeric and distinct-value checks")
+        if len(self.names) > 64:
+            raise ValueError("at most 64 rules fit the violation bitmap")
+        self.dtype = next(np.dtype(t) for t in ('uint8', 'uint16', 'uint32', 'uint64')
+                          if len(self.names) <= np.dtype(t).itemsize * 8)
+        self.key_columns = self.key[1] if self.key else []
+        self.columns = [column for column in self.null_bits if column in self.value_rules
+                        or column in self.numeric_rules or self.null_bits[column] or column in self.key_columns]
+        self._luts = {column: {} for column in self.columns if column not in self.numeric_rules}
+    
+    def _lookup(self, column, uniques):
+        """Violation bits of each distinct value, plus the missing-value bits in the last slot."""
+        cache = self._luts[column]
+        new = [value for value in uniques if value not in cache]
+        if new:
+            found = np.zeros(len(new), self.dtype)
+            index = pd.Index(new)
+            for bit, check in self.value_rules.get(column, ()):
+                found[np.asarray(check(index), dtype=bool)] |= bit
+            cache.update(zip(new, found.tolist()))
+        lut = np.empty(len(uniques) + 1, self.dtype)
+        lut[:-1] = [cache[value] for value in uniques]
+        lut[-1] = self.null_bits[column]
+        return lut
+    
+    def _numeric_bits(self, column, values):
+        bits = np.zeros(len(values), self.dtype)
+        missing = values.isna().to_numpy()
+        bits[missing] |= self.null_bits[column]
+        parsed = pd.to_numeric(values, errors='coerce').to_numpy(dtype='float64', na_value=np.nan)
+        for bit, check, argument in self.numeric_rules[column]:
+            if check == 'numeric':
+                bits[~missing & np.isnan(parsed)] |= bit
+            else:
+                bits[parsed < argument] |= bit
+        return bits
+    
+    def evaluate(self, chunk):
+        """(violation bitmap with one bit per rule, 64-bit key hashes) for one chunk."""
+        bits = np.zeros(len(chunk), self.dtype)
+        hashes = np.zeros(len(chunk), np.uint64) if self.key else None
+        for column in self.columns:
+            values = chunk[column] if column in chunk else pd.Series(None, index=chunk.index, dtype=object)
+            if column in self.numeric_rules:
+                bits |= self._numeric_bits(column, values)
+                if column in self.key_columns:
+                    hashes = hashes * KEY_MULTIPLIER ^ pd.util.hash_pandas_object(values, index=False).to_numpy()
+                continue
+            # factorize marks missing values -1, which indexes the last slot of the lut
+            codes, uniques = pd.factorize(values)
+            bits |= self._lookup(column, uniques)[codes]
+            if column in self.key_columns:
+                # Hash the distinct values only, then gather
+                value_hashes = np.append(pd.util.hash_array(np.asarray(uniques, dtype=object)), NULL_HASH)
+                hashes = hashes * KEY_MULTIPLIER ^ value_hashes[codes]
+        if self.key:
+            bits[pd.Series(hashes).duplicated().to_numpy()] |= 1 << self.key[0]
+        return bits, hashes
+
+
+class ValidationAccumulator:
+    """Mergeable per-rule counts, samples and key hashes for one provider."""
+    
+    def __init__(self, rules, sample_size=SAMPLE_SIZE):
+        self.provider = rules.provider
+        self.names = rules.names
+        self.severities = rules.severities
+        self.key_rule = rules.key[0] if rules.key else None
+        self.sample_size = sample_size
+        self.rows = 0
+        self.failing_rows = 0
+        self.counts = np.zeros(len(self.names), dtype='int64')
+        self.samples = {name: [] for name in self.names}
+        self.key_hashes = DistinctHashes()
+        self.problems = []
+    
+    def update(self, chunk, bits, hashes, location, first_row=0):
+        """Fold one evaluated chunk in; samples are labelled `location`+row (chunk starts at first_row)."""
+        self.rows += len(chunk)
+        patterns, counts = np.unique(bits, return_counts=True)
+        self.failing_rows += int(counts[patterns != 0].sum())
+        for i, name in enumerate(self.names):
+            self.counts[i] += counts[(patterns & (1 << i)) != 0].sum()
+            wanted = self.sample_size - len(self.samples[name])
+            if wanted > 0 and (patterns & (1 << i)).any():
+                rows = np.flatnonzero(bits & (1 << i))[:wanted]
+                sample = chunk.iloc[rows].astype(object).where(chunk.iloc[rows].notna(), None)
+                self.samples[name].extend({'location': f"{location}+{first_row + row}", **record}
+                                          for row, record in zip(rows.tolist(), sample.to_dict('records')))
+        if hashes is not None:
+            self.key_hashes.add(hashes)
+        return self
+    
+    def merge(self, other):
+        """Combine another accumulator (a later task of the same provider) into this one."""
+        self.rows += other.rows
+        self.failing_rows += other.failing_rows
+        self.counts += other.counts
+        for name in self.names:
+            self.samples[name].extend(other.samples[name][:self.sample_size - len(self.samples[name])])
+        self.key_hashes.merge(other.key_hashes)
+        self.problems.extend(other.problems)
+        return self
+    
+    def result(self):
+        """{'rows', 'failing_rows', 'rules' (DataFrame), 'samples', 'problems'}."""
+        counts = self.counts.copy()
+        if self.key_rule is not None:
+            counts[self.key_rule] = self.rows - self.key_hashes.count()
+        rules = pd.DataFrame({
+            'rule': self.names,
+            'severity': self.severities,
+            'violations': counts,
+            'pct_rows': counts / self.rows * 100 if self.rows else 0.0,
+        })
+        return {
+            'provider': self.provider,
+            'rows': self.rows,
+            'failing_rows': self.failing_rows,
+            'rules': rules,
+            'samples': {name: rows for name, rows in self.samples.items() if rows},
+            'problems': self.problems,
+        }
+
+
+def csv_parts(path, part_bytes=PART_BYTES):
+    """(start, end) byte ranges of a CSV's data lines, split at line boundaries (at least one)."""
+    size = os.path.getsize(path)
+    with open(path, 'rb') as f:
+        f.readline()
+        bounds = [f.tell()]
+        while bounds[-1] < size:
+            f.seek(min(bounds[-1] + part_bytes, size))
+            f.readline()
+            bounds.append(min(f.tell(), size))
+    return list(zip(bounds, bounds[1:])) or [(bounds[0], bounds[0])]
+
+
+def validation_tasks(provider, zone='source', part_bytes=PART_BYTES, raw_dir=RAW_DIR):
+    """(provider, format, path, start, end) units of work for one provider's files in a zone."""
+    if zone == 'bronze':
+        return [(provider, 'parquet', path, None, None) for path in partition_files(provider)]
+    if zone == 'source':
+        paths = [SOURCES[provider]['path']]
+    else:
+        paths = sorted(glob.glob(os.path.join(raw_dir, f'cloud={provider}', '**', '*.csv'), recursive=True))
+    return [(provider, 'csv', path, start, end) for path in paths for start, end in csv_parts(path, part_bytes)]
+
+
+def validate_task(task, window=None, chunksize=DEFAULT_CHUNKSIZE, sample_size=SAMPLE_SIZE):
+    """Validate one task's rows; returns its ValidationAccumulator."""
+    provider, fmt, path, start, end = task
+    rules = CompiledRules(provider, window=window)
+    acc = ValidationAccumulator(rules, sample_size)
+    name = os.path.relpath(path)
+    
+    if fmt == 'parquet':
+        import pyarrow.parquet as pq
+        
+        row = 0
+        for batch in pq.ParquetFile(path).iter_batches(batch_size=chunksize):
+            chunk = batch.to_pandas()
+            acc.update(chunk, *rules.evaluate(chunk), name, row)
+            row += len(chunk)
+        return acc
+    
+    with open(path, 'rb') as f:
+        header = f.readline().decode().strip().split(',')
+        first_part = f.tell() == start
+        f.seek(start)
+        data = f.read(end - start)
+    if first_part and header != expected_columns(provider):
+        acc.problems.append(f"{name}: header {header} does not match {expected_columns(provider)}")
+    if not data.strip():
+        if first_part:
+            acc.problems.append(f"{name}: no data rows")
+        return acc
+    row = 0
+    for chunk in pd.read_csv(io.BytesIO(data), header=None, names=header, dtype=str, chunksize=chunksize):
+        acc.update(chunk, *rules.evaluate(chunk), f"{name}@{start}", row)
+        row += len(chunk)
+    return acc
+
+
+def validate(providers=tuple(SOURCES), zone='source', window=None, workers=None, chunksize=DEFAULT_CHUNKSIZE,
+             part_bytes=PART_BYTES, sample_size=SAMPLE_SIZE, raw_dir=RAW_DIR):
+    """
+    Validate every provider's files in a zone, one process task per file /
+    byte range / partition. Returns ({provider: result}, task count).
+    """
+    tasks = [task for provider in providers for task in validation_tasks(provider, zone, part_bytes, raw_dir)]
+    workers = min(resolve_workers(workers), max(1, len(tasks)))
+    args = (repeat(window), repeat(chunksize), repeat(sample_size))
+    if workers == 1:
+        accumulators = list(map(validate_task, tasks, *args))
+    else:
+        with ProcessPoolExecutor(workers) as pool:
+            accumulators = list(pool.map(validate_task, tasks, *args))
+    
+    merged = {}
+    for task, acc in zip(tasks, accumulators):
+        provider = task[0]
+        merged[provider] = merged[provider].merge(acc) if provider in merged else acc
+    results = {}
+    for provider in providers:
+        if provider not in merged:
+            merged[provider] = ValidationAccumulator(CompiledRules(provider, window=window), sample_size)
+            merged[provider].problems.append(f"no {zone} files for {provider}")
+        results[provider] = merged[provider].result()
+    return results, len(tasks)
+
+
+def failed(results, fail_on='critical'):
+    """True if any rule at or above the `fail_on` severity has violations (or a file problem was found)."""
+    levels = SEVERITIES[SEVERITIES.index(fail_on):]
+    for result in results.values():
+        rules = result['rules']
+        if result['problems'] or rules.loc[rules['severity'].isin(levels), 'violations'].any():
+            return True
+    return False
+
+
+def main(zone='source', since=None, until=None, workers=None, chunksize=DEFAULT_CHUNKSIZE, part_bytes=PART_BYTES,
+         sample_size=SAMPLE_SIZE, fail_on=None, raw_dir=RAW_DIR):
+    print("=" * 80)
+    print("FUSED VALIDATION ENGINE")
+    print("=" * 80)
+    print()
+    
+    window = (pd.Timestamp(since) if since else None, pd.Timestamp(until) if until else None)
+    start = time.perf_counter()
+    results, task_count = validate(tuple(SOURCES), zone, window, workers, chunksize, part_bytes, sample_size,
+                                   raw_dir)
+    elapsed = time.perf_counter() - start
+    rows = sum(result['rows'] for result in results.values())
+    rule_count = len(next(iter(results.values()))['rules'])
+    print(f"Zone: {zone}; {rule_count} rules over {rows:,} rows in {task_count} task(s) on "
+          f"{min(resolve_workers(workers), max(1, task_count))} worker(s): {elapsed * 1000:.1f} ms "
+          f"({rows / elapsed if elapsed else 0:,.0f} rows/s)")
+    print()
+    
+    for provider, result in results.items():
+        print(f"{provider.upper()}: {result['rows']:,} rows, {result['failing_rows']:,} failing at least one rule")
+        for problem in result['problems']:
+            print(f"  ⚠️  {problem}")
+        print(result['rules'].round(2).to_string(index=False))
+        for name, samples in result['samples'].items():
+            print(f"  {name} samples:")
+            print('    ' + pd.DataFrame(samples).to_string(index=False).replace('\n', '\n    '))
+        print()
+    
+    if fail_on is not None:
+        status = failed(results, fail_on)
+        print(f"{'❌' if status else '✓'} {fail_on}+ checks {'failed' if status else 'passed'}")
+        return results, status
+    return results, False
+
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description="Run the declarative validation rules in one pass per chunk.")
+    parser.add_argument('--zone', choices=ZONES, default='source',
+                        help="source CSVs, extracted raw-zone files, or Bronze Parquet partitions")
+    parser.add_argument('--since', default=None, help="first date of the expected window (YYYY-MM-DD)")
+    parser.add_argument('--until', default=None, help="last date of the expected window (YYYY-MM-DD)")
+    parser.add_argument('--workers', type=int, default=None, help="processes (default: one per core)")
+    parser.add_argument('--chunksize', type=int, default=DEFAULT_CHUNKSIZE)
+    parser.add_argument('--part-mb', type=float, default=PART_BYTES / 1024 ** 2, help="CSV byte range per task")
+    parser.add_argument('--samples', type=int, default=SAMPLE_SIZE, help="offending rows kept per rule")
+    parser.add_argument('--fail-on', choices=SEVERITIES, default=None,
+                        help="exit 1 if any rule of this severity or worse has violations")
+    parser.add_argument('--raw-dir', default=RAW_DIR)
+    return parser.parse_args(argv)
+
+
+if __name__ == "__main__":
+    args = parse_args()
+    _, status = main(args.zone, args.since, args.until, args.workers, args.chunksize, int(args.part_mb * 1024 ** 2),
+                     args.samples, args.fail_on, args.raw_dir)
+    sys.exit(1 if status else 0)
@@ -0,0 +1,364 @@
+"""
+Persistent Billing Warehouse
+K&Co Cloud Cost Intelligence Platform
+
+On-disk SQLite warehouse for the Part C queries, loaded incrementally.
+
+A `load_state` table keeps one row per provider with its date watermark (the
+latest billing date loaded). Each daily run:
+1. reads only Bronze partitions at/after (watermark - late_arrival_days)
+2. deletes the late-arrival window (the "last 7 days" strategy in Part D)
+3. inserts the window plus anything newer, and advances the watermark
+
+all in a single transaction, so the cost of a run tracks the new data rather
+than the full 12 months of history. The first run (or --full-refresh) loads
+everything.
+
+Both providers are stored in one physical `unified_cloud_billing` table with
+precomputed year/month/month_key and is_credit columns and covering indexes
+for the report access patterns; `vw_unified_cloud_billing` is a thin view
+over it. With a dedup policy, keys repeated within a batch are dropped or
+summed (the batch replaces every row of its dates, so those are the only
+duplicates). Each load also updates the files derived from the table next to the
+warehouse file: the per-series day bitmaps in completeness_index.py and the
+online per-series alert state in alert_state.py. `explain_queries`
+reports the SQLite plan of any query so regressions to full scans or temp
+B-tree sorts are visible.
+"""
+
+import re
+import sqlite3
+import uuid
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pandas as pd
+
+from ingest_cache import SOURCES, load_billing
+from billing_frame import PROVIDER_LABELS, to_day_offset
+from aggregates import mark_months_pending, months_between
+from dedup_index import deduplicate_batch
+from completeness_index import CompletenessIndex, completeness_path_for
+from alert_state import AlertState, alert_state_path_for, seed_rows
+
+WAREHOUSE_PATH = 'data/warehouse.db'
+LATE_ARRIVAL_DAYS = 7
+
+UNIFIED_TABLE = 'unified_cloud_billing'
+
+# Bumped whenever the physical layout changes; older warehouses are rebuilt
+SCHEMA_VERSION = 2
+LEGACY_OBJECTS = [
+    ('VIEW', 'vw_unified_cloud_billing'),
+    ('TABLE', 'aws_line_items_12mo'),
+    ('TABLE', 'gcp_billing_12mo'),
+    ('TABLE', 'agg_monthly_billing'),
+    ('TABLE', 'agg_daily_provider'),
+    ('TABLE', 'load_state'),
+]
+
+# Both providers land in one physical table. Calendar parts and the credit
+# flag are computed once at load time, so queries filter and group on plain
+# integer columns instead of calling strftime() on every row.
+UNIFIED_TABLE_SQL = f"""
+    CREATE TABLE IF NOT EXISTS {UNIFIED_TABLE} (
+        date TEXT NOT NULL,
+        year INTEGER NOT NULL,
+        month INTEGER NOT NULL,
+        month_key INTEGER NOT NULL,
+        cloud_provider TEXT NOT NULL,
+        cloud_account_id TEXT,
+        service TEXT,
+        team TEXT,
+        environment TEXT,
+        cost_usd REAL,
+        is_credit INTEGER NOT NULL
+    )
+    """
+
+# Covering indexes, one per access pattern: each lists the filter/group
+# columns first and then every other column the pattern reads, so SQLite
+# answers from the index alone and walks it in GROUP BY order.
+UNIFIED_INDEXES = {
+    # late-arrival deletes, date ranges and the daily trend
+    'idx_ucb_date_provider': ['date', 'cloud_provider', 'cost_usd'],
+    # month + provider (and the monthly aggregate refresh)
+    'idx_ucb_month_provider': ['month_key', 'cloud_provider', 'team', 'environment', 'service',
+                               'cloud_account_id', 'year', 'month', 'is_credit', 'cost_usd'],
+    # month + team + environment
+    'idx_ucb_month_team_env': ['month_key', 'team', 'environment', 'cloud_account_id', 'service',
+                               'cost_usd'],
+    # service + provider
+    'idx_ucb_service_provider': ['service', 'cloud_provider', 'is_credit', 'cost_usd', 'team',
+                                 'environment'],
+}
+
+UNIFIED_COLUMNS = ['date', 'year', 'month', 'month_key', 'cloud_provider', 'cloud_account_id',
+                   'service', 'team', 'environment', 'cost_usd', 'is_credit']
+
+
+UNIFIED_VIEW_SQL = f"""
+    CREATE VIEW IF NOT EXISTS vw_unified_cloud_billing AS
+    SELECT 
+        date,
+        cloud_provider,
+        cloud_account_id,
+        service,
+        team,
+        environment,
+        cost_usd,
+        is_credit
+    FROM {UNIFIED_TABLE}
+    """
+
+
+def connect(path=WAREHOUSE_PATH):
+    """Open (creating if needed) the warehouse and make sure the schema exists."""
+    conn = sqlite3.connect(path)
+    init_schema(conn)
+    return conn
+
+
+def init_schema(conn):
+    version = conn.execute("PRAGMA user_version").fetchone()[0]
+    if version < SCHEMA_VERSION:
+        # Layout changed: drop the old objects so the next load is a full one
+        for kind, name in LEGACY_OBJECTS:
+            conn.execute(f"DROP {kind} IF EXISTS {name}")
+        conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+    
+    conn.execute(UNIFIED_TABLE_SQL)
+    for name, columns in UNIFIED_INDEXES.items():
+        conn.execute(f"CREATE INDEX IF NOT EXISTS {name} ON {UNIFIED_TABLE} ({', '.join(columns)})")
+    
+    conn.execute(UNIFIED_VIEW_SQL)
+    
+    created = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'load_state'"
+    ).fetchone() is None
+    conn.execute("""
+    CREATE TABLE IF NOT EXISTS load_state (
+        provider TEXT PRIMARY KEY,
+        watermark TEXT NOT NULL,
+        rows_loaded INTEGER NOT NULL,
+        loaded_at TEXT NOT NULL,
+        load_count INTEGER NOT NULL DEFAULT 0
+    )
+    """)
+    # A new load_state restarts load_count at 1, so (watermark, load_count) alone
+    # can repeat across rebuilds: each load_state gets a new warehouse id
+    conn.execute("CREATE TABLE IF NOT EXISTS warehouse_info (key TEXT PRIMARY KEY, value TEXT NOT NULL)")
+    conn.execute(
+        f"INSERT OR {'REPLACE' if created else 'IGNORE'} INTO warehouse_info (key, value) VALUES ('warehouse_id', ?)",
+        (uuid.uuid4().hex,)
+    )
+    conn.commit()
+
+
+def warehouse_id(conn):
+    """Random id of the warehouse's current load_state (None for a warehouse without one)."""
+    try:
+        row = conn.execute("SELECT value FROM warehouse_info WHERE key = 'warehouse_id'").fetchone()
+    except sqlite3.OperationalError:
+        return None
+    return row[0] if row else None
+
+
+def unified_rows(batch, provider):
+    """Raw Bronze rows for one provider -> rows of the unified table."""
+    dates = batch['date']
+    cost = batch['cost_usd']
+    out = pd.DataFrame({
+        'date': dates.dt.strftime('%Y-%m-%d'),
+        'year': dates.dt.year,
+        'month': dates.dt.month,
+        'month_key': dates.dt.year * 100 + dates.dt.month,
+        'cloud_provider': PROVIDER_LABELS[provider],
+        'cloud_account_id': batch[SOURCES[provider]['id_col']],
+        'service': batch['service'],
+        'team': batch['team'],
+        'environment': batch['env'],
+        'cost_usd': cost,
+        'is_credit': (cost < 0).astype('int64'),
+    })
+    return out.astype(object).where(out.notna(), None)
+
+
+def database_path(conn):
+    """File of a connection's main database ('' for an in-memory one)."""
+    return next(row[2] for row in conn.execute("PRAGMA database_list") if row[1] == 'main')
+
+
+def get_load_state(conn, provider):
+    row = conn.execute(
+        "SELECT watermark, rows_loaded, loaded_at, load_count FROM load_state WHERE provider = ?",
+        (provider,)
+    ).fetchone()
+    if row is None:
+        return None
+    return {'watermark': row[0], 'rows_loaded': row[1], 'loaded_at': row[2], 'load_count': row[3]}
+
+
+def incremental_load(conn, provider, late_arrival_days=LATE_ARRIVAL_DAYS, full_refresh=False,
+                     dedup=None, completeness_path=None, alert_state_path=None):
+    """
+    Bring one provider's rows of the unified table up to date with the Bronze cache.
+    
+    Rows dated after (watermark - late_arrival_days) are replaced in place;
+    older history is never read or rewritten. `dedup` ('drop' or 'aggregate')
+    resolves composite keys repeated within the batch (see
+    dedup_index.deduplicate_batch). The completeness index
+    (completeness_index.py) and the alert state (alert_state.py) are updated
+    with the loaded rows; `completeness_path` / `alert_state_path` default to
+    the files next to the warehouse, so no load script can move the watermark
+    past them.
+    """
+    warehouse_file = database_path(conn)
+    if warehouse_file:
+        completeness_path = completeness_path or completeness_path_for(warehouse_file)
+        alert_state_path = alert_state_path or alert_state_path_for(warehouse_file)
+    label = PROVIDER_LABELS[provider]
+    state = None if full_refresh else get_load_state(conn, provider)
+    
+    if state is None:
+        cutoff = None
+        batch = load_billing(provider)
+    else:
+        cutoff = (datetime.strptime(state['watermark'], '%Y-%m-%d')
+                  - timedelta(days=late_arrival_days)).strftime('%Y-%m-%d')
+        batch = load_billing(provider, since=pd.Timestamp(cutoff) + pd.Timedelta(days=1))
+    
+    dedup_stats = None
+    if dedup:
+        # The batch replaces every row of its dates, so the only duplicates
+        # are keys repeated within it
+        batch, dedup_stats = deduplicate_batch(batch, SOURCES[provider]['id_col'], dedup)
+    
+    rows = unified_rows(batch, provider)
+    
+    with conn:
+        if cutoff is None:
+            replaced = conn.execute(
+                f"SELECT MIN(date), MAX(date) FROM {UNIFIED_TABLE} WHERE cloud_provider = ?", (label,)
+            ).fetchone()
+            deleted = conn.execute(
+                f"DELETE FROM {UNIFIED_TABLE} WHERE cloud_provider = ?", (label,)
+            ).rowcount
+        else:
+            deleted = conn.execute(
+                f"DELETE FROM {UNIFIED_TABLE} WHERE date > ? AND cloud_provider = ?", (cutoff, label)
+            ).rowcount
+        conn.executemany(
+            f"INSERT INTO {UNIFIED_TABLE} ({', '.join(UNIFIED_COLUMNS)}) "
+            f"VALUES ({', '.join('?' * len(UNIFIED_COLUMNS))})",
+            rows.itertuples(index=False, name=None)
+        )
+        
+        watermark = rows['date'].max() if len(rows) else None
+        if state is not None and (watermark is None or state['watermark'] > watermark):
+            watermark = state['watermark']
+        total_rows = len(batch) if state is None else state['rows_loaded'] - deleted + len(batch)
+        if watermark is not None:
+            conn.execute("""
+            INSERT INTO load_state (provider, watermark, rows_loaded, loaded_at, load_count)
+            VALUES (?, ?, ?, ?, 1)
+            ON CONFLICT (provider) DO UPDATE SET
+                watermark = excluded.watermark,
+                rows_loaded = excluded.rows_loaded,
+                loaded_at = excluded.loaded_at,
+                load_count = load_state.load_count + 1
+            """, (provider, watermark, total_rows, datetime.now(timezone.utc).isoformat(timespec='seconds')))
+        
+        # Months whose contents may have changed (None = everything was reloaded)
+        months_touched = None
+        if cutoff is not None and watermark is not None and watermark > cutoff:
+            start = (pd.Timestamp(cutoff) + pd.Timedelta(days=1)).strftime('%Y-%m-%d')
+            months_touched = months_between(start, watermark)
+        elif cutoff is not None:
+            months_touched = []
+        # Recorded with the rows so a crash before refresh_aggregates() cannot
+        # lose them; a full reload makes the old and the new rows' months stale
+        stale = months_touched
+        if cutoff is None:
+            dates = [d for d in (*replaced, rows['date'].min() if len(rows) else None, watermark) if d is not None]
+            stale = months_between(min(dates), max(dates)) if dates else []
+        mark_months_pending(conn, stale)
+    
+    if alert_state_path:
+        alerts = AlertState.load(alert_state_path)
+        if cutoff is not None and not alerts.can_update(label, cutoff, state['watermark']):
+            # No state for this provider yet, a load bypassed it, or the window
+            # reaches settled days: seed from the whole table
+            alerts.update(provider, seed_rows(conn, label), settle_days=late_arrival_days)
+        else:
+            alerts.update(provider, rows, cutoff, late_arrival_days)
+        alerts.save(alert_state_path)
+    
+    if completeness_path:
+        completeness = CompletenessIndex.load(completeness_path)
+        indexed = completeness.date_range(label)
+        if cutoff is not None and (indexed is None
+                                   or indexed[1] != int(to_day_offset(np.datetime64(state['watermark'])))):
+            # No bitmaps for this provider yet, or a load bypassed the index: seed them from the whole table
+            rows = pd.read_sql_query(
+                f"SELECT DISTINCT date, cloud_provider, cloud_account_id, service FROM {UNIFIED_TABLE} "
+                f"WHERE cloud_provider = ?", conn, params=(label,)
+            )
+            completeness.update(provider, rows)
+        else:
+            completeness.update(provider, rows, cutoff)
+        completeness.save(completeness_path)
+    
+    return {
+        'provider': provider,
+        'mode': 'full' if cutoff is None else 'incremental',
+        'months_touched': months_touched,
+        'replaced_after': cutoff,
+        'rows_deleted': deleted,
+        'rows_inserted': len(batch),
+        'rows_total': total_rows,
+        'watermark': watermark,
+        'dedup': dedup_stats,
+    }
+
+
+def load_all(conn, late_arrival_days=LATE_ARRIVAL_DAYS, full_refresh=False, dedup=None, completeness_path=None,
+             alert_state_path=None):
+    return [incremental_load(conn, provider, late_arrival_days, full_refresh, dedup, completeness_path,
+                             alert_state_path)
+            for provider in SOURCES]
+
+
+# Plan steps that mean a query is not being served by an index: a bare table
+# scan, or grouping/distinct done by sorting into a temporary B-tree.
+PLAN_WARNINGS = [
+    (re.compile(r'^SCAN (?!\(|CONSTANT ROW)(?!.*USING (COVERING )?INDEX)'), 'full table scan'),
+    (re.compile(r'USE TEMP B-TREE FOR (GROUP BY|DISTINCT)'), 'temp B-tree grouping'),
+]
+
+
+def explain_query(conn, query, params=()):
+    """EXPLAIN QUERY PLAN for one query, as a list of plan step strings."""
+    return [row[3] for row in conn.execute(f"EXPLAIN QUERY PLAN {query}", params)]
+
+
+def plan_warnings(steps):
+    """Warnings for plan steps that fall back to scans or temp B-tree grouping."""
+    return [f"{label}: {step}" for step in steps
+            for pattern, label in PLAN_WARNINGS if pattern.search(step)]
+
+
+def explain_queries(conn, queries):
+    """
+    Plans for a {name: query} (or {name: (query, params)}) mapping.
+    
+    Returns a DataFrame with one row per plan step and a `warning` column
+    that is non-empty on the steps flagged by plan_warnings.
+    """
+    records = []
+    for name, query in queries.items():
+        query, params = query if isinstance(query, tuple) else (query, ())
+        for step in explain_query(conn, query, params):
+            warnings = plan_warnings([step])
+            records.append({'query': name, 'step': step, 'warning': '; '.join(warnings)})
+    return pd.DataFrame(records, columns=['query', 'step', 'warning'])